@@ -1,171 +1,318 @@
-import pickle
-import os
 import parselmouth
 import numpy as np
-from parselmouth.praat import call
+import contours as contour_export
+from features import FEATURE_NAMES, FeatureExtractor
+from feature_cache import audio_key
+from registry import get_registry
+from model_set import ModelSet, ScreeningModel
+from worker_pool import WorkerPool
+from metrics import track
+from quality import QualityError, check
+import vad
 
-class Analyzer:
-    def __init__(self, file):
-        self.file = file
-        self.load_file()
+# Used when the model artifacts do not carry a tuned threshold
+DEFAULT_THRESHOLD = 0.52
+# Severity of a positive result and confidence of any result, by its margin:
+# the share of the way from the threshold to 1 (above it) or to 0 (below it)
+SEVERITY_BANDS = (("High", 0.5), ("Moderate", 1 / 6))
+CONFIDENCE_BANDS = (("High", 0.5), ("Medium", 0.2))
 
-    def load_file(self):
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        model_path = os.path.join(script_dir, 'models/model.pkl')
-        scaler_path = os.path.join(script_dir, 'models/scaler.pkl')
+_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
 
-        print(f"Loading model from: {model_path}")
 
-        with open(model_path, 'rb') as f:
-            model = pickle.load(f)
+def margin(prob, threshold):
+    """How far `prob` is from `threshold`, as a share of the way to 1 above it or to 0 below it."""
+    room = 1 - threshold if prob > threshold else threshold
+    return abs(prob - threshold) / room if room > 0 else 1.0
 
-        print(f"Model loaded: {type(model)}")
-        try:
-            with open(scaler_path, 'rb') as f:
-                scaler = pickle.load(f)
-            self.scaler = scaler
-            print(f"Scaler loaded: {type(scaler)}")
-        except FileNotFoundError:
-            print("No scaler file found")
-            self.scaler = None
 
-        self.model = model
+def _band(value, bands, default):
+    return next((name for name, lower in bands if value >= lower), default)
 
-    def predict(self, params, threshold=0.52):
-        if hasattr(self, 'scaler') and self.scaler is not None:
-            params = self.scaler.transform(params)
 
-        prob = float(self.model.predict_proba(params)[:, 1][0])
+class Analyzer:
+    def __init__(self, file=None, registry=None, perturbation_backend='praat', cache=None, quality_limits=None,
+                 segmentation=None, models=None, contours=None, segment_pool=None):
+        # Unused: the model comes from the registry (or `models`). Kept so existing
+        # Analyzer(file=...) callers keep working
+        self.file = file
+        # Optional FeatureCache; cache_hit records whether the last get_features call used it
+        self.cache = cache
+        self.cache_hit = False
+        # A ModelSet of every condition screened for; without one, the registry's
+        # model is the only (Parkinson's) model
+        if models is None:
+            registry = registry if registry is not None else get_registry()
+            models = ModelSet([ScreeningModel('parkinsons', registry, "Parkinson's")])
+        self.model_set = models
+        self.registry = models.primary.registry
+        # 'praat' queries Praat for each jitter/shimmer value, 'numpy' computes
+        # them all in one vectorized pass (see perturbation.py)
+        self.perturbation_backend = perturbation_backend
+        # Limits for the pre-flight gate (see quality.DEFAULT_LIMITS); None skips it.
+        # quality_report holds the last gate result. Segmented extraction cuts long
+        # recordings into windows, so it lifts the length limit
+        if quality_limits is not None and segmentation is not None:
+            quality_limits = {**quality_limits, 'max_duration': None}
+        self.quality_limits = quality_limits
+        self.quality_report = None
+        # Optional voice activity trimming and segment-wise extraction, as
+        # vad.extract keyword arguments ({'window': 10.0, 'processes': 4});
+        # None extracts from the whole recording as the model was trained
+        self.segmentation = segmentation
+        # A long-lived WorkerPool of vad.extract_segment for the segments of one
+        # recording; without one, vad.extract starts processes per call
+        self.segment_pool = segment_pool
+        # Optional contour export (see contours.parse_options); get_features then
+        # also leaves the encoded pitch/intensity/HNR contours in contour_data
+        self.contours = contours
+        self.contour_data = None
+        self.load_file()
+
+    def load_file(self):
+        # The registry only touches disk when the artifacts changed, so
+        # constructing an Analyzer per request is cheap
+        self.models = self.model_set.get()
+        loaded = self.models.loaded[0]
+        self.model = loaded.model
+        self.scaler = loaded.scaler
+        self.model_version = loaded.version
+        self.model_versions = {name: snapshot.version for name, snapshot in zip(self.models.names,
+                                                                                 self.models.loaded)}
+        self.thresholds = [snapshot.threshold if snapshot.threshold is not None else DEFAULT_THRESHOLD
+                           for snapshot in self.models.loaded]
+        self.threshold = self.thresholds[0]
+        # The union of the models' features; get_features extracts only these
+        self.feature_names = self.models.features
+
+    def predict(self, params, threshold=None):
+        return self.predict_many(params, threshold)[0]
+
+    def predict_many(self, params, threshold=None):
+        """The primary model's result for every row of `params`; `threshold` defaults to the model's."""
+        primary = self.models.names[0]
+        return [results[primary] for results in self.screen_many(params, threshold)]
+
+    def screen(self, params, threshold=None):
+        return self.screen_many(params, threshold)[0]
+
+    def screen_many(self, params, threshold=None):
+        """
+        Scores every FEATURE_NAMES-wide row of `params` with every model in one
+        pass; returns {model name: result} per row. `threshold` overrides the
+        primary model's threshold only. The primary model's result is fully
+        described; the other models' carry their prediction, probability and
+        diagnosis only, judged against their own thresholds.
+        """
+        params = np.asarray(params, dtype=float).reshape(-1, len(FEATURE_NAMES))
+        thresholds = list(self.thresholds)
+        if threshold is not None:
+            thresholds[0] = threshold
+
+        with track("predict"):
+            probs = self.models.score(params)
+        results = []
+        for model_probs, row in zip(probs, params):
+            screening = {}
+            for i, (model, prob, model_threshold) in enumerate(zip(self.models.models, model_probs, thresholds)):
+                if i == 0:
+                    screening[model.name] = self._describe(float(prob), row, model_threshold, model.label)
+                else:
+                    # Confidence, severity and the voice metrics are tuned to Parkinson's markers
+                    screening[model.name] = self._verdict(float(prob), model_threshold, model.label)
+            results.append(screening)
+        return results
+
+    @staticmethod
+    def _verdict(prob, threshold, label):
         prediction = 1 if prob > threshold else 0
+        return {
+            'prediction': prediction,
+            'probability': prob,
+            'diagnosis': f"{label} detected" if prediction == 1 else f"No {label} detected",
+        }
 
-        # Calculate additional metrics
-        voice_quality_score = min(100, max(0, (1 - abs(prob - 0.52)) * 100))
+    def _describe(self, prob, row, threshold, label="Parkinson's"):
+        verdict = self._verdict(prob, threshold, label)
+        prediction = verdict['prediction']
+
+        # Calculate additional metrics, all relative to the model's own threshold
+        voice_quality_score = min(100, max(0, (1 - abs(prob - threshold)) * 100))
         reliability_score = min(100, max(0, (1 - abs(prob - threshold)) * 100))
-        severity_level = "High" if prob > 0.75 else "Moderate" if prob > 0.6 else "Low"
+        distance = margin(prob, threshold)
+        # Only a positive result has a severity beyond Low
+        severity_level = _band(distance, SEVERITY_BANDS, "Low") if prediction == 1 else "Low"
+        confidence = _band(distance, CONFIDENCE_BANDS, "Low")
 
-        # Determine confidence level
-        if abs(prob - 0.52) < 0.1:
-            confidence = "Medium"
-        elif prob > 0.7:
-            confidence = "High"
-        else:
-            confidence = "Low"
+        print(f"{label} probability: {prob}, Prediction: {prediction}, Confidence: {confidence}")
 
-        print(f"Probability: {prob}, Prediction: {prediction}, Confidence: {confidence}")
+        def metric(name, transform):
+            # Features outside the models' union are not extracted
+            value = row[_INDEX[name]]
+            return round(transform(value) * 100, 2) if np.isfinite(value) else None
 
         return {
-            'prediction': prediction,
-            'probability': prob,
+            **verdict,
             'confidence': confidence,
-            'diagnosis': 'Parkinson\'s detected' if prediction == 1 else 'No Parkinson\'s detected',
             'voice_quality': round(voice_quality_score, 2),
             'reliability': round(reliability_score, 2),
             'severity': severity_level,
             'analysis_metrics': {
-                'voice_tremor': round(params[0][4] * 100, 2),  # Using jitter as tremor indicator
-                'voice_stability': round((1 - params[0][9]) * 100, 2),  # Using shimmer for stability
-                'breath_support': round(params[0][16] * 100, 2)  # Using harmonicity for breath support
+                'voice_tremor': metric('locPctJitter', lambda v: v),  # Using jitter as tremor indicator
+                'voice_stability': metric('locShimmer', lambda v: 1 - v),  # Using shimmer for stability
+                # Using harmonicity for breath support
+                'breath_support': metric('meanNoiseToHarmHarmonicity', lambda v: v)
             }
         }
 
     # more functions for creating measurements
-    def get_features(self, audio_file):
-        features = []
-        sound = parselmouth.Sound(audio_file)
-        pitch = call(sound, "To Pitch", 0.0, 60, 500)
-        pulses = call([sound, pitch], "To PointProcess (cc)")
-        num_points = call(pulses, "Get number of points")
-        points = [call(pulses, "Get time from index", i+1) for i in range(num_points)]
-        periods = np.diff(points)
-
-        numPulses = call(pulses, "Get number of points")
-        features.append(numPulses)
-
-        numPeriodsPulses = len(periods)
-        features.append(numPeriodsPulses)
-
-        meanPeriodPulses = np.mean(periods)
-        features.append(meanPeriodPulses)
-
-        stdDevPeriodPulses = np.std(periods)
-        features.append(stdDevPeriodPulses)
-
-        locPctJitter = call(pulses, "Get jitter (local)", 0.0, 0.0, 0.0001, 0.02, 1.3)
-        features.append(locPctJitter)
-
-        locAbsJitter = call(pulses, "Get jitter (local, absolute)", 0.0, 0.0, 0.0001, 0.02, 1.3)
-        features.append(locAbsJitter)
-
-        rapJitter = call(pulses, "Get jitter (rap)", 0.0, 0.0, 0.0001, 0.02, 1.3)
-        features.append(rapJitter)
-
-        ppq5Jitter = call(pulses, "Get jitter (ppq5)", 0.0, 0.0, 0.0001, 0.02, 1.3)
-        features.append(ppq5Jitter)
-
-        ddpJitter = call(pulses, "Get jitter (ddp)", 0.0, 0.0, 0.0001, 0.02, 1.3)
-        features.append(ddpJitter)
-
-        locShimmer = call([sound, pulses], "Get shimmer (local)", 0.0, 0.0, 0.0001, 0.02, 1.3, 1.6)
-        features.append(locShimmer)
-
-        locDbShimmer = call([sound, pulses], "Get shimmer (local_dB)", 0.0, 0.0, 0.0001, 0.02, 1.3, 1.6)
-        features.append(locDbShimmer)
-
-        apq3Shimmer = call([sound, pulses], "Get shimmer (apq3)", 0.0, 0.0, 0.0001, 0.02, 1.3, 1.6)
-        features.append(apq3Shimmer)
-
-        apq5Shimmer = call([sound, pulses], "Get shimmer (apq5)", 0.0, 0.0, 0.0001, 0.02, 1.3, 1.6)
-        features.append(apq5Shimmer)
-
-        apq11Shimmer = call([sound, pulses], "Get shimmer (apq11)", 0.0, 0.0, 0.0001, 0.02, 1.3, 1.6)
-        features.append(apq11Shimmer)
-
-        ddaShimmer = call([sound, pulses], "Get shimmer (dda)", 0.0, 0.0, 0.0001, 0.02, 1.3, 1.6)
-        features.append(ddaShimmer)
-
-        harmonicity = call(sound, "To Harmonicity (cc)", 0.01, 75, 0.1, 1.0)
-        meanAutoCorrHarmonicity = call(harmonicity, "Get mean", 0, 0)
-        features.append(meanAutoCorrHarmonicity)
-
-        meanNoiseToHarmHarmonicity = 1 / (10 ** (meanAutoCorrHarmonicity / 10))
-        features.append(meanNoiseToHarmHarmonicity)
-
-        meanHarmToNoiseHarmonicity = 10 ** (meanAutoCorrHarmonicity / 10)
-        features.append(meanHarmToNoiseHarmonicity)
-
-        intensity = call(sound, "To Intensity", 75, 0.0)
-        minIntensity = call(intensity, "Get minimum", 0, 0, "Parabolic")
-        features.append(minIntensity)
-
-        maxIntensity = call(intensity, "Get maximum", 0, 0, "Parabolic")
-        features.append(maxIntensity)
-
-        meanIntensity = call(intensity, "Get mean", 0, 0, "energy")
-        features.append(meanIntensity)
-
-        formant = call(sound, "To Formant (burg)", 0.0, 5, 5500, 0.025, 50)
-        f1 = call(formant, "Get mean", 1, 0, 0, "Hertz")
-        features.append(f1)
-
-        f2 = call(formant, "Get mean", 2, 0, 0, "Hertz")
-        features.append(f2)
-
-        f3 = call(formant, "Get mean", 3, 0, 0, "Hertz")
-        features.append(f3)
-
-        f4 = call(formant, "Get mean", 4, 0, 0, "Hertz")
-        features.append(f4)
-
-        b1 = call(formant, "Get bandwidth at time", 1, 0.5, "Hertz", "Linear")
-        features.append(b1)
-
-        b2 = call(formant, "Get bandwidth at time", 2, 0.5, "Hertz", "Linear")
-        features.append(b2)
-
-        b3 = call(formant, "Get bandwidth at time", 3, 0.5, "Hertz", "Linear")
-        features.append(b3)
-
-        b4 = call(formant, "Get bandwidth at time", 4, 0.5, "Hertz", "Linear")
-        features.append(b4)
-
-        return np.array(features).reshape(1, -1)
\ No newline at end of file
+    def get_features(self, audio_file, features=None):
+        """
+        Extracts `features` from a file path or a parselmouth.Sound. By default
+        the models' features are extracted and returned as a FEATURE_NAMES-wide
+        row, with NaN for any feature no model needs. Intermediate Praat objects
+        are computed once and shared, and anything the requested subset does
+        not depend on is skipped.
+        """
+        names = features or self.feature_names
+        with track("load_sound"):
+            sound = load_sound(audio_file)
+        self.cache_hit = False
+        self.contour_data = None
+        if self.quality_limits is not None:
+            # Raises QualityError before any Praat analysis
+            with track("quality"):
+                self.quality_report = check(sound, self.quality_limits)
+
+        key = contour_key = None
+        values = None
+        if self.cache is not None:
+            key = audio_key(sound, names, self._cache_backend())
+            values = self.cache.get(key)
+            if self.contours is not None:
+                contour_key = contour_export.cache_key(sound, self.contours)
+                self.contour_data = self.cache.get_blob(contour_key)
+
+        # Segmented extraction happens on trimmed segments, possibly in other
+        # processes, so its Praat objects are of no use for whole-recording contours
+        extractor = None
+        if values is not None:
+            self.cache_hit = True
+        else:
+            with track("get_features"):
+                if self.segmentation is None:
+                    extractor = FeatureExtractor(sound, backend=self.perturbation_backend)
+                    values = extractor.extract(names)
+                else:
+                    values = extract_features(sound, names, self.perturbation_backend, self.segmentation,
+                                              self.segment_pool)
+            if key is not None:
+                self.cache.put(key, values)
+
+        if self.contours is not None and self.contour_data is None:
+            # Reuses the Pitch, Intensity and Harmonicity the features were computed from
+            extractor = extractor or FeatureExtractor(sound, backend=self.perturbation_backend)
+            with track("contours"):
+                self.contour_data = contour_export.encode(
+                    contour_export.compute(extractor, self.contours['width']),
+                    self.contours['dtype'], self.contours['delta'])
+            if contour_key is not None:
+                self.cache.put_blob(contour_key, self.contour_data)
+        return values if features else widen(values, names)
+
+    def analyze_many(self, paths, processes=None, timeout=None, threshold=None, pool=None):
+        """
+        Extracts features for every path across a pool of worker processes and
+        scores them all with every model in one pass. Returns one result per
+        path, in order, with per-file errors instead of failing the batch.
+        `pool` is a long-lived WorkerPool of extract_features to use instead of
+        starting one for this call (`processes` and `timeout` then come from it).
+        """
+        results = [{'file': path, 'cached': False} for path in paths]
+        extracted = [None] * len(paths)
+        keys = [None] * len(paths)
+        rejected = {}
+
+        if self.cache is not None or self.quality_limits is not None:
+            for i, path in enumerate(paths):
+                try:
+                    sound = load_sound(path)
+                except Exception:
+                    # Let the worker report the error for this file
+                    continue
+                if self.quality_limits is not None:
+                    try:
+                        check(sound, self.quality_limits)
+                    except QualityError as e:
+                        rejected[i] = e.report
+                        extracted[i] = (False, str(e))
+                        continue
+                if self.cache is None:
+                    continue
+                keys[i] = audio_key(sound, self.feature_names, self._cache_backend())
+                cached = self.cache.get(keys[i])
+                if cached is not None:
+                    extracted[i] = (True, cached)
+                    results[i]['cached'] = True
+
+        misses = [i for i in range(len(paths)) if extracted[i] is None]
+        # Files are already spread over the pool, so segments run inside each worker
+        segmentation = self.segmentation and {**self.segmentation, 'processes': 1}
+        tasks = ((paths[i], self.feature_names, self.perturbation_backend, segmentation) for i in misses)
+        if pool is not None:
+            outcomes = pool.map(tasks)
+        else:
+            with WorkerPool(extract_features, processes=processes, timeout=timeout) as pool:
+                outcomes = pool.map(tasks)
+        for i, outcome in zip(misses, outcomes):
+            extracted[i] = outcome
+            if outcome[0] and keys[i] is not None:
+                self.cache.put(keys[i], outcome[1])
+
+        succeeded = [i for i, (ok, _) in enumerate(extracted) if ok]
+
+        for result, (ok, value) in zip(results, extracted):
+            if not ok:
+                result['status'] = 'error'
+                result['error'] = value
+        for i, report in rejected.items():
+            results[i].update(status='rejected', reasons=report['reasons'], quality=report['metrics'])
+
+        if succeeded:
+            matrix = np.vstack([widen(extracted[i][1], self.feature_names) for i in succeeded])
+            primary = self.models.names[0]
+            for i, screening in zip(succeeded, self.screen_many(matrix, threshold)):
+                results[i]['status'] = 'success'
+                results[i]['prediction'] = screening[primary]
+                results[i]['screenings'] = screening
+
+        return results
+
+    def _cache_backend(self):
+        # Trimmed and segmented features differ from whole-recording ones
+        if self.segmentation is None:
+            return self.perturbation_backend
+        return f"{self.perturbation_backend}+vad{self.segmentation.get('window', vad.DEFAULT_WINDOW)}"
+
+
+def load_sound(audio_file):
+    if isinstance(audio_file, parselmouth.Sound):
+        return audio_file
+    return parselmouth.Sound(audio_file)
+
+
+def widen(values, names):
+    """Spreads rows of `names` features into FEATURE_NAMES-wide rows, NaN where a feature is missing."""
+    if list(names) == FEATURE_NAMES:
+        return values
+    wide = np.full((len(values), len(FEATURE_NAMES)), np.nan)
+    wide[:, [_INDEX[name] for name in names]] = values
+    return wide
+
+
+def extract_features(audio_file, features=None, perturbation_backend='praat', segmentation=None, segment_pool=None):
+    sound = load_sound(audio_file)
+    if segmentation is not None:
+        return vad.extract(sound, features, perturbation_backend, segment_pool=segment_pool, **segmentation)
+    extractor = FeatureExtractor(sound, backend=perturbation_backend)
+    return extractor.extract(features)
@@ -1,48 +1,245 @@
 import os
-from flask import Flask, request, jsonify
+import base64
+import json
+import threading
+import time
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-from pydub import AudioSegment
-# import parselmouth
-from analyzer import Analyzer
-from parkinsons import classify_parkinsons_info
-from parkinsons import get_parkinsons_chat_response
-
-app = Flask(__name__)
-
-CORS(app)
-
-UPLOAD_FOLDER = "uploads"
-ALLOWED_EXTENSIONS = {"wav", "mp3", "m4a"}
-
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+from rates import ANALYSIS_RATE, parse_rate_policy
+from jobs import LocalJobQueue, QueueFull
+from worker_pool import WorkerPool
+from storage import UploadStore, file_digest
+import metrics
+from lazy import lazy_import, load_all
+from parkinsons import ChatUnavailable, classify_parkinsons_info
+from parkinsons import get_parkinsons_chat_response, stream_parkinsons_chat_response
+
+# Everything that pulls in numpy, parselmouth, pydub or the model is imported
+# on first use; create_app loads it all up front unless LAZY_STARTUP is set
+pydub = lazy_import("pydub")
+audio = lazy_import("audio")
+analysis = lazy_import("analyzer")
+registry = lazy_import("registry")
+model_set = lazy_import("model_set")
+feature_cache = lazy_import("feature_cache")
+quality = lazy_import("quality")
+results_store = lazy_import("results_store")
+upload_sessions = lazy_import("upload_sessions")
+streaming = lazy_import("streaming")
+vad = lazy_import("vad")
+contours = lazy_import("contours")
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+ALLOWED_EXTENSIONS = {"wav", "mp3", "m4a", "flac", "opus", "ogg", "webm"}
+# Short recording analyzed by warm_up() so a fresh worker's first request is not a cold start
+WARMUP_SAMPLE = os.path.join(script_dir, "samples/warmup.wav")
+
+api = Blueprint("api", __name__)
+
+def config_from_env():
+    return {
+        "UPLOAD_FOLDER": os.getenv("UPLOAD_FOLDER", "uploads"),
+        # Converted uploads are kept UPLOAD_TTL seconds after their last use, within
+        # UPLOAD_MAX_BYTES in total; a sweeper enforces both every UPLOAD_SWEEP_INTERVAL seconds
+        # and also expires idle upload sessions and live streams
+        "UPLOAD_MAX_BYTES": int(os.getenv("UPLOAD_MAX_BYTES", 1024 ** 3)),
+        "UPLOAD_TTL": float(os.getenv("UPLOAD_TTL", 24 * 3600)),
+        "UPLOAD_SWEEP_INTERVAL": float(os.getenv("UPLOAD_SWEEP_INTERVAL", 300)),
+        # Chunked uploads (/uploads): size limit per upload and how long an idle one is kept
+        "UPLOAD_SESSION_MAX_BYTES": int(os.getenv("UPLOAD_SESSION_MAX_BYTES", 200 * 1024 * 1024)),
+        "UPLOAD_SESSION_TTL": float(os.getenv("UPLOAD_SESSION_TTL", 3600)),
+        # Jitter/shimmer backend: "numpy" (vectorized, parity-tested against Praat) or "praat"
+        "PERTURBATION_BACKEND": os.getenv("PERTURBATION_BACKEND", "numpy"),
+        # Rate uploads are resampled to once at decode time: "native", "minimum" or a rate in Hz
+        "ANALYSIS_RATE": parse_rate_policy(os.getenv("ANALYSIS_RATE", ANALYSIS_RATE)),
+        # Worker processes and per-file timeout (seconds) for /analyze/batch
+        "BATCH_WORKERS": int(os.getenv("BATCH_WORKERS", os.cpu_count() or 1)),
+        "BATCH_TIMEOUT": float(os.getenv("BATCH_TIMEOUT", 60)),
+        # Features keyed by decoded audio; FEATURE_CACHE_PATH enables the on-disk tier
+        "FEATURE_CACHE_ENTRIES": int(os.getenv("FEATURE_CACHE_ENTRIES", 1024)),
+        "FEATURE_CACHE_PATH": os.getenv("FEATURE_CACHE_PATH") or None,
+        "FEATURE_CACHE_MAX_BYTES": int(os.getenv("FEATURE_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+        # Background analysis jobs; submissions beyond JOB_MAX_PENDING (per worker
+        # process) get a 429. Job state is shared by all workers through JOB_DB_PATH
+        # (SQLite), which defaults to jobs.sqlite in UPLOAD_FOLDER
+        "JOB_WORKERS": int(os.getenv("JOB_WORKERS", 2)),
+        "JOB_MAX_PENDING": int(os.getenv("JOB_MAX_PENDING", 16)),
+        "JOB_DB_PATH": os.getenv("JOB_DB_PATH") or None,
+        # Live analysis streams open at once (shared by all workers under UPLOAD_FOLDER/live),
+        # and seconds without audio before one is dropped
+        "LIVE_MAX_STREAMS": int(os.getenv("LIVE_MAX_STREAMS", 32)),
+        "LIVE_IDLE_TIMEOUT": float(os.getenv("LIVE_IDLE_TIMEOUT", 60)),
+        # Models for further conditions, scored alongside Parkinson's from the same
+        # features: "name=path/to/bundle.pkl,..." (compiled .npz next to each bundle)
+        "SCREENING_MODELS": os.getenv("SCREENING_MODELS", ""),
+        # Import the audio and model code and build the stores on first use instead
+        # of at startup: faster boot, but the first requests pay for it
+        "LAZY_STARTUP": os.getenv("LAZY_STARTUP", "0") == "1",
+        # Per-subject result history (SQLite); defaults to results.sqlite in UPLOAD_FOLDER
+        "RESULTS_DB_PATH": os.getenv("RESULTS_DB_PATH") or None,
+        # Pre-flight quality gate; QUALITY_GATE=0 disables it and QUALITY_<LIMIT>
+        # (e.g. QUALITY_MIN_DURATION) overrides one of quality.DEFAULT_LIMITS.
+        # Only the overrides are kept: the gate fills in the defaults itself
+        "QUALITY_LIMITS": None if os.getenv("QUALITY_GATE", "1") == "0" else {
+            key[len("QUALITY_"):].lower(): float(value) for key, value in os.environ.items()
+            if key.startswith("QUALITY_") and key != "QUALITY_GATE"
+        },
+        # Voice activity trimming, with voiced audio longer than VAD_WINDOW seconds
+        # split into segments extracted on VAD_WORKERS processes (see vad.py).
+        # Off by default: the model was trained on untrimmed recordings. Without
+        # VAD_WINDOW, vad.DEFAULT_WINDOW applies where vad is used, so reading the
+        # settings does not import it (and numpy and parselmouth) under LAZY_STARTUP
+        "SEGMENTATION": None if os.getenv("VAD_ENABLED", "0") == "0" else {
+            **({"window": float(os.environ["VAD_WINDOW"])} if os.getenv("VAD_WINDOW") else {}),
+            "processes": int(os.getenv("VAD_WORKERS", os.cpu_count() or 1)),
+        },
+    }
+
+class LazyExtensions(dict):
+    """app.extensions that builds each registered entry the first time it is looked up."""
+
+    def __init__(self, factories, *args):
+        super().__init__(*args)
+        self.factories = factories
+        # Reentrant: a factory may look up the entries it depends on
+        self._lock = threading.RLock()
+
+    def __missing__(self, name):
+        if name not in self.factories:
+            raise KeyError(name)
+        with self._lock:
+            if not dict.__contains__(self, name):
+                self[name] = self.factories[name]()
+            return dict.__getitem__(self, name)
+
+def create_app(config=None):
+    """
+    Builds the Flask app. Settings come from the environment (see
+    config_from_env) and can be overridden with `config`. With LAZY_STARTUP
+    the stores, caches and models below are only built when a request first
+    needs them.
+    """
+    app = Flask(__name__)
+    app.config.update(config_from_env())
+    app.config.update(config or {})
+    config = app.config
+
+    CORS(app)
+    factories = {
+        "upload_store": lambda: UploadStore(
+            config["UPLOAD_FOLDER"],
+            max_bytes=config["UPLOAD_MAX_BYTES"],
+            ttl=config["UPLOAD_TTL"],
+            sweep_interval=config["UPLOAD_SWEEP_INTERVAL"],
+        ),
+        "upload_sessions": lambda: upload_sessions.UploadSessions(
+            os.path.join(config["UPLOAD_FOLDER"], "sessions"),
+            max_bytes=config["UPLOAD_SESSION_MAX_BYTES"],
+            ttl=config["UPLOAD_SESSION_TTL"],
+            sweep_interval=config["UPLOAD_SWEEP_INTERVAL"],
+        ),
+        "feature_cache": lambda: feature_cache.FeatureCache(
+            max_entries=config["FEATURE_CACHE_ENTRIES"],
+            disk_path=config["FEATURE_CACHE_PATH"],
+            max_disk_bytes=config["FEATURE_CACHE_MAX_BYTES"],
+        ),
+        # Extraction processes for /analyze/batch, started on the first batch and
+        # kept; concurrent batches queue for them instead of starting more
+        "batch_pool": lambda: WorkerPool(analysis.extract_features, processes=config["BATCH_WORKERS"],
+                                         timeout=config["BATCH_TIMEOUT"]),
+        # Processes for the segments of one long recording when VAD runs on more
+        # than one, kept like batch_pool so each request does not start its own
+        "segment_pool": lambda: WorkerPool(vad.extract_segment, processes=config["SEGMENTATION"]["processes"])
+        if config["SEGMENTATION"] and config["SEGMENTATION"]["processes"] > 1 else None,
+        "job_queue": lambda: LocalJobQueue(
+            workers=config["JOB_WORKERS"],
+            max_pending=config["JOB_MAX_PENDING"],
+            db_path=config["JOB_DB_PATH"] or os.path.join(config["UPLOAD_FOLDER"], "jobs.sqlite"),
+        ),
+        "live_streams": lambda: streaming.LiveStreams(
+            os.path.join(config["UPLOAD_FOLDER"], "live"),
+            lambda: analysis.Analyzer(models=app.extensions["model_set"]),
+            max_streams=config["LIVE_MAX_STREAMS"],
+            idle_timeout=config["LIVE_IDLE_TIMEOUT"],
+            sweep_interval=config["UPLOAD_SWEEP_INTERVAL"],
+        ),
+        "results_store": lambda: results_store.ResultsStore(
+            config["RESULTS_DB_PATH"] or os.path.join(config["UPLOAD_FOLDER"], "results.sqlite")),
+        # Requests share one registry; get() loads the model and scaler
+        "model_registry": lambda: registry.get_registry(),
+        "model_set": lambda: model_set.ModelSet(
+            [model_set.ScreeningModel("parkinsons", app.extensions["model_registry"], "Parkinson's")]
+            + model_set.parse_models(config["SCREENING_MODELS"])),
+    }
+    app.extensions = LazyExtensions(factories, app.extensions)
+    if not config["LAZY_STARTUP"]:
+        # Import and build everything now, so a preloading gunicorn master
+        # shares it with its workers and the first request is not a cold start
+        load_all()
+        for name in factories:
+            app.extensions[name]
+        app.extensions["model_set"].get()
+
+    app.register_blueprint(api)
+    return app
+
+def warm_up(app, sample=WARMUP_SAMPLE):
+    """
+    Runs one uncached analysis of `sample` so code paths, Praat and the model
+    are warm before the process takes traffic. Returns the time it took.
+    """
+    start = time.perf_counter()
+    analyzer = analysis.Analyzer(models=app.extensions["model_set"],
+                        perturbation_backend=app.config["PERTURBATION_BACKEND"],
+                        segmentation=app.config["SEGMENTATION"],
+                        segment_pool=app.extensions["segment_pool"])
+    analyzer.predict(analyzer.get_features(sample))
+    elapsed = time.perf_counter() - start
+    print(f"Warm-up analysis of {sample} took {elapsed:.2f}s")
+    return elapsed
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def convert_to_wav(input_path, output_path):
+def convert_to_wav(input_path, output_path, rate_policy=None):
+    if rate_policy is None:
+        rate_policy = current_app.config["ANALYSIS_RATE"]
     try:
-        audio = AudioSegment.from_file(input_path)
-
-        audio = audio.set_frame_rate(44100)
-        audio = audio.set_channels(1)
-        audio = audio.set_sample_width(2)
+        with metrics.track("convert_to_wav"):
+            segment = pydub.AudioSegment.from_file(input_path)
+            segment = audio.normalize(segment, rate_policy)
 
-        # Export as WAV
-        audio.export(output_path, format="wav", parameters=["-ac", "1"])
+            # Export as WAV
+            segment.export(output_path, format="wav", parameters=["-ac", "1"])
         print(f"Successfully converted {input_path} to {output_path}")
         return True
     except Exception as e:
         print(f"Conversion error: {str(e)}")
         return False
 
-@app.route("/")
+@api.before_app_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@api.after_app_request
+def record_request(response):
+    if metrics.ENABLED and "request_start" in g:
+        endpoint = request.endpoint or "unknown"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                        endpoint=endpoint, method=request.method)
+        metrics.REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+@api.route("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@api.route("/")
 def home():
     return "Pearlyx Backend is Running!"
 
-@app.route("/upload", methods=["POST"])
+@api.route("/upload", methods=["POST"])
 def upload_audio():
     if "file" not in request.files:
         return jsonify({"error": "No file part"}), 400
@@ -52,34 +249,162 @@ def upload_audio():
         return jsonify({"error": "No selected file"}), 400
 
     if file and allowed_file(file.filename):
+        store = current_app.extensions["upload_store"]
+        filename = secure_filename(file.filename)
+        original_filepath = store.temp_path(os.path.splitext(filename)[1])
+        wav_filepath = None
         try:
-            filename = secure_filename(file.filename)
-            original_filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
             file.save(original_filepath)
-
-            # Always convert to WAV with specific parameters
-            wav_filename = f"{os.path.splitext(filename)[0]}.wav"
-            wav_filepath = os.path.join(app.config["UPLOAD_FOLDER"], wav_filename)
-
-            if convert_to_wav(original_filepath, wav_filepath):
-                # Remove original file if it's not the same as the WAV file
-                if original_filepath != wav_filepath:
-                    os.remove(original_filepath)
-                return jsonify({
-                    "message": "File uploaded and converted successfully!",
-                    "filepath": wav_filepath,
-                    "filename": wav_filename
-                }), 200
-            else:
-                return jsonify({"error": "Error converting audio file"}), 500
+            rate_policy = current_app.config["ANALYSIS_RATE"]
+            # The same original converted at the same rate is the same WAV
+            source = file_digest(original_filepath, prefix=str(rate_policy).encode())
+            upload = store.lookup_source(source, filename)
+
+            if upload is None:
+                # Always convert to WAV with specific parameters
+                wav_filepath = store.temp_path(".wav")
+                if not convert_to_wav(original_filepath, wav_filepath, rate_policy):
+                    return jsonify({"error": "Error converting audio file"}), 500
+                upload = store.add(wav_filepath, filename, source)
+
+            # `filename` is the opaque upload id; the other endpoints accept it as before
+            return jsonify({
+                "message": "File uploaded and converted successfully!",
+                "filename": upload.id,
+                "name": filename,
+                "size": upload.size
+            }), 200
 
         except Exception as e:
             print(f"Upload error: {str(e)}")
             return jsonify({"error": f"Upload failed: {str(e)}"}), 500
+        finally:
+            for path in (original_filepath, wav_filepath):
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
 
     return jsonify({"error": "Invalid file type"}), 400
 
-@app.route("/analyze", methods=["POST"])
+def session_response(session, status=200):
+    response = jsonify({
+        "session_id": session["session_id"],
+        "name": session["name"],
+        "size": session["size"],
+        "offset": session["offset"],
+        "upload_url": f"/uploads/{session['session_id']}"
+    })
+    response.headers["Upload-Offset"] = str(session["offset"])
+    return response, status
+
+@api.route("/uploads", methods=["POST"])
+def create_upload_session():
+    """Opens a chunked upload: JSON {name, size (optional)}; chunks then go to PATCH /uploads/<id>."""
+    data = request.get_json(silent=True) or {}
+    name = secure_filename(data.get("name") or "")
+    if not name or not allowed_file(name):
+        return jsonify({"error": "Invalid file type"}), 400
+    size = data.get("size")
+    if size is not None and (not isinstance(size, int) or size < 0):
+        return jsonify({"error": "size must be a non-negative integer"}), 400
+
+    try:
+        session = current_app.extensions["upload_sessions"].create(
+            name, size, current_app.config["ANALYSIS_RATE"])
+    except upload_sessions.UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    return session_response(session, 201)
+
+@api.route("/uploads/<session_id>", methods=["GET", "HEAD"])
+def upload_session_status(session_id):
+    """Where to resume: the offset is in the body and the Upload-Offset header."""
+    session = current_app.extensions["upload_sessions"].status(session_id)
+    if session is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return session_response(session)
+
+@api.route("/uploads/<session_id>", methods=["PATCH"])
+def append_upload_chunk(session_id):
+    """Appends the raw request body at the Upload-Offset header; 409 with the real offset on a mismatch."""
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "Upload-Offset header required"}), 400
+
+    sessions = current_app.extensions["upload_sessions"]
+    try:
+        sessions.append(session_id, offset, request.get_data(cache=False))
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+    except upload_sessions.OffsetMismatch as e:
+        response = jsonify({"error": str(e), "offset": e.offset})
+        response.headers["Upload-Offset"] = str(e.offset)
+        return response, 409
+    except upload_sessions.UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    return session_response(sessions.status(session_id))
+
+@api.route("/uploads/<session_id>", methods=["DELETE"])
+def abort_upload_session(session_id):
+    if not current_app.extensions["upload_sessions"].discard(session_id):
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify({"message": "Upload aborted"}), 200
+
+@api.route("/uploads/<session_id>/complete", methods=["POST"])
+def complete_upload_session(session_id):
+    """
+    Finishes decoding and stores the recording like /upload does. With
+    {"analyze": true} the decoded audio is analyzed in the same request and
+    the result returned under "analysis".
+    """
+    data = request.get_json(silent=True) or {}
+    sessions = current_app.extensions["upload_sessions"]
+    store = current_app.extensions["upload_store"]
+    session = sessions.status(session_id)
+    if session is None:
+        return jsonify({"error": "Upload not found"}), 404
+    try:
+        subject = subject_fields(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        with metrics.track("decode"):
+            sound, spool_path = sessions.finish(session_id)
+    except upload_sessions.OffsetMismatch as e:
+        return jsonify({"error": f"Upload incomplete: {str(e)}", "offset": e.offset}), 409
+    except Exception as e:
+        print(f"Decode error: {str(e)}")
+        sessions.discard(session_id)
+        return jsonify({"error": "Error converting audio file"}), 500
+
+    try:
+        source = file_digest(spool_path, prefix=str(session["rate_policy"]).encode())
+        upload = store.lookup_source(source, session["name"])
+        if upload is None:
+            wav_filepath = store.temp_path(".wav")
+            audio.write_wav(sound, wav_filepath)
+            upload = store.add(wav_filepath, session["name"], source)
+    finally:
+        sessions.discard(session_id)
+
+    body = {
+        "message": "File uploaded and converted successfully!",
+        "filename": upload.id,
+        "name": session["name"],
+        "size": upload.size
+    }
+    if data.get("analyze"):
+        try:
+            body["analysis"] = run_analysis(sound, data.get("needs_classification", False), subject=subject)
+        except quality.QualityError as e:
+            response, status = quality_rejection(e)
+            return jsonify({**response.get_json(), "filename": upload.id, "name": session["name"]}), status
+        except Exception as e:
+            print(f"Error in complete_upload_session: {str(e)}")
+            body["analysis"] = {"error": f"Analysis failed: {str(e)}", "status": "error"}
+    return jsonify(body), 200
+
+@api.route("/analyze", methods=["POST"])
 def analyze_audio():
     try:
         if not request.is_json:
@@ -91,46 +416,391 @@ def analyze_audio():
 
         if not filename:
             return jsonify({"error": "No filename provided"}), 400
+        try:
+            subject = subject_fields(data)
+            contour_options = contours.parse_options(data.get("contours"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+        file_path = current_app.extensions["upload_store"].path(filename)
+        if file_path is None:
+            return jsonify({"error": f"File not found: {filename}"}), 404
 
-        if not os.path.exists(file_path):
-            return jsonify({"error": f"File not found: {file_path}"}), 404
+        return jsonify(run_analysis(file_path, needs_classification, subject=subject,
+                                    contour_options=contour_options)), 200
 
-        analyzer = Analyzer(file="models/model.pkl")
-        features = analyzer.get_features(file_path)
-        prediction_result = analyzer.predict(features)
+    except quality.QualityError as e:
+        return quality_rejection(e)
+    except Exception as e:
+        print(f"Error in analyze_audio: {str(e)}")
+        return jsonify({
+            "error": f"Analysis failed: {str(e)}",
+            "status": "error"
+        }), 500
 
-        response_data = {
-            "prediction": prediction_result,
-            "status": "success"
-        }
+@api.route("/contours/<filename>", methods=["GET"])
+def contour_export(filename):
+    """
+    The file's pitch, intensity and HNR contours as binary (see contours.py),
+    decimated to ?width= columns, as ?dtype=float16|float32, delta-encoded with
+    ?delta=1. Features are extracted and cached along the way, so a following
+    /analyze of the file is a cache hit.
+    """
+    try:
+        contour_options = contours.parse_options({
+            "width": request.args.get("width", contours.DEFAULT_WIDTH),
+            "dtype": request.args.get("dtype", "float16"),
+            "delta": request.args.get("delta", "0").lower() in ("1", "true"),
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    file_path = current_app.extensions["upload_store"].path(filename)
+    if file_path is None:
+        return jsonify({"error": f"File not found: {filename}"}), 404
+
+    analyzer = analysis.Analyzer(models=current_app.extensions["model_set"],
+                        perturbation_backend=current_app.config["PERTURBATION_BACKEND"],
+                        cache=current_app.extensions["feature_cache"],
+                        quality_limits=current_app.config["QUALITY_LIMITS"],
+                        segmentation=current_app.config["SEGMENTATION"],
+                        segment_pool=current_app.extensions["segment_pool"],
+                        contours=contour_options)
+    try:
+        analyzer.get_features(file_path)
+    except quality.QualityError as e:
+        return quality_rejection(e)
+    except Exception as e:
+        print(f"Error in contour_export: {str(e)}")
+        return jsonify({"error": f"Contour export failed: {str(e)}", "status": "error"}), 500
+    return Response(analyzer.contour_data, mimetype="application/octet-stream")
+
+@api.route("/upload-and-analyze", methods=["POST"])
+def upload_and_analyze():
+    """Decodes the upload in memory and analyzes it in the same request; nothing is written to disk."""
+    if "file" not in request.files:
+        return jsonify({"error": "No file part"}), 400
 
-        if needs_classification and prediction_result['prediction'] == 1:
-            additional_info = classify_parkinsons_info("Detected symptoms based on audio analysis.")
-            response_data["classification"] = additional_info
+    file = request.files["file"]
+    if file.filename == "":
+        return jsonify({"error": "No selected file"}), 400
+
+    if not allowed_file(file.filename):
+        return jsonify({"error": "Invalid file type"}), 400
+
+    needs_classification = request.form.get("needs_classification", "false").lower() == "true"
+    try:
+        subject = subject_fields(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        return jsonify(response_data), 200
+    try:
+        sound = audio.decode_bytes(file.read(), secure_filename(file.filename), current_app.config["ANALYSIS_RATE"])
+    except Exception as e:
+        print(f"Decode error: {str(e)}")
+        return jsonify({"error": "Error converting audio file"}), 500
 
+    try:
+        return jsonify(run_analysis(sound, needs_classification, subject=subject)), 200
+    except quality.QualityError as e:
+        return quality_rejection(e)
     except Exception as e:
-        print(f"Error in analyze_audio: {str(e)}")
+        print(f"Error in upload_and_analyze: {str(e)}")
         return jsonify({
             "error": f"Analysis failed: {str(e)}",
             "status": "error"
         }), 500
 
-@app.route("/delete/<filename>", methods=["DELETE"])
+def subject_fields(data):
+    """
+    Reads the optional subject_id, session_id and recorded_at (epoch seconds)
+    of a request as ResultsStore.record arguments; None without a subject.
+    Raises ValueError for malformed values.
+    """
+    subject = data.get("subject_id")
+    if subject in (None, ""):
+        return None
+    session = data.get("session_id") or None
+    recorded_at = data.get("recorded_at") or None
+    if not isinstance(subject, str) or len(subject) > 128:
+        raise ValueError("subject_id must be a string of at most 128 characters")
+    if session is not None and (not isinstance(session, str) or len(session) > 128):
+        raise ValueError("session_id must be a string of at most 128 characters")
+    try:
+        recorded_at = None if recorded_at is None else float(recorded_at)
+    except (TypeError, ValueError):
+        raise ValueError("recorded_at must be a Unix timestamp")
+    return {"subject": subject, "session": session, "recorded_at": recorded_at}
+
+def quality_rejection(error):
+    """422 response for a recording the quality gate turned away."""
+    return jsonify({
+        "error": str(error),
+        "status": "rejected",
+        "reasons": error.report["reasons"],
+        "quality": error.report["metrics"]
+    }), 422
+
+def run_analysis(source, needs_classification=False, progress=None, subject=None, contour_options=None):
+    """
+    Analyzes a file path or parselmouth.Sound and builds the /analyze response
+    body. `progress(stage, fraction)` is called as the analysis moves along.
+    With `subject` (see subject_fields) the result is recorded in the results
+    store, and with `contour_options` (see contours.parse_options) the body
+    carries the encoded contours in base64. Raises QualityError when the
+    recording fails the quality gate.
+    """
+    if progress is None:
+        progress = lambda stage, fraction: None
+
+    analyzer = analysis.Analyzer(models=current_app.extensions["model_set"],
+                        perturbation_backend=current_app.config["PERTURBATION_BACKEND"],
+                        cache=current_app.extensions["feature_cache"],
+                        quality_limits=current_app.config["QUALITY_LIMITS"],
+                        segmentation=current_app.config["SEGMENTATION"],
+                        segment_pool=current_app.extensions["segment_pool"],
+                        contours=contour_options)
+    progress("extracting features", 0.1)
+    features = analyzer.get_features(source)
+    progress("predicting", 0.8)
+    screening = analyzer.screen(features)
+    prediction_result = screening["parkinsons"]
+
+    response_data = {
+        "prediction": prediction_result,
+        # One result per model in the set, Parkinson's included
+        "screenings": screening,
+        "model_version": analyzer.model_version,
+        "model_versions": analyzer.model_versions,
+        "cached": analyzer.cache_hit,
+        "status": "success"
+    }
+    if analyzer.quality_report is not None:
+        response_data["quality"] = analyzer.quality_report["metrics"]
+    if analyzer.contour_data is not None:
+        response_data["contours"] = base64.b64encode(analyzer.contour_data).decode("ascii")
+    if subject is not None:
+        response_data["result_id"] = current_app.extensions["results_store"].record(
+            features=features[0], prediction=prediction_result, model_version=analyzer.model_version, **subject)
+
+    if needs_classification and prediction_result['prediction'] == 1:
+        progress("classifying", 0.9)
+        additional_info = classify_parkinsons_info("Detected symptoms based on audio analysis.")
+        response_data["classification"] = additional_info
+
+    return response_data
+
+@api.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    try:
+        if not request.is_json:
+            return jsonify({"error": "Content-Type must be application/json"}), 415
+
+        data = request.get_json()
+        filenames = data.get("filenames")
+
+        if not filenames or not isinstance(filenames, list):
+            return jsonify({"error": "No filenames provided"}), 400
+
+        results = [None] * len(filenames)
+        paths = []
+        for i, filename in enumerate(filenames):
+            file_path = current_app.extensions["upload_store"].path(filename)
+            if file_path is not None:
+                paths.append((i, file_path))
+            else:
+                results[i] = {"status": "error", "error": f"File not found: {filename}"}
+
+        analyzer = analysis.Analyzer(models=current_app.extensions["model_set"],
+                            perturbation_backend=current_app.config["PERTURBATION_BACKEND"],
+                            cache=current_app.extensions["feature_cache"],
+                            quality_limits=current_app.config["QUALITY_LIMITS"],
+                            segmentation=current_app.config["SEGMENTATION"])
+        analyzed = analyzer.analyze_many([path for _, path in paths],
+                                         pool=current_app.extensions["batch_pool"])
+        for (i, _), result in zip(paths, analyzed):
+            del result["file"]
+            results[i] = result
+
+        for filename, result in zip(filenames, results):
+            result["filename"] = filename
+
+        return jsonify({
+            "results": results,
+            "model_version": analyzer.model_version,
+            "model_versions": analyzer.model_versions,
+            "status": "success"
+        }), 200
+
+    except Exception as e:
+        print(f"Error in analyze_batch: {str(e)}")
+        return jsonify({
+            "error": f"Batch analysis failed: {str(e)}",
+            "status": "error"
+        }), 500
+
+@api.route("/jobs", methods=["POST"])
+def submit_job():
+    if not request.is_json:
+        return jsonify({"error": "Content-Type must be application/json"}), 415
+
+    data = request.get_json()
+    filename = data.get("filename")
+    needs_classification = data.get("needs_classification", False)
+
+    if not filename:
+        return jsonify({"error": "No filename provided"}), 400
+    try:
+        subject = subject_fields(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    file_path = current_app.extensions["upload_store"].path(filename)
+    if file_path is None:
+        return jsonify({"error": f"File not found: {filename}"}), 404
+
+    # Jobs run on pool threads, outside this request's app context
+    app = current_app._get_current_object()
+
+    def analyze(progress):
+        with app.app_context():
+            return run_analysis(file_path, needs_classification, progress, subject)
+
+    try:
+        job = current_app.extensions["job_queue"].submit(analyze)
+    except QueueFull as e:
+        response = jsonify({"error": "Too many analyses in progress, please retry later", "status": "error"})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
+
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events"
+    }), 202
+
+@api.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = current_app.extensions["job_queue"].get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot()), 200
+
+@api.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Server-sent events: one 'progress' event per change, then a final 'done' event."""
+    # The stream outlives the request context, so hold on to the queue itself
+    job_queue = current_app.extensions["job_queue"]
+    if job_queue.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def stream():
+        for snapshot in job_queue.events(job_id):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+                continue
+            event = "done" if snapshot["status"] in ("succeeded", "failed") else "progress"
+            yield f"event: {event}\ndata: {json.dumps(snapshot)}\n\n"
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api.route("/subjects/<subject_id>/trend", methods=["GET"])
+def subject_trend(subject_id):
+    """Running means and slopes of jitter, shimmer, HNR and probability, overall and over recent days."""
+    trend = current_app.extensions["results_store"].trend(subject_id)
+    if trend is None:
+        return jsonify({"error": "Subject not found"}), 404
+    return jsonify(trend), 200
+
+@api.route("/subjects/<subject_id>/results", methods=["GET"])
+def subject_results(subject_id):
+    """The subject's recorded results, newest first, optionally between ?from= and ?to= (epoch seconds)."""
+    try:
+        start = request.args.get("from", type=float)
+        end = request.args.get("to", type=float)
+        limit = min(int(request.args.get("limit", 100)), 1000)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    results = current_app.extensions["results_store"].results(subject_id, start, end, limit)
+    return jsonify({"subject": subject_id, "results": results}), 200
+
+@api.route("/live", methods=["POST"])
+def open_live_stream():
+    """
+    Starts a live analysis: JSON {rate, block, hop, window} (all optional).
+    Audio then goes to POST /live/<id>/frames as raw little-endian 16-bit mono PCM.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        # The stream store attaches an Analyzer whenever frames arrive
+        streaming_analyzer = streaming.StreamingAnalyzer(
+            None,
+            rate=int(data.get("rate", ANALYSIS_RATE)),
+            block=float(data.get("block", streaming.DEFAULT_BLOCK)),
+            hop=float(data.get("hop", streaming.DEFAULT_HOP)),
+            window=float(data.get("window", streaming.DEFAULT_WINDOW)),
+            backend=current_app.config["PERTURBATION_BACKEND"])
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        stream_id = current_app.extensions["live_streams"].open(streaming_analyzer)
+    except streaming.StreamLimit as e:
+        return jsonify({"error": str(e), "status": "error"}), 429
+    return jsonify({
+        "stream_id": stream_id,
+        "frames_url": f"/live/{stream_id}/frames",
+        "rate": streaming_analyzer.rate,
+        "block": streaming_analyzer.block,
+        "hop": streaming_analyzer.hop,
+        "window": streaming_analyzer.window
+    }), 201
+
+@api.route("/live/<stream_id>/frames", methods=["POST"])
+def push_live_frames(stream_id):
+    """Feeds audio to the stream; returns the provisional updates it completed (one per hop)."""
+    updates = current_app.extensions["live_streams"].push(stream_id, request.get_data(cache=False))
+    if updates is None:
+        return jsonify({"error": "Stream not found"}), 404
+    return jsonify({"updates": updates}), 200
+
+@api.route("/live/<stream_id>", methods=["GET"])
+def live_stream_status(stream_id):
+    streaming_analyzer = current_app.extensions["live_streams"].get(stream_id)
+    if streaming_analyzer is None:
+        return jsonify({"error": "Stream not found"}), 404
+    return jsonify({"latest": streaming_analyzer.latest,
+                    "seconds": round(streaming_analyzer.samples_seen / streaming_analyzer.rate, 3)}), 200
+
+@api.route("/live/<stream_id>", methods=["DELETE"])
+def close_live_stream(stream_id):
+    streaming_analyzer = current_app.extensions["live_streams"].close(stream_id)
+    if streaming_analyzer is None:
+        return jsonify({"error": "Stream not found"}), 404
+    return jsonify({"latest": streaming_analyzer.latest,
+                    "seconds": round(streaming_analyzer.samples_seen / streaming_analyzer.rate, 3)}), 200
+
+@api.route("/delete/<filename>", methods=["DELETE"])
 def delete_file(filename):
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    store = current_app.extensions["upload_store"]
+    if store.delete(filename):
+        print(f"Upload deleted: {filename}")
+        return jsonify({"message": "File deleted successfully!"}), 200
 
-    if os.path.exists(file_path):
+    # Plain files placed in UPLOAD_FOLDER before the store existed
+    file_path = store.path(filename)
+    if file_path is not None:
         os.remove(file_path)
         print(f"File Deleted: {file_path}")
         return jsonify({"message": "File deleted successfully!"}), 200
     else:
         return jsonify({"error": "File not found"}), 404
 
-@app.route("/chat", methods=["POST"])
+CHAT_UNAVAILABLE = {"error": "Chat is not configured on this server", "status": "unavailable"}
+
+@api.route("/chat", methods=["POST"])
 def chat():
     try:
         if not request.is_json:
@@ -149,6 +819,9 @@ def chat():
             "status": "success"
         }), 200
 
+    except ChatUnavailable as e:
+        print(f"Chat unavailable: {str(e)}")
+        return jsonify(CHAT_UNAVAILABLE), 503
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")  # Debug log
         return jsonify({
@@ -156,5 +829,35 @@ def chat():
             "status": "error"
         }), 500
 
+@api.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Relays the chat reply as server-sent events: `chunk` events with text, then `done` or `error`."""
+    if not request.is_json:
+        return jsonify({"error": "Content-Type must be application/json"}), 415
+
+    message = (request.get_json(silent=True) or {}).get("message")
+    if not message:
+        return jsonify({"error": "No message provided"}), 400
+
+    try:
+        chunks = stream_parkinsons_chat_response(message)
+    except ChatUnavailable as e:
+        print(f"Chat unavailable: {str(e)}")
+        return jsonify(CHAT_UNAVAILABLE), 503
+
+    def stream():
+        try:
+            for text in chunks:
+                yield f"event: chunk\ndata: {json.dumps({'text': text})}\n\n"
+        except Exception as e:
+            print(f"Error in chat stream: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Chat failed, please try again.'})}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Development server; production runs gunicorn with wsgi:app (see gunicorn.conf.py)
+    create_app().run(debug=True)
@@ -0,0 +1,250 @@
+import io
+import os
+import struct
+import subprocess
+import threading
+import wave
+
+import numpy as np
+import parselmouth
+from pydub import AudioSegment
+
+from metrics import track
+# Also imported from here; rates.py itself stays importable without numpy or parselmouth
+from rates import ANALYSIS_RATE, analysis_rate, parse_rate_policy
+
+
+def normalize(audio, rate_policy=ANALYSIS_RATE):
+    """Applies the analysis format to a pydub AudioSegment."""
+    audio = audio.set_frame_rate(analysis_rate(audio.frame_rate, rate_policy))
+    audio = audio.set_channels(1)
+    audio = audio.set_sample_width(2)
+    return audio
+
+
+def segment_to_sound(audio):
+    """Builds a parselmouth.Sound from a mono 16-bit AudioSegment without touching disk."""
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16)
+    # Same scaling Praat applies when it reads a 16-bit WAV file
+    return parselmouth.Sound(samples / 32768.0, sampling_frequency=audio.frame_rate)
+
+
+def _read_pcm16_wav(data):
+    """Returns an AudioSegment for mono 16-bit PCM WAV data, or None for anything else."""
+    try:
+        with wave.open(io.BytesIO(data), 'rb') as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != 2 or wav.getcomptype() != 'NONE':
+                return None
+            frames = wav.readframes(wav.getnframes())
+            rate = wav.getframerate()
+    except (wave.Error, EOFError):
+        return None
+    return AudioSegment(data=frames, sample_width=2, frame_rate=rate, channels=1)
+
+
+def decode_bytes(data, filename, rate_policy=ANALYSIS_RATE):
+    """
+    Decodes an uploaded file held in memory straight into a parselmouth.Sound.
+
+    Mono 16-bit WAV is parsed directly and never goes through ffmpeg;
+    streamable compressed formats (STREAMABLE_EXTENSIONS) are piped through a
+    single ffmpeg process and anything else through pydub. Resampling follows
+    `rate_policy` and the samples match what /upload writes to disk and Praat
+    reads back under the same policy.
+    """
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+
+    with track("decode"):
+        audio = _read_pcm16_wav(data) if extension == 'wav' else None
+        if audio is None and extension in STREAMABLE_EXTENSIONS:
+            decoder = FfmpegStreamDecoder(rate_policy)
+            try:
+                decoder.feed(data)
+                return decoder.finish()
+            finally:
+                decoder.close()
+        if audio is None:
+            audio = AudioSegment.from_file(io.BytesIO(data), format=extension or None)
+
+        return segment_to_sound(normalize(audio, rate_policy))
+
+
+class UnsupportedStream(ValueError):
+    """The stream decoder cannot handle this input; fall back to another decoder."""
+
+
+# WAV data chunk sizes that mean "until the end of the stream"
+_UNKNOWN_SIZES = (0, 0xFFFFFFFF)
+
+
+class WavStreamDecoder:
+    """
+    Decodes 16-bit PCM WAV as it arrives: feed() the bytes in order, then
+    finish() returns the normalized parselmouth.Sound. Only the header is
+    parsed up front; the samples are just collected, so finish() has
+    nothing left to do but downmix and resample.
+    """
+
+    def __init__(self, rate_policy=ANALYSIS_RATE):
+        self.rate_policy = rate_policy
+        self.format = None
+        self._header = bytearray()
+        self._pcm = bytearray()
+        self._remaining = None
+
+    def feed(self, data):
+        if self.format is not None:
+            self._append(data)
+            return
+        self._header += data
+        self._parse_header()
+
+    def _parse_header(self):
+        header = self._header
+        if len(header) < 12:
+            return
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise UnsupportedStream("Not a RIFF/WAVE stream")
+
+        position, fmt = 12, None
+        while position + 8 <= len(header):
+            chunk_id = bytes(header[position:position + 4])
+            size = int.from_bytes(header[position + 4:position + 8], 'little')
+            if chunk_id == b'data':
+                if fmt is None:
+                    raise UnsupportedStream("WAV data chunk before fmt chunk")
+                self.format = fmt
+                self._remaining = None if size in _UNKNOWN_SIZES else size
+                rest = bytes(header[position + 8:])
+                self._header = None
+                self._append(rest)
+                return
+            if position + 8 + size > len(header):
+                return
+            if chunk_id == b'fmt ':
+                fmt = self._parse_fmt(bytes(header[position + 8:position + 8 + size]))
+            # Chunks are padded to an even length
+            position += 8 + size + (size & 1)
+
+    @staticmethod
+    def _parse_fmt(body):
+        tag, channels, rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+        if tag == 0xFFFE and len(body) >= 26:
+            # WAVE_FORMAT_EXTENSIBLE: the real format tag opens the subformat GUID
+            tag = int.from_bytes(body[24:26], 'little')
+        if tag != 1 or bits != 16:
+            # Everything else goes through ffmpeg, as decode_bytes does
+            raise UnsupportedStream(f"WAV format {tag} with {bits}-bit samples")
+        return channels, rate
+
+    def _append(self, data):
+        if self._remaining is not None:
+            data = data[:self._remaining]
+            self._remaining -= len(data)
+        self._pcm += data
+
+    def finish(self):
+        if self.format is None:
+            raise ValueError("Incomplete WAV header")
+        channels, rate = self.format
+        frame_bytes = 2 * channels
+        pcm = bytes(self._pcm[:len(self._pcm) - len(self._pcm) % frame_bytes])
+        audio = AudioSegment(data=pcm, sample_width=2, frame_rate=rate, channels=channels)
+        return segment_to_sound(normalize(audio, self.rate_policy))
+
+    def close(self):
+        pass
+
+
+class FfmpegStreamDecoder:
+    """
+    Decodes compressed audio (Opus, FLAC, MP3, ...) as it arrives by piping it
+    through one long-running ffmpeg process, which streams 16-bit WAV back into
+    a WavStreamDecoder. By the time the last bytes are fed, ffmpeg is only a
+    few frames behind.
+    """
+
+    def __init__(self, rate_policy=ANALYSIS_RATE, timeout=60):
+        self.timeout = timeout
+        self._wav = WavStreamDecoder(rate_policy)
+        self._stderr = bytearray()
+        self._error = None
+        self._process = subprocess.Popen(
+            [AudioSegment.converter, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+             '-vn', '-acodec', 'pcm_s16le', '-f', 'wav', 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._readers = [
+            threading.Thread(target=self._read_stdout, daemon=True),
+            threading.Thread(target=self._read_stderr, daemon=True),
+        ]
+        for reader in self._readers:
+            reader.start()
+
+    def _read_stdout(self):
+        try:
+            for chunk in iter(lambda: self._process.stdout.read1(65536), b''):
+                self._wav.feed(chunk)
+        except Exception as e:
+            self._error = e
+            self._process.kill()
+
+    def _read_stderr(self):
+        for line in self._process.stderr:
+            self._stderr += line
+
+    def feed(self, data):
+        try:
+            self._process.stdin.write(data)
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            # ffmpeg gave up; finish() reports why
+            pass
+
+    def finish(self):
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self._process.wait(self.timeout)
+        except subprocess.TimeoutExpired:
+            self.close()
+            raise ValueError(f"Decoding took longer than {self.timeout}s")
+        for reader in self._readers:
+            reader.join(self.timeout)
+        if self._error is not None:
+            raise ValueError(f"Decoding failed: {self._error}")
+        if self._process.returncode != 0:
+            message = self._stderr.decode(errors='replace').strip().splitlines()
+            raise ValueError(f"Decoding failed: {message[-1] if message else self._process.returncode}")
+        return self._wav.finish()
+
+    def close(self):
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+
+# Containers ffmpeg can decode from a pipe without seeking; MP4/M4A usually
+# keep their index at the end of the file and are decoded once complete
+STREAMABLE_EXTENSIONS = ('flac', 'opus', 'ogg', 'oga', 'webm', 'mp3')
+
+
+def stream_decoder(filename, rate_policy=ANALYSIS_RATE):
+    """An incremental decoder for `filename`'s format, or None if it must be decoded whole."""
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    if extension == 'wav':
+        return WavStreamDecoder(rate_policy)
+    if extension in STREAMABLE_EXTENSIONS:
+        return FfmpegStreamDecoder(rate_policy)
+    return None
+
+
+def write_wav(sound, path):
+    """Writes a Sound decoded by this module back out as mono 16-bit PCM WAV."""
+    samples = np.clip(np.round(sound.values[0] * 32768.0), -32768, 32767).astype('<i2')
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(int(sound.sampling_frequency))
+        wav.writeframes(samples.tobytes())
@@ -0,0 +1,367 @@
+"""
+Benchmarks the analysis path and guards it against regressions.
+
+Stages: every recording in --dir (the bundled uploads/) and a synthetic voice
+of each --synthetic length is decoded, converted with convert_to_wav,
+analyzed and scored in this process. Every stage tracked with metrics.track
+(decode, convert_to_wav, load_sound, the quality gate, get_features and each of its
+features.* sub-stages, predict) is reported with wall time, CPU time and peak
+RSS. The feature cache is off, so every file is really extracted.
+
+HTTP: /upload followed by /analyze (with classification, answered by a local
+stand-in for Gemini) through Flask's test client, at every --concurrency
+level, reported as throughput and latency percentiles.
+
+--save writes the results as JSON. --compare re-runs against such a baseline
+and exits with status 1 when a stage's mean wall time or peak RSS grew, or an
+endpoint's throughput fell, by more than --threshold. Baselines only compare
+on the machine they were recorded on.
+
+Usage:
+    python benchmark.py [--dir uploads] [--synthetic 1,5,15,60] [--concurrency 1,2,4]
+                        [--save baseline.json | --compare baseline.json [--threshold 0.25]]
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import metrics
+from analyzer import Analyzer
+from audio import ANALYSIS_RATE, decode_bytes
+from quality import DEFAULT_LIMITS
+
+# Stages faster than this are too noisy to fail a comparison on wall time
+MIN_COMPARED_SECONDS = 0.005
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes since the last reset_peak_rss()."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Without /proc the peak cannot be reset and covers the whole process lifetime
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class StageProfiler:
+    """
+    Stage hook (metrics.add_stage_hook) recording wall time, CPU time and peak
+    RSS of every call by stage. CPU time is per process, so stages must run on
+    one thread while it is installed. A stage's peak includes its sub-stages.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        # Running peak of every open stage, innermost last
+        self._open = []
+
+    @contextmanager
+    def __call__(self, stage):
+        if self._open:
+            self._open[-1] = max(self._open[-1], peak_rss())
+        reset_peak_rss()
+        self._open.append(0)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            peak = max(peak_rss(), self._open.pop())
+            if self._open:
+                self._open[-1] = max(self._open[-1], peak)
+            self.samples[stage].append((wall, cpu, peak))
+
+    def report(self):
+        report = {}
+        for stage, samples in sorted(self.samples.items()):
+            wall, cpu, peak = (np.array(column) for column in zip(*samples))
+            report[stage] = {
+                'calls': len(samples),
+                'wall_total': float(wall.sum()),
+                'wall_mean': float(wall.mean()),
+                'wall_p50': float(np.percentile(wall, 50)),
+                'wall_p95': float(np.percentile(wall, 95)),
+                'cpu_total': float(cpu.sum()),
+                'cpu_mean': float(cpu.mean()),
+                'peak_rss_mb': float(peak.max()) / 2 ** 20,
+            }
+        return report
+
+
+def synthetic_voice(path, seconds, rate=44100, seed=0):
+    """A sustained 16-bit vowel with vibrato, shimmer and breath noise, like the corpus recordings."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    phase = 2 * np.pi * 140 * t + 3 * np.sin(2 * np.pi * 5 * t)
+    x = sum(np.sin(k * phase) / k for k in range(1, 8))
+    x *= 1 + 0.05 * np.sin(2 * np.pi * 3 * t)
+    x = 0.3 * x / np.abs(x).max() + 0.003 * rng.normal(size=len(t))
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((x * 32767).astype('<i2').tobytes())
+    return path
+
+
+def corpus(directory, synthetic_lengths, workdir):
+    """The recordings in `directory` followed by one synthetic voice per length (seconds)."""
+    paths = sorted(glob.glob(os.path.join(directory, '*.wav')))
+    for seconds in synthetic_lengths:
+        paths.append(synthetic_voice(os.path.join(workdir, f"synthetic_{seconds:g}s.wav"), seconds))
+    return paths
+
+
+def run_stages(paths, backend='numpy', rate_policy=ANALYSIS_RATE):
+    """
+    Runs every path through the analysis stages with a StageProfiler
+    installed. Returns a corpus summary and the per-stage report.
+    """
+    from app import convert_to_wav
+
+    analyzer = Analyzer(perturbation_backend=backend, quality_limits=DEFAULT_LIMITS)
+    profiler = StageProfiler()
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    audio_seconds = 0.0
+    failures = []
+    metrics.add_stage_hook(profiler)
+    try:
+        for path in paths:
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                with profiler("pipeline"):
+                    sound = decode_bytes(data, os.path.basename(path), rate_policy)
+                    if not convert_to_wav(path, os.path.join(workdir, "converted.wav"), rate_policy):
+                        raise ValueError("convert_to_wav failed")
+                    analyzer.predict(analyzer.get_features(sound))
+                audio_seconds += sound.duration
+            except Exception as e:
+                failures.append({'file': os.path.basename(path), 'error': str(e)})
+    finally:
+        metrics.remove_stage_hook(profiler)
+        shutil.rmtree(workdir, ignore_errors=True)
+    summary = {'files': len(paths), 'audio_seconds': audio_seconds, 'failures': failures}
+    return summary, profiler.report()
+
+
+class GeminiStandIn(BaseHTTPRequestHandler):
+    """Answers every generateContent call with a fixed classification after `latency` seconds."""
+
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(GeminiStandIn.latency)
+        data = json.dumps({"text": "1"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def gemini_stand_in(latency):
+    """Points the classifier's Gemini client at a local stand-in for the duration."""
+    import parkinsons
+    from gemini import GeminiClient
+
+    GeminiStandIn.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GeminiStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    original = parkinsons.client
+    # No response cache: every classification pays the stand-in's latency
+    parkinsons.client = GeminiClient("benchmark", base_url=f"http://127.0.0.1:{server.server_port}",
+                                     cache_entries=0)
+    try:
+        yield
+    finally:
+        parkinsons.client = original
+        server.shutdown()
+        server.server_close()
+
+
+def latency_summary(seconds):
+    seconds = np.array(seconds)
+    return {
+        'mean': float(seconds.mean()),
+        'p50': float(np.percentile(seconds, 50)),
+        'p95': float(np.percentile(seconds, 95)),
+    }
+
+
+def run_http(paths, concurrency_levels, requests_per_level=None, gemini_latency=0.05):
+    """
+    Uploads and analyzes `paths` through the Flask test client at every
+    concurrency level, each against a fresh upload folder.
+    """
+    from app import create_app
+
+    report = {}
+    with gemini_stand_in(gemini_latency):
+        for level in concurrency_levels:
+            folder = tempfile.mkdtemp(prefix="benchmark-http-")
+            app = create_app({"UPLOAD_FOLDER": folder, "FEATURE_CACHE_ENTRIES": 0, "JOB_WORKERS": 1})
+            count = requests_per_level or max(len(paths), 2 * level)
+            timings = defaultdict(list)
+            statuses = defaultdict(int)
+            lock = threading.Lock()
+
+            def session(index):
+                client = app.test_client()
+                path = paths[index % len(paths)]
+                with open(path, "rb") as f:
+                    start = time.perf_counter()
+                    response = client.post("/upload", data={"file": (f, os.path.basename(path))})
+                upload_seconds = time.perf_counter() - start
+                body = response.get_json()
+                start = time.perf_counter()
+                analysis = client.post("/analyze", json={"filename": body.get("filename"),
+                                                         "needs_classification": True})
+                analyze_seconds = time.perf_counter() - start
+                with lock:
+                    timings["upload"].append(upload_seconds)
+                    timings["analyze"].append(analyze_seconds)
+                    statuses[f"upload {response.status_code}"] += 1
+                    statuses[f"analyze {analysis.status_code}"] += 1
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(level) as pool:
+                list(pool.map(session, range(count)))
+            elapsed = time.perf_counter() - start
+            shutil.rmtree(folder, ignore_errors=True)
+
+            report[str(level)] = {
+                'requests': count,
+                'seconds': elapsed,
+                'throughput_rps': count / elapsed,
+                'statuses': dict(statuses),
+                'upload': latency_summary(timings["upload"]),
+                'analyze': latency_summary(timings["analyze"]),
+            }
+    return report
+
+
+def compare(baseline, current, threshold):
+    """Human-readable regressions of `current` against `baseline`; empty when there are none."""
+    regressions = []
+    for stage, base in baseline.get('stages', {}).items():
+        now = current.get('stages', {}).get(stage)
+        if now is None:
+            continue
+        if base['wall_mean'] >= MIN_COMPARED_SECONDS and now['wall_mean'] > base['wall_mean'] * (1 + threshold):
+            regressions.append(f"{stage}: mean wall time {base['wall_mean'] * 1e3:.1f} ms -> "
+                               f"{now['wall_mean'] * 1e3:.1f} ms")
+        if now['peak_rss_mb'] > base['peak_rss_mb'] * (1 + threshold):
+            regressions.append(f"{stage}: peak RSS {base['peak_rss_mb']:.0f} MB -> {now['peak_rss_mb']:.0f} MB")
+    for level, base in baseline.get('http', {}).items():
+        now = current.get('http', {}).get(level)
+        if now is not None and now['throughput_rps'] < base['throughput_rps'] * (1 - threshold):
+            regressions.append(f"concurrency {level}: {base['throughput_rps']:.2f} -> "
+                               f"{now['throughput_rps']:.2f} requests/s")
+    return regressions
+
+
+def print_report(results):
+    summary = results['corpus']
+    print(f"\n{summary['files']} files, {summary['audio_seconds']:.1f}s of audio, "
+          f"{len(summary['failures'])} failed\n")
+    for failure in summary['failures']:
+        print(f"  {failure['file']}: {failure['error']}")
+    print(f"{'stage':<36} {'calls':>6} {'mean ms':>9} {'p95 ms':>9} {'cpu ms':>9} {'peak MB':>8}")
+    for stage, row in results['stages'].items():
+        print(f"{stage:<36} {row['calls']:>6} {row['wall_mean'] * 1e3:>9.2f} {row['wall_p95'] * 1e3:>9.2f} "
+              f"{row['cpu_mean'] * 1e3:>9.2f} {row['peak_rss_mb']:>8.0f}")
+    if results.get('http'):
+        print(f"\n{'concurrency':>11} {'requests':>9} {'req/s':>7} {'upload p50':>11} {'analyze p50':>12} "
+              f"{'analyze p95':>12}")
+        for level, row in results['http'].items():
+            print(f"{level:>11} {row['requests']:>9} {row['throughput_rps']:>7.2f} "
+                  f"{row['upload']['p50'] * 1e3:>9.0f}ms {row['analyze']['p50'] * 1e3:>10.0f}ms "
+                  f"{row['analyze']['p95'] * 1e3:>10.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default='uploads')
+    parser.add_argument('--synthetic', default='1,5,15,60', help="Synthetic recording lengths in seconds")
+    parser.add_argument('--backend', default='numpy', choices=['numpy', 'praat'])
+    parser.add_argument('--concurrency', default='1,2,4', help="Empty to skip the HTTP benchmark")
+    parser.add_argument('--requests', type=int, default=None,
+                        help="Requests per concurrency level (default: one per file)")
+    parser.add_argument('--gemini-latency', type=float, default=0.05, help="Seconds the Gemini stand-in waits")
+    parser.add_argument('--save', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Baseline JSON to compare against; exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="benchmark-corpus-")
+    try:
+        paths = corpus(args.dir, [float(s) for s in args.synthetic.split(',') if s], workdir)
+        if not paths:
+            parser.error(f"No recordings found in {args.dir}")
+        results = {
+            'created': time.time(),
+            'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                        'cpus': os.cpu_count()},
+            'settings': {'backend': args.backend, 'gemini_latency': args.gemini_latency},
+        }
+        results['corpus'], results['stages'] = run_stages(paths, args.backend)
+        levels = [int(level) for level in args.concurrency.split(',') if level]
+        if levels:
+            results['http'] = run_http(paths, levels, args.requests, args.gemini_latency)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%} against {args.compare}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Frame-level pitch, intensity and HNR contours for plotting.
+
+The Pitch, Intensity and Harmonicity objects a FeatureExtractor already
+computed for the features are read frame by frame and decimated on the server
+to the width of the plot. Each output column holds the minimum and maximum of
+the frames it covers, so peaks and dips survive at any width. Unvoiced pitch
+frames and aperiodic harmonicity frames are NaN.
+
+Encoding (little-endian):
+    header       4s magic b"CTR1", u8 dtype (1: float32, 2: float16),
+                 u8 flags (1: delta-encoded), u16 number of contours
+    per contour  12s name (ASCII, NUL-padded), u32 columns, f64 start, f64 step
+                 (time of the first column's centre and seconds between
+                 columns), then `columns` minima and `columns` maxima
+Delta-encoded arrays hold each value's difference from the previous defined
+value of the same array (NaN stays NaN) and are restored with a running sum
+that skips NaN. The differences are taken from the already rounded values, so
+float16 rounding does not build up along the contour.
+"""
+import struct
+
+import numpy as np
+
+from feature_cache import audio_key
+
+MAGIC = b"CTR1"
+FORMAT_VERSION = 1
+# dtype name -> (header code, NumPy dtype)
+DTYPES = {'float32': (1, '<f4'), 'float16': (2, '<f2')}
+DELTA = 1
+DEFAULT_WIDTH = 800
+MAX_WIDTH = 8192
+
+_HEADER = struct.Struct('<4sBBH')
+_CONTOUR = struct.Struct('<12sIdd')
+
+
+def _pitch_frames(pitch):
+    values = pitch.selected_array['frequency'].astype(float)
+    values[values == 0] = np.nan
+    return values
+
+
+def _intensity_frames(intensity):
+    return intensity.values[0].astype(float)
+
+
+def _harmonicity_frames(harmonicity):
+    values = harmonicity.values[0].astype(float)
+    # Praat marks frames without periodicity as -200 dB
+    values[values <= -200] = np.nan
+    return values
+
+
+# Extractor node -> frame values of its Praat object
+CONTOURS = {
+    'pitch': _pitch_frames,
+    'intensity': _intensity_frames,
+    'harmonicity': _harmonicity_frames,
+}
+
+
+def parse_options(value):
+    """
+    Contour options from a request: None or False for none, True for the
+    defaults, or a dict with any of width, dtype and delta. Raises ValueError.
+    """
+    if value is None or value is False:
+        return None
+    if value is True:
+        value = {}
+    if not isinstance(value, dict):
+        raise ValueError("contours must be true or an object with width, dtype and delta")
+    try:
+        width = int(value.get('width', DEFAULT_WIDTH))
+    except (TypeError, ValueError):
+        raise ValueError("contours width must be an integer")
+    if not 1 <= width <= MAX_WIDTH:
+        raise ValueError(f"contours width must be between 1 and {MAX_WIDTH}")
+    dtype = value.get('dtype', 'float16')
+    if dtype not in DTYPES:
+        raise ValueError(f"contours dtype must be one of {sorted(DTYPES)}")
+    return {'width': width, 'dtype': dtype, 'delta': bool(value.get('delta', False))}
+
+
+def cache_key(sound, options):
+    """FeatureCache key of the encoded contours of `sound`."""
+    return audio_key(sound, list(CONTOURS),
+                     f"contours{FORMAT_VERSION}|{options['width']}|{options['dtype']}|{int(options['delta'])}")
+
+
+def decimate(values, start, step, width):
+    """
+    Min/max of `values` (frames `step` seconds apart from `start`) over at most
+    `width` columns; returns (start, step, minima, maxima) of the columns.
+    """
+    n = len(values)
+    if n <= width:
+        return start, step, values.copy(), values.copy()
+    edges = np.arange(width) * n // width
+    # fmin/fmax skip NaN, so a column is only undefined if all its frames are
+    minima = np.fmin.reduceat(values, edges)
+    maxima = np.fmax.reduceat(values, edges)
+    column = step * n / width
+    return start - step / 2 + column / 2, column, minima, maxima
+
+
+def compute(extractor, width=DEFAULT_WIDTH):
+    """
+    {name: (start, step, minima, maxima)} from the extractor's Pitch, Intensity
+    and Harmonicity, computing only the ones it does not hold yet.
+    """
+    contours = {}
+    for name, frames in CONTOURS.items():
+        praat_object = extractor.get(name)
+        contours[name] = decimate(frames(praat_object), praat_object.x1, praat_object.dx, width)
+    return contours
+
+
+def encode(contours, dtype='float16', delta=False):
+    code, fmt = DTYPES[dtype]
+    parts = [_HEADER.pack(MAGIC, code, DELTA if delta else 0, len(contours))]
+    for name, (start, step, minima, maxima) in contours.items():
+        parts.append(_CONTOUR.pack(name.encode('ascii'), len(minima), start, step))
+        for values in (minima, maxima):
+            values = _delta(values, fmt) if delta else np.asarray(values).astype(fmt)
+            parts.append(values.tobytes())
+    return b"".join(parts)
+
+
+def _delta(values, fmt):
+    cast = np.dtype(fmt).type
+    deltas = np.empty(len(values), dtype=fmt)
+    # What the decoder's running sum holds, so each difference corrects the rounding before it
+    current = 0.0
+    for i, value in enumerate(np.asarray(values, dtype=float).tolist()):
+        if value != value:
+            deltas[i] = np.nan
+            continue
+        deltas[i] = cast(value - current)
+        current += float(deltas[i])
+    return deltas
+
+
+def decode(data):
+    """The inverse of encode: {name: (start, step, minima, maxima)} with float64 arrays."""
+    magic, code, flags, count = _HEADER.unpack_from(data)
+    formats = {code: fmt for code, fmt in DTYPES.values()}
+    if magic != MAGIC or code not in formats:
+        raise ValueError("Not an encoded contour set")
+    fmt = formats[code]
+    offset = _HEADER.size
+    contours = {}
+    for _ in range(count):
+        name, columns, start, step = _CONTOUR.unpack_from(data, offset)
+        offset += _CONTOUR.size
+        arrays = []
+        for _ in range(2):
+            values = np.frombuffer(data, dtype=fmt, count=columns, offset=offset).astype(np.float64)
+            offset += columns * np.dtype(fmt).itemsize
+            if flags & DELTA:
+                undefined = np.isnan(values)
+                values = np.nancumsum(values)
+                values[undefined] = np.nan
+            arrays.append(values)
+        contours[name.rstrip(b"\0").decode('ascii')] = (start, step, *arrays)
+    return contours
@@ -0,0 +1,213 @@
+"""
+Builds a training table from a directory tree of recordings.
+
+Every audio file under --dir is decoded the way uploads are (mono, 16-bit,
+analysis rate policy) and run through the serving feature extractor on all
+cores. The output directory holds:
+
+  features.npy    float64 matrix, one row per file, columns in FEATURE_NAMES order
+  index.json      feature names, relative file paths (row order), labels and settings
+  manifest.json   size/mtime and outcome of every file seen, for incremental runs
+
+Runs are incremental: files whose size and mtime match the manifest are not
+extracted again, deleted files are dropped, and failures are remembered
+(use --retry-failed to try them again). Results are checkpointed every
+--checkpoint files, so an interrupted run resumes where it stopped. Changing
+the backend or rate policy, or a new EXTRACTOR_VERSION, starts over.
+
+Labels are optional: --labels points at a CSV with `path` (relative to --dir)
+and `class` columns; unlabeled rows get -1. Labels are kept in index.json, so
+a later run without --labels keeps them, and a run with --labels only
+overrides the files its CSV lists.
+
+Usage:
+    python extract_corpus.py --dir recordings --out corpus [--labels labels.csv]
+        [--processes N] [--timeout 120] [--backend numpy] [--rate-policy 44100]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from analyzer import extract_features
+from audio import ANALYSIS_RATE, decode_bytes, parse_rate_policy
+from features import EXTRACTOR_VERSION, FEATURE_NAMES
+from worker_pool import WorkerPool
+
+AUDIO_EXTENSIONS = ('wav', 'mp3', 'm4a', 'flac', 'ogg')
+
+
+def extract_file(path, rate_policy, backend):
+    with open(path, 'rb') as f:
+        data = f.read()
+    sound = decode_bytes(data, os.path.basename(path), rate_policy)
+    return extract_features(sound, None, backend)[0]
+
+
+def scan(directory, extensions=AUDIO_EXTENSIONS):
+    """Relative path -> (size, mtime_ns) for every audio file under `directory`."""
+    found = {}
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.rsplit('.', 1)[-1].lower() not in extensions:
+                continue
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            found[os.path.relpath(path, directory)] = (st.st_size, st.st_mtime_ns)
+    return found
+
+
+def read_labels(path):
+    with open(path, newline='') as f:
+        return {os.path.normpath(row['path']): int(row['class']) for row in csv.DictReader(f)}
+
+
+def _checksum(matrix):
+    return hashlib.blake2b(np.ascontiguousarray(matrix).tobytes(), digest_size=16).hexdigest()
+
+
+def _write_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class Corpus:
+    """The output directory: extracted rows plus the manifest they came from."""
+
+    def __init__(self, out, settings):
+        self.out = out
+        self.settings = settings
+        self.rows = {}
+        self.manifest = {}
+        # Normalized relative path -> class, for every file ever labeled
+        self.labels = {}
+
+        index_path = os.path.join(out, 'index.json')
+        manifest_path = os.path.join(out, 'manifest.json')
+        if not (os.path.exists(index_path) and os.path.exists(manifest_path)):
+            return
+        with open(index_path) as f:
+            index = json.load(f)
+        # Kept even when the features are not
+        self.labels = index.get('known_labels', {})
+        if index['settings'] != settings or index['feature_names'] != FEATURE_NAMES:
+            print(f"Settings changed since the last run, re-extracting everything in {out}")
+            return
+        matrix = np.load(os.path.join(out, 'features.npy'))
+        if _checksum(matrix) != index['checksum']:
+            print(f"{out}/features.npy does not match its index, re-extracting everything")
+            return
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        self.rows = dict(zip(index['files'], matrix))
+
+    def is_current(self, name, stat, retry_failed):
+        entry = self.manifest.get(name)
+        if entry is None or (entry['size'], entry['mtime_ns']) != tuple(stat):
+            return False
+        if entry['status'] == 'ok':
+            return name in self.rows
+        return not retry_failed
+
+    def record(self, name, stat, ok, value):
+        entry = {'size': stat[0], 'mtime_ns': stat[1], 'status': 'ok' if ok else 'error'}
+        if ok:
+            self.rows[name] = value
+        else:
+            entry['error'] = value
+            self.rows.pop(name, None)
+        self.manifest[name] = entry
+
+    def forget(self, names):
+        for name in names:
+            self.rows.pop(name, None)
+            self.manifest.pop(name, None)
+
+    def save(self):
+        os.makedirs(self.out, exist_ok=True)
+        files = sorted(self.rows)
+        matrix = np.vstack([self.rows[name] for name in files]) if files else np.empty((0, len(FEATURE_NAMES)))
+
+        # A crash between these writes leaves an index whose checksum no
+        # longer matches features.npy, which the next run treats as stale
+        tmp = os.path.join(self.out, 'features.tmp.npy')
+        np.save(tmp, matrix)
+        os.replace(tmp, os.path.join(self.out, 'features.npy'))
+        _write_json(os.path.join(self.out, 'index.json'), {
+            'feature_names': FEATURE_NAMES,
+            'files': files,
+            'labels': [self.labels.get(os.path.normpath(name), -1) for name in files],
+            'known_labels': self.labels,
+            'settings': self.settings,
+            'checksum': _checksum(matrix),
+        })
+        _write_json(os.path.join(self.out, 'manifest.json'), self.manifest)
+
+
+def build(directory, out, labels=None, processes=None, timeout=None, backend='numpy',
+          rate_policy=ANALYSIS_RATE, checkpoint=256, retry_failed=False):
+    """Brings `out` up to date with the recordings under `directory`; returns run counts."""
+    settings = {'extractor_version': EXTRACTOR_VERSION, 'backend': backend, 'rate_policy': rate_policy}
+    corpus = Corpus(out, settings)
+    corpus.labels.update(labels or {})
+
+    found = scan(directory)
+    removed = [name for name in corpus.manifest if name not in found]
+    corpus.forget(removed)
+    todo = [name for name, stat in found.items() if not corpus.is_current(name, stat, retry_failed)]
+    print(f"{len(found)} files, {len(found) - len(todo)} up to date, {len(todo)} to extract, {len(removed)} removed")
+
+    failed = 0
+    start = time.perf_counter()
+    # One set of worker processes for every checkpoint chunk
+    with WorkerPool(extract_file, processes=processes, timeout=timeout) as pool:
+        for offset in range(0, len(todo), checkpoint):
+            chunk = todo[offset:offset + checkpoint]
+            outcomes = pool.map((os.path.join(directory, name), rate_policy, backend) for name in chunk)
+            for name, (ok, value) in zip(chunk, outcomes):
+                corpus.record(name, found[name], ok, value)
+                if not ok:
+                    failed += 1
+                    print(f"Failed {name}: {value}")
+            corpus.save()
+            done = offset + len(chunk)
+            print(f"{done}/{len(todo)} extracted in {time.perf_counter() - start:.1f}s")
+
+    if not todo:
+        # Labels or removals may still have changed
+        corpus.save()
+
+    return {'files': len(found), 'extracted': len(todo) - failed, 'failed': failed,
+            'skipped': len(found) - len(todo), 'removed': len(removed), 'rows': len(corpus.rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', required=True, help="Directory tree of recordings")
+    parser.add_argument('--out', required=True, help="Output directory")
+    parser.add_argument('--labels', help="CSV with path and class columns")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--timeout', type=float, default=120.0, help="Per-file timeout in seconds")
+    parser.add_argument('--backend', default='numpy', choices=['numpy', 'praat'])
+    parser.add_argument('--rate-policy', default=str(ANALYSIS_RATE))
+    parser.add_argument('--checkpoint', type=int, default=256, help="Files between checkpoints")
+    parser.add_argument('--retry-failed', action='store_true')
+    args = parser.parse_args()
+
+    counts = build(args.dir, args.out,
+                   labels=read_labels(args.labels) if args.labels else None,
+                   processes=args.processes, timeout=args.timeout, backend=args.backend,
+                   rate_policy=parse_rate_policy(args.rate_policy), checkpoint=args.checkpoint,
+                   retry_failed=args.retry_failed)
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
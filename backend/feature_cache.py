@@ -0,0 +1,121 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from features import EXTRACTOR_VERSION
+
+
+def audio_key(sound, names, backend):
+    """
+    Content address for a feature vector: the decoded samples and sampling rate,
+    plus everything that changes what the extractor returns for them.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(np.ascontiguousarray(sound.values).tobytes())
+    digest.update(f"|{sound.sampling_frequency}|{sound.xmin}|{EXTRACTOR_VERSION}|{backend}|".encode())
+    digest.update(",".join(names).encode())
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    Two-tier cache of feature vectors keyed by `audio_key`. Opaque byte strings
+    derived from the same audio (e.g. encoded contours) are kept alongside
+    them with get_blob/put_blob.
+
+    The memory tier is an LRU bounded by entry count. The optional disk tier is
+    a SQLite file bounded by total bytes; least recently used rows are evicted
+    first. Disk hits are promoted into memory.
+    """
+
+    def __init__(self, max_entries=1024, disk_path=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk_path = disk_path
+        self._connection = None
+        self._connection_pid = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS features ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " size INTEGER NOT NULL, last_access REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS features_last_access ON features (last_access)")
+            self._db.commit()
+
+    @property
+    def _db(self):
+        if not self.disk_path:
+            return None
+        # SQLite connections must not cross fork(); a preloaded cache reconnects in each worker
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def get(self, key):
+        features = self._lookup(key, lambda value: np.frombuffer(value, dtype=np.float64).reshape(1, -1))
+        return features.copy() if features is not None else None
+
+    def put(self, key, features):
+        features = np.array(features, dtype=np.float64).reshape(1, -1)
+        self._store(key, features, features.tobytes())
+
+    def get_blob(self, key):
+        return self._lookup(key, bytes)
+
+    def put_blob(self, key, data):
+        data = bytes(data)
+        self._store(key, data, data)
+
+    def _lookup(self, key, decode):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT value FROM features WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE features SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+
+            value = decode(row[0])
+            self._remember(key, value)
+            return value
+
+    def _store(self, key, value, data):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO features (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, data, len(data), time.time()))
+                self._evict_disk()
+                self._db.commit()
+
+    def _remember(self, key, features):
+        self._memory[key] = features
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM features").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM features ORDER BY last_access").fetchall()
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM features WHERE key = ?", (key,))
+            total -= size
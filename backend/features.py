@@ -0,0 +1,272 @@
+import numpy as np
+from parselmouth.praat import call
+import perturbation
+from metrics import track
+
+# Bump whenever a node changes what it returns, so cached features are not reused
+EXTRACTOR_VERSION = "1"
+
+# Column order the model was trained on (see models/model.py)
+FEATURE_NAMES = [
+    'numPulses',
+    'numPeriodsPulses',
+    'meanPeriodPulses',
+    'stdDevPeriodPulses',
+    'locPctJitter',
+    'locAbsJitter',
+    'rapJitter',
+    'ppq5Jitter',
+    'ddpJitter',
+    'locShimmer',
+    'locDbShimmer',
+    'apq3Shimmer',
+    'apq5Shimmer',
+    'apq11Shimmer',
+    'ddaShimmer',
+    'meanAutoCorrHarmonicity',
+    'meanNoiseToHarmHarmonicity',
+    'meanHarmToNoiseHarmonicity',
+    'minIntensity',
+    'maxIntensity',
+    'meanIntensity',
+    'f1', 'f2', 'f3', 'f4',
+    'b1', 'b2', 'b3', 'b4']
+
+# Jitter and shimmer features, computed by the selected perturbation backend
+PERTURBATION_FEATURES = FEATURE_NAMES[4:15]
+
+# Praat period floor/ceiling/factor arguments shared by every jitter and shimmer query
+JITTER_ARGS = (0.0, 0.0, 0.0001, 0.02, 1.3)
+SHIMMER_ARGS = JITTER_ARGS + (1.6,)
+
+# name -> (dependency names, function of those dependencies)
+NODES = {}
+
+
+def node(name, *deps):
+    def register(fn):
+        NODES[name] = (deps, fn)
+        return fn
+    return register
+
+
+# Shared intermediate Praat objects
+
+@node('pitch', 'sound')
+def _pitch(sound):
+    return call(sound, "To Pitch", 0.0, 60, 500)
+
+
+@node('pulses', 'sound', 'pitch')
+def _pulses(sound, pitch):
+    return call([sound, pitch], "To PointProcess (cc)")
+
+
+@node('pulse_times', 'pulses')
+def _pulse_times(pulses):
+    # One Praat call for every pulse time instead of one per pulse
+    if call(pulses, "Get number of points") == 0:
+        return np.empty(0)
+    return call(pulses, "To Matrix").values[0]
+
+
+@node('periods', 'pulse_times')
+def _periods(pulse_times):
+    return np.diff(pulse_times)
+
+
+@node('harmonicity', 'sound')
+def _harmonicity(sound):
+    return call(sound, "To Harmonicity (cc)", 0.01, 75, 0.1, 1.0)
+
+
+@node('intensity', 'sound')
+def _intensity(sound):
+    return call(sound, "To Intensity", 75, 0.0)
+
+
+@node('formant', 'sound')
+def _formant(sound):
+    return call(sound, "To Formant (burg)", 0.0, 5, 5500, 0.025, 50)
+
+
+# Pulse features
+
+@node('numPulses', 'pulse_times')
+def _num_pulses(pulse_times):
+    return len(pulse_times)
+
+
+@node('numPeriodsPulses', 'periods')
+def _num_periods(periods):
+    return len(periods)
+
+
+@node('meanPeriodPulses', 'periods')
+def _mean_period(periods):
+    return np.mean(periods)
+
+
+@node('stdDevPeriodPulses', 'periods')
+def _std_period(periods):
+    return np.std(periods)
+
+
+# Jitter and shimmer
+
+def _jitter_node(name, command):
+    node(name, 'pulses')(lambda pulses: call(pulses, command, *JITTER_ARGS))
+
+
+def _shimmer_node(name, command):
+    node(name, 'sound', 'pulses')(lambda sound, pulses: call([sound, pulses], command, *SHIMMER_ARGS))
+
+
+_jitter_node('locPctJitter', "Get jitter (local)")
+_jitter_node('locAbsJitter', "Get jitter (local, absolute)")
+_jitter_node('rapJitter', "Get jitter (rap)")
+_jitter_node('ppq5Jitter', "Get jitter (ppq5)")
+_jitter_node('ddpJitter', "Get jitter (ddp)")
+
+_shimmer_node('locShimmer', "Get shimmer (local)")
+_shimmer_node('locDbShimmer', "Get shimmer (local_dB)")
+_shimmer_node('apq3Shimmer', "Get shimmer (apq3)")
+_shimmer_node('apq5Shimmer', "Get shimmer (apq5)")
+_shimmer_node('apq11Shimmer', "Get shimmer (apq11)")
+_shimmer_node('ddaShimmer', "Get shimmer (dda)")
+
+
+# Harmonicity
+
+@node('meanAutoCorrHarmonicity', 'harmonicity')
+def _mean_harmonicity(harmonicity):
+    return call(harmonicity, "Get mean", 0, 0)
+
+
+@node('meanNoiseToHarmHarmonicity', 'meanAutoCorrHarmonicity')
+def _noise_to_harm(mean_harmonicity):
+    return 1 / (10 ** (mean_harmonicity / 10))
+
+
+@node('meanHarmToNoiseHarmonicity', 'meanAutoCorrHarmonicity')
+def _harm_to_noise(mean_harmonicity):
+    return 10 ** (mean_harmonicity / 10)
+
+
+# Intensity
+
+@node('minIntensity', 'intensity')
+def _min_intensity(intensity):
+    return call(intensity, "Get minimum", 0, 0, "Parabolic")
+
+
+@node('maxIntensity', 'intensity')
+def _max_intensity(intensity):
+    return call(intensity, "Get maximum", 0, 0, "Parabolic")
+
+
+@node('meanIntensity', 'intensity')
+def _mean_intensity(intensity):
+    return call(intensity, "Get mean", 0, 0, "energy")
+
+
+# Formants
+
+def _formant_nodes(number):
+    node(f'f{number}', 'formant')(
+        lambda formant: call(formant, "Get mean", number, 0, 0, "Hertz"))
+    node(f'b{number}', 'formant')(
+        lambda formant: call(formant, "Get bandwidth at time", number, 0.5, "Hertz", "Linear"))
+
+
+for _number in range(1, 5):
+    _formant_nodes(_number)
+
+
+# NumPy backend: every jitter and shimmer feature is read from one vectorized
+# pass over the pulse times instead of eleven separate Praat queries
+
+def _numpy_perturbation(sound, pulse_times):
+    samples = sound.values.mean(axis=0)
+    jitter = perturbation.jitter(pulse_times)
+    shimmer = perturbation.shimmer(pulse_times, samples, sound.x1, sound.dx)
+    return {
+        'locPctJitter': jitter['local'],
+        'locAbsJitter': jitter['local_absolute'],
+        'rapJitter': jitter['rap'],
+        'ppq5Jitter': jitter['ppq5'],
+        'ddpJitter': jitter['ddp'],
+        'locShimmer': shimmer['local'],
+        'locDbShimmer': shimmer['local_dB'],
+        'apq3Shimmer': shimmer['apq3'],
+        'apq5Shimmer': shimmer['apq5'],
+        'apq11Shimmer': shimmer['apq11'],
+        'ddaShimmer': shimmer['dda'],
+    }
+
+
+def _perturbation_feature(name):
+    return ('perturbation',), lambda values: values[name]
+
+
+NUMPY_NODES = dict(NODES)
+NUMPY_NODES['perturbation'] = (('sound', 'pulse_times'), _numpy_perturbation)
+for _name in PERTURBATION_FEATURES:
+    NUMPY_NODES[_name] = _perturbation_feature(_name)
+
+# Perturbation (jitter/shimmer) backends selectable per Analyzer
+BACKENDS = {
+    'praat': NODES,
+    'numpy': NUMPY_NODES,
+}
+
+
+def dependencies(names, backend='praat'):
+    """Every node, intermediates included, needed to compute `names`."""
+    nodes = BACKENDS[backend]
+    needed = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name in needed:
+            continue
+        if name not in nodes and name != 'sound':
+            raise KeyError(f"Unknown feature: {name}")
+        needed.add(name)
+        if name in nodes:
+            pending.extend(nodes[name][0])
+    return needed
+
+
+class FeatureExtractor:
+    """
+    Evaluates feature nodes lazily for one sound.
+
+    Every node is computed at most once and shared by everything that depends
+    on it, so requesting a subset of features only pays for the Praat objects
+    that subset needs.
+    """
+
+    def __init__(self, sound, backend='praat'):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown perturbation backend: {backend}")
+        self.nodes = BACKENDS[backend]
+        self.values = {'sound': sound}
+
+    def get(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name not in self.nodes:
+            raise KeyError(f"Unknown feature: {name}")
+
+        deps, fn = self.nodes[name]
+        args = [self.get(dep) for dep in deps]
+        # Timed after the dependencies, so each stage only counts its own work
+        with track(f"features.{name}"):
+            value = fn(*args)
+        self.values[name] = value
+        return value
+
+    def extract(self, names=None):
+        names = FEATURE_NAMES if names is None else names
+        return np.array([self.get(name) for name in names], dtype=float).reshape(1, -1)
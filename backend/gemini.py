@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import track
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+# (connect, read) in seconds
+DEFAULT_TIMEOUT = (3.05, 30.0)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class GeminiError(Exception):
+    """Raised when the Gemini API cannot be reached or answers with an error."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseCache:
+    """
+    LRU cache whose entries expire after `ttl` seconds.
+
+    `get_or_compute` coalesces concurrent misses for the same key: the first
+    caller computes the value and everyone else waiting on that key shares it
+    (or its exception). Errors are never cached.
+    """
+
+    def __init__(self, max_entries=256, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._lookup(key)
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            pending = self._in_flight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._in_flight[key] = {"event": threading.Event()}
+
+        if not leader:
+            pending["event"].wait()
+            if "error" in pending:
+                raise pending["error"]
+            return pending["value"]
+
+        try:
+            value = compute()
+        except Exception as e:
+            pending["error"] = e
+            raise
+        else:
+            pending["value"] = value
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            pending["event"].set()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+
+def response_text(data):
+    """The generated text of a generateContent response (or stream chunk)."""
+    candidates = data.get("candidates") or []
+    if candidates:
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+    return data.get("text", "")
+
+
+class GeminiClient:
+    """
+    Shared HTTP client for the Gemini API.
+
+    One pooled session is reused for every call, so connections (and TLS
+    handshakes) survive between chat messages. Connection errors and 429/5xx
+    answers are retried with exponential backoff, honouring Retry-After.
+    Non-streaming responses are cached by request body.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, timeout=DEFAULT_TIMEOUT, retries=3,
+                 backoff=0.5, pool_size=10, cache_entries=256, cache_ttl=300.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_entries, cache_ttl)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            # generateContent has no side effects, so POSTs are safe to retry
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json", "x-goog-api-key": api_key})
+
+    def _url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _post(self, path, payload, stage, **kwargs):
+        try:
+            with track(stage):
+                response = self.session.post(self._url(path), json=payload, timeout=self.timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise GeminiError(f"Gemini request failed: {e}") from e
+        if response.status_code != 200:
+            print(f"Gemini API error {response.status_code}: {response.text[:200]}")
+            response.close()
+            raise GeminiError(f"Gemini API returned {response.status_code}", status=response.status_code)
+        return response
+
+    def generate(self, path, payload, stage="gemini.generate"):
+        """POSTs `payload` to `path` and returns the decoded JSON, from the cache when possible."""
+        key = hashlib.sha256((path + json.dumps(payload, sort_keys=True)).encode()).hexdigest()
+        return self.cache.get_or_compute(key, lambda: self._post(path, payload, stage).json())
+
+    def stream(self, path, payload, stage="gemini.stream"):
+        """
+        Yields text chunks from a streamGenerateContent endpoint (SSE) as they arrive.
+        `path` is the streaming endpoint, without the alt=sse parameter.
+        """
+        response = self._post(path, payload, stage, params={"alt": "sse"}, stream=True)
+        with response:
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    text = response_text(json.loads(line[len("data:"):]))
+                    if text:
+                        yield text
+            except requests.exceptions.RequestException as e:
+                raise GeminiError(f"Gemini stream interrupted: {e}") from e
+
+
+def client_from_env(api_key):
+    timeout = os.getenv("GEMINI_TIMEOUT")
+    return GeminiClient(
+        api_key,
+        base_url=os.getenv("GEMINI_BASE_URL", DEFAULT_BASE_URL),
+        timeout=(DEFAULT_TIMEOUT[0], float(timeout)) if timeout else DEFAULT_TIMEOUT,
+        retries=int(os.getenv("GEMINI_RETRIES", "3")),
+        cache_entries=int(os.getenv("GEMINI_CACHE_ENTRIES", "256")),
+        cache_ttl=float(os.getenv("GEMINI_CACHE_TTL", "300")),
+    )
@@ -0,0 +1,59 @@
+"""
+Production serving: gunicorn -c gunicorn.conf.py wsgi:app
+
+The app (model, scaler, parselmouth and the rest of the imports) is loaded
+once in the master before forking, so workers share those pages
+copy-on-write. Each worker then runs a warm-up analysis before it accepts
+connections.
+
+Settings come from the environment:
+    PORT / BIND          listen address (default 0.0.0.0:5000)
+    WEB_WORKERS          worker processes (default: one per core)
+    WEB_THREADS          threads per worker (default 4; SSE streams hold one each)
+    WEB_TIMEOUT          seconds before a silent worker is restarted (default 120)
+    WEB_MAX_REQUESTS     recycle workers after this many requests (default 0, never)
+    WARMUP               set to 0 to skip the per-worker warm-up analysis
+    LAZY_STARTUP         set to 1 to import the audio code and load the model on
+                         first use (with WARMUP=0, in each worker's first request)
+
+Workers share nothing in memory. Anything a later request may reach
+through another worker (uploads, upload sessions, live streams, job state,
+results) lives under UPLOAD_FOLDER, so every worker must see the same
+UPLOAD_FOLDER: run them on one machine or on a shared volume. A job still runs in the worker
+that accepted it, and is lost if that worker dies or is recycled.
+
+Reloading: `kill -HUP <master>` starts fresh workers and retires the old
+ones gracefully. Because the app is preloaded, HUP keeps the already-loaded
+code; new model artifacts are still picked up by the registry on the next
+request. To deploy new code without dropping connections, send USR2 (new
+master) and then WINCH and QUIT to the old master.
+"""
+import gc
+import os
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv("WEB_WORKERS", os.cpu_count() or 1))
+threads = int(os.getenv("WEB_THREADS", 4))
+timeout = int(os.getenv("WEB_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+preload_app = True
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's reach, so GC passes
+    # in the workers don't write to (and un-share) the preloaded pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    if os.getenv("WARMUP", "1") == "0":
+        return
+    from app import warm_up
+
+    try:
+        warm_up(worker.wsgi)
+    except Exception as e:
+        # A failed warm-up only costs latency; keep serving
+        print(f"Warm-up failed in worker {worker.pid}: {str(e)}")
@@ -0,0 +1,92 @@
+"""
+Reports where backend cold-start time goes.
+
+Starts a fresh interpreter with `python -X importtime`, imports app and
+builds it with create_app, then lists:
+
+  - the modules with the largest cumulative import time
+  - total time spent importing, and the time create_app itself took
+
+Run it with and without --lazy (LAZY_STARTUP=1) to see what the lazy startup
+saves, and keep the --json output around to track cold start over time.
+
+Usage:
+    python import_report.py [--lazy] [--top 20] [--json out.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Runs in the child interpreter; its last stdout line is the timing as JSON
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({'import_seconds': imported - start, 'create_app_seconds': created - imported}))
+"""
+
+
+def parse_importtime(stderr):
+    """(module, self seconds, cumulative seconds, depth) for each line `-X importtime` wrote."""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # The header line
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(fields[0]) / 1e6, int(fields[1]) / 1e6, depth))
+    return modules
+
+
+def profile(lazy=False):
+    env = dict(os.environ, LAZY_STARTUP="1" if lazy else "0")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD], env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True)
+    timing = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(result.stderr)
+    return {
+        'lazy': lazy,
+        **timing,
+        'modules_imported': len(modules),
+        # Only top-level imports, so nested modules are not counted twice
+        'total_import_seconds': sum(cumulative for _, _, cumulative, depth in modules if depth == 0),
+        'modules': [{'name': name, 'self_seconds': own, 'cumulative_seconds': cumulative}
+                    for name, own, cumulative, _ in sorted(modules, key=lambda m: -m[2])],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lazy', action='store_true', help="Profile with LAZY_STARTUP=1")
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--json', help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    report = profile(args.lazy)
+    print(f"\n{'module':<40} {'self ms':>9} {'cumul. ms':>10}")
+    for module in report['modules'][:args.top]:
+        print(f"{module['name']:<40} {module['self_seconds'] * 1000:>9.1f} "
+              f"{module['cumulative_seconds'] * 1000:>10.1f}")
+    print(f"\n{'lazy' if args.lazy else 'eager'} startup: {report['modules_imported']} modules, "
+          f"{report['total_import_seconds'] * 1000:.0f} ms importing, "
+          f"import app {report['import_seconds'] * 1000:.0f} ms, "
+          f"create_app {report['create_app_seconds'] * 1000:.0f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nFull report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the queue is at capacity; retry_after is a hint in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # Bumped on every change so event streams know when to emit
+        self.version = 0
+
+    @classmethod
+    def from_snapshot(cls, data, version):
+        """A read-only copy of a job another process is running, rebuilt from its stored snapshot."""
+        job = cls()
+        job.id = data["job_id"]
+        job.status = data["status"]
+        job.stage = data["stage"]
+        job.progress = data["progress"]
+        job.created = data["created"]
+        job.result = data.get("result")
+        job.error = data.get("error")
+        job.version = version
+        return job
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def snapshot(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "created": self.created,
+        }
+        if self.status == "succeeded":
+            data["result"] = self.result
+        if self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+class LocalJobQueue:
+    """
+    In-process job backend: a bounded thread pool plus an in-memory job table.
+
+    At most `max_pending` jobs may be queued or running at once; beyond that
+    submit() raises QueueFull so callers can answer 429 instead of piling up
+    work. Finished jobs are kept for `ttl` seconds so clients can collect them.
+
+    Jobs run in the process that accepted them. With `db_path`, every change
+    is also written to a SQLite table (WAL mode) shared by all gunicorn
+    workers, so get() and events() work from any worker; events for a job
+    running elsewhere are polled every `poll_interval` seconds. The pending
+    limit still applies per process, to that process's own pool.
+    """
+
+    def __init__(self, workers=2, max_pending=16, ttl=3600, db_path=None, poll_interval=0.25):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._changed = threading.Condition()
+        self._durations = []
+        self._connection = None
+        self._connection_pid = None
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            with self._changed:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    " id TEXT PRIMARY KEY, snapshot TEXT NOT NULL, version INTEGER NOT NULL,"
+                    " done INTEGER NOT NULL, updated REAL NOT NULL)")
+                self._db.execute("CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated)")
+
+    @property
+    def _db(self):
+        if not self.db_path:
+            return None
+        # SQLite connections must not cross fork(); a preloaded queue reconnects in each worker
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                                               isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def submit(self, fn, *args):
+        """Runs fn(progress, *args) on the pool, where progress(stage, fraction) reports progress."""
+        with self._changed:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if not job.done)
+            if pending >= self.max_pending:
+                raise QueueFull(self._retry_after(pending))
+            job = Job()
+            self._jobs[job.id] = job
+            self._save(job)
+
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        with self._changed:
+            job = self._jobs.get(job_id)
+            if job is None and self._db is not None:
+                row = self._load(job_id)
+                if row is not None:
+                    job = Job.from_snapshot(row[1], row[0])
+            return job
+
+    def depth(self):
+        with self._changed:
+            return sum(1 for job in self._jobs.values() if not job.done)
+
+    def events(self, job_id, heartbeat=15.0):
+        """
+        Yields a snapshot each time the job changes, until it finishes.
+        Yields None after `heartbeat` seconds without a change so streams can
+        send keep-alives.
+        """
+        with self._changed:
+            local = job_id in self._jobs
+        if not local:
+            yield from self._remote_events(job_id, heartbeat)
+            return
+
+        seen = -1
+        while True:
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                if job.version == seen:
+                    self._changed.wait(timeout=heartbeat)
+                    if job.version == seen:
+                        snapshot = None
+                    else:
+                        seen, snapshot = job.version, job.snapshot()
+                else:
+                    seen, snapshot = job.version, job.snapshot()
+                finished = job.done
+            yield snapshot
+            if finished and snapshot is not None:
+                return
+
+    def _remote_events(self, job_id, heartbeat):
+        """events() for a job another process runs, read from the shared table."""
+        if self._db is None:
+            return
+        seen = -1
+        quiet_since = time.monotonic()
+        while True:
+            with self._changed:
+                row = self._load(job_id)
+            if row is None:
+                return
+            version, snapshot, done = row
+            if version != seen:
+                seen = version
+                quiet_since = time.monotonic()
+                yield snapshot
+                if done:
+                    return
+            elif time.monotonic() - quiet_since >= heartbeat:
+                quiet_since = time.monotonic()
+                yield None
+            time.sleep(self.poll_interval)
+
+    def _save(self, job):
+        if self._db is None:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO jobs (id, snapshot, version, done, updated) VALUES (?, ?, ?, ?, ?)",
+            (job.id, json.dumps(job.snapshot(), default=_json_default), job.version, int(job.done),
+             time.time()))
+
+    def _load(self, job_id):
+        row = self._db.execute("SELECT version, snapshot, done FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), bool(row[2])
+
+    def _update(self, job, **changes):
+        with self._changed:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.version += 1
+            self._save(job)
+            self._changed.notify_all()
+
+    def _run(self, job, fn, args):
+        self._update(job, status="running", stage="starting", started=time.time())
+
+        def progress(stage, fraction):
+            self._update(job, stage=stage, progress=fraction)
+
+        try:
+            result = fn(progress, *args)
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            self._update(job, status="failed", stage="failed", error=str(e), finished=time.time())
+        else:
+            self._update(job, status="succeeded", stage="done", progress=1.0, result=result,
+                         finished=time.time())
+
+        with self._changed:
+            self._durations = self._durations[-49:] + [job.finished - job.started]
+
+    def _retry_after(self, pending):
+        # Rough time for the pool to drain what is already queued
+        average = sum(self._durations) / len(self._durations) if self._durations else 1.0
+        return max(1, int(round(average * pending / self.workers)))
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self._db is not None:
+            # Also drops jobs whose worker died before finishing them
+            self._db.execute("DELETE FROM jobs WHERE updated < ?", (cutoff,))
+
+
+def _json_default(value):
+    # NumPy scalars that made it into a result
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
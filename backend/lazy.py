@@ -0,0 +1,42 @@
+"""
+Deferred imports for a fast startup.
+
+lazy_import(name) returns a stand-in that imports the module on first
+attribute access, so importing app.py does not pull in numpy, parselmouth,
+pydub or the model code until something actually uses them. load_all()
+imports every deferred module at once, e.g. in a gunicorn master before it
+forks so the workers share those pages.
+"""
+import importlib
+
+_modules = []
+
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            # The import system already runs a module only once across threads
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    module = LazyModule(name)
+    _modules.append(module)
+    return module
+
+
+def load_all():
+    for module in list(_modules):
+        module.load()
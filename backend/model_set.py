@@ -0,0 +1,117 @@
+"""
+The screening models served together, scored from one feature extraction.
+
+Each model screens for one condition and declares the named features it was
+trained on: the bundle's feature_names, or all of FEATURE_NAMES for a bare
+pickle. The extractor computes the union of those once, and every model reads
+its own columns of the resulting FEATURE_NAMES-wide row. Compiled models are
+merged into one CompiledTreeSet, so all of them are scored in a single
+vectorized tree walk and another condition only adds its trees to it.
+"""
+import threading
+
+import numpy as np
+
+from features import FEATURE_NAMES
+from registry import ModelRegistry, compiled_path_for
+from tree_model import CompiledTreeSet
+
+_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+
+class ScreeningModel:
+    """A condition (`name`, shown to users as `label`) and the registry holding its model."""
+
+    def __init__(self, name, registry, label=None):
+        self.name = name
+        self.registry = registry
+        self.label = label or name
+
+
+class LoadedModelSet:
+    """A snapshot of every model in a ModelSet, with the union of their features and a combined scorer."""
+
+    def __init__(self, models, loaded):
+        self.models = models
+        self.loaded = loaded
+        self.names = [model.name for model in models]
+        self.columns = []
+        for model, snapshot in zip(models, loaded):
+            names = list(snapshot.feature_names) if snapshot.feature_names is not None else FEATURE_NAMES
+            unknown = [name for name in names if name not in _INDEX]
+            if unknown:
+                raise ValueError(f"Model {model.name} ({snapshot.version}) needs features the extractor "
+                                 f"does not produce: {unknown}")
+            self.columns.append(np.array([_INDEX[name] for name in names], dtype=np.intp))
+        needed = set(np.concatenate(self.columns).tolist())
+        # In FEATURE_NAMES order, so a set needing everything extracts exactly as before
+        self.features = [name for i, name in enumerate(FEATURE_NAMES) if i in needed]
+
+        self._trees = None
+        if all(getattr(snapshot.model, 'scaler_folded', False) for snapshot in loaded):
+            self._trees = CompiledTreeSet([snapshot.model for snapshot in loaded], self.columns)
+
+    def score(self, rows):
+        """Positive-class probabilities, one column per model, for FEATURE_NAMES-wide rows."""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
+        if self._trees is not None:
+            return self._trees.probabilities(rows)
+        # Pickled models are scored one after the other
+        probabilities = np.empty((len(rows), len(self.loaded)))
+        for i, (snapshot, columns) in enumerate(zip(self.loaded, self.columns)):
+            X = rows[:, columns]
+            if snapshot.scaler is not None:
+                X = snapshot.scaler.transform(X)
+            probabilities[:, i] = snapshot.model.predict_proba(X)[:, 1]
+        return probabilities
+
+
+class ModelSet:
+    """
+    The registered ScreeningModels, the first being the primary one whose
+    result is also reported as the plain `prediction`. `get()` returns a
+    LoadedModelSet and rebuilds it only when one of the registries reloaded.
+    """
+
+    def __init__(self, models):
+        models = list(models)
+        if not models:
+            raise ValueError("A model set needs at least one model")
+        names = [model.name for model in models]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Model names must be unique: {names}")
+        self.models = models
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    @property
+    def primary(self):
+        return self.models[0]
+
+    def get(self):
+        loaded = [model.registry.get() for model in self.models]
+        snapshot = self._snapshot
+        if snapshot is not None and all(a is b for a, b in zip(snapshot.loaded, loaded)):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or not all(a is b for a, b in zip(snapshot.loaded, loaded)):
+                snapshot = self._snapshot = LoadedModelSet(self.models, loaded)
+            return snapshot
+
+
+def parse_models(spec):
+    """
+    ScreeningModels from "name=path/to/bundle.pkl,name2=..." (e.g. the
+    SCREENING_MODELS setting). Each bundle's compiled model is expected where
+    models/model.py writes it (registry.compiled_path_for).
+    """
+    models = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, path = entry.partition("=")
+        if not sep or not name.strip() or not path.strip():
+            raise ValueError(f"Expected name=path in the model list, got {entry!r}")
+        path = path.strip()
+        registry = ModelRegistry(path, compiled_path=compiled_path_for(path))
+        models.append(ScreeningModel(name.strip(), registry))
+    return models
@@ -1,13 +1,48 @@
+"""
+Trains the screening model and writes a versioned artifact bundle.
+
+A cross-validated grid search runs on a process pool (xgboost's n_jobs
+splits the remaining cores inside each trial). Every fold is scaled once up
+front and shared by all trials. The best parameters are refit on the
+training split and evaluated on a held-out test split, and the decision
+threshold is chosen from out-of-fold predictions (Youden's J).
+
+The bundle is a single pickle holding the model, its scaler, the feature
+order, the threshold, the metrics and the search settings, so serving can
+never pair a model with the wrong scaler. It is written to a temporary file
+and moved into place with os.replace; the registry picks it up on the next
+request. The compiled serving model (model.npz) is refreshed from it.
+
+Usage (from backend/):
+    python -m models.model [--corpus DIR] [--out models/bundle.pkl] [--processes N]
+        [--folds 5] [--grid '{"max_depth": [3, 4]}'] [--features a,b,...] [--no-compile]
+
+A model for another condition is trained the same way on a corpus labelled
+for it, with --out elsewhere (its compiled .npz is written next to it) and,
+optionally, only the --features it needs; list it in SCREENING_MODELS.
+"""
+import argparse
+import itertools
+import json
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 import xgboost as xgb
-import pickle
-from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, roc_auc_score, roc_curve
+from sklearn.model_selection import StratifiedKFold, train_test_split
 from sklearn.preprocessing import StandardScaler
-import os
+
+# The registry reads what this writes, so both take the path and format from it
+from registry import BUNDLE_FORMAT, DEFAULT_BUNDLE_PATH, ModelRegistry, compiled_path_for
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 csv_path = os.path.join(script_dir, 'Parkinsons_Speech-Features.csv')
-df = pd.read_csv(csv_path)
+
 key_features = ['numPulses',
     'numPeriodsPulses',
     'meanPeriodPulses',
@@ -32,26 +67,194 @@ key_features = ['numPulses',
     'f1', 'f2', 'f3', 'f4',
     'b1', 'b2', 'b3', 'b4']
 
-X = df[key_features]
-scaler = StandardScaler()
-X = scaler.fit_transform(X)
+# The parameters the original hand-tuned model used, plus neighbours
+BASE_PARAMS = {
+    'random_state': 42,
+    'subsample': 0.8,
+    'colsample_bytree': 0.7,
+    'alpha': 0,
+}
+DEFAULT_GRID = {
+    'n_estimators': [100, 200],
+    'learning_rate': [0.05, 0.1],
+    'max_depth': [3, 4, 6],
+    'min_child_weight': [1, 2],
+    'gamma': [0, 1],
+}
+
+
+def load_corpus(directory):
+    """
+    Loads a table written by extract_corpus.py as a DataFrame with one column
+    per feature plus `class` and `file`. Unlabeled recordings are dropped.
+    """
+    with open(os.path.join(directory, 'index.json')) as f:
+        index = json.load(f)
+    features = np.load(os.path.join(directory, 'features.npy'))
+    corpus = pd.DataFrame(features, columns=index['feature_names'])
+    corpus['class'] = index['labels']
+    corpus['file'] = index['files']
+    return corpus[corpus['class'] >= 0].reset_index(drop=True)
+
+
+def scaled_folds(X, y, n_folds, seed):
+    """Per-fold (X_train, y_train, X_val, y_val, val_index) with a scaler fit on each training part."""
+    folds = []
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    for train, val in splitter.split(X, y):
+        scaler = StandardScaler().fit(X[train])
+        folds.append((scaler.transform(X[train]), y[train], scaler.transform(X[val]), y[val], val))
+    return folds
+
+
+# Set once per search worker by the pool initializer, so the scaled folds are
+# sent to each process once instead of with every trial
+_folds = None
+_n_jobs = 1
+
+
+def _init_worker(folds, n_jobs):
+    global _folds, _n_jobs
+    _folds = folds
+    _n_jobs = n_jobs
+
+
+def evaluate(params):
+    """Cross-validates one parameter set on the cached folds; returns AUCs and out-of-fold probabilities."""
+    n = sum(len(fold[3]) for fold in _folds)
+    oof = np.zeros(n)
+    aucs = []
+    for X_train, y_train, X_val, y_val, val in _folds:
+        model = xgb.XGBClassifier(**BASE_PARAMS, **params, n_jobs=_n_jobs)
+        model.fit(X_train, y_train)
+        probs = model.predict_proba(X_val)[:, 1]
+        oof[val] = probs
+        aucs.append(roc_auc_score(y_val, probs))
+    return params, aucs, oof
+
+
+def search(X, y, grid, n_folds=5, processes=None, seed=2):
+    """Runs every grid point; returns trials sorted best first by mean CV ROC AUC."""
+    cores = os.cpu_count() or 1
+    processes = processes or cores
+    n_jobs = max(1, cores // processes)
+    folds = scaled_folds(X, y, n_folds, seed)
+    names = sorted(grid)
+    candidates = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    print(f"Searching {len(candidates)} parameter sets x {n_folds} folds "
+          f"on {processes} processes with n_jobs={n_jobs}")
+
+    if processes == 1:
+        _init_worker(folds, n_jobs)
+        results = [evaluate(params) for params in candidates]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(folds, n_jobs)) as pool:
+            results = list(pool.map(evaluate, candidates))
+
+    trials = [{'params': params, 'cv_auc': float(np.mean(aucs)), 'cv_auc_std': float(np.std(aucs)), 'oof': oof}
+              for params, aucs, oof in results]
+    return sorted(trials, key=lambda trial: -trial['cv_auc'])
+
+
+def youden_threshold(y, probs):
+    fpr, tpr, thresholds = roc_curve(y, probs)
+    best = np.argmax(tpr - fpr)
+    return float(min(1.0, thresholds[best]))
+
+
+def train(X, y, grid=DEFAULT_GRID, n_folds=5, processes=None, seed=2, test_size=0.2, feature_names=None):
+    """
+    Searches, refits the best parameters and returns the bundle dict (not yet
+    written). `feature_names` names the columns of X (default: key_features).
+    """
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=seed)
+    start = time.perf_counter()
+    trials = search(X_train, y_train, grid, n_folds, processes, seed)
+    best = trials[0]
+    threshold = youden_threshold(y_train, best['oof'])
+
+    scaler = StandardScaler().fit(X_train)
+    model = xgb.XGBClassifier(**BASE_PARAMS, **best['params'], n_jobs=os.cpu_count() or 1)
+    model.fit(scaler.transform(X_train), y_train)
+
+    probs = model.predict_proba(scaler.transform(X_test))[:, 1]
+    predicted = (probs > threshold).astype(int)
+    metrics = {
+        'cv_auc': best['cv_auc'],
+        'cv_auc_std': best['cv_auc_std'],
+        'test_auc': float(roc_auc_score(y_test, probs)),
+        'test_accuracy': float(accuracy_score(y_test, predicted)),
+        'test_sensitivity': float(predicted[y_test == 1].mean()),
+        'test_specificity': float(1 - predicted[y_test == 0].mean()),
+        'n_train': int(len(y_train)),
+        'n_test': int(len(y_test)),
+        'search_seconds': round(time.perf_counter() - start, 2),
+    }
+    return {
+        'format': BUNDLE_FORMAT,
+        'model': model,
+        'scaler': scaler,
+        'feature_names': list(feature_names or key_features),
+        'threshold': threshold,
+        'metrics': metrics,
+        'params': {**BASE_PARAMS, **best['params']},
+        'search': {'grid': grid, 'folds': n_folds, 'seed': seed,
+                   'top': [{k: v for k, v in trial.items() if k != 'oof'} for trial in trials[:5]]},
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+
+
+def write_bundle(bundle, path):
+    """Pickles `bundle` to `path` atomically: readers see the old file or the new one, never a mix."""
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, prefix='.bundle-', delete=False) as f:
+        pickle.dump(bundle, f)
+        f.flush()
+        os.fsync(f.fileno())
+    # NamedTemporaryFile creates 0600; the serving user may differ from the trainer
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(f.name, 0o666 & ~umask)
+    os.replace(f.name, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.getenv('TRAINING_CORPUS'),
+                        help="extract_corpus.py output to train on instead of the bundled CSV")
+    parser.add_argument('--out', default=DEFAULT_BUNDLE_PATH)
+    parser.add_argument('--processes', type=int, default=None, help="Search processes (default: one per core)")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=2)
+    parser.add_argument('--grid', type=json.loads, default=DEFAULT_GRID, help="JSON object of parameter lists")
+    parser.add_argument('--features', default=None, help="Comma-separated features to train on (default: all)")
+    parser.add_argument('--no-compile', action='store_true', help="Skip refreshing the compiled model.npz")
+    args = parser.parse_args()
+
+    df = load_corpus(args.corpus) if args.corpus else pd.read_csv(csv_path)
+    features = args.features.split(',') if args.features else key_features
+    unknown = sorted(set(features) - set(key_features))
+    if unknown:
+        parser.error(f"Unknown features: {unknown}")
+    X = df[features].to_numpy(dtype=np.float64)
+    y = df['class'].to_numpy()
 
-y = df['class']
+    bundle = train(X, y, args.grid, args.folds, args.processes, args.seed, feature_names=features)
+    bundle['training_data'] = os.path.abspath(args.corpus) if args.corpus else os.path.basename(csv_path)
+    write_bundle(bundle, args.out)
+    print(f"Bundle written to {args.out}")
+    print(json.dumps({'params': bundle['params'], 'threshold': bundle['threshold'], 'metrics': bundle['metrics']},
+                     indent=2))
 
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=2)
+    if not args.no_compile:
+        from tree_model import export_loaded
 
-model = xgb.XGBClassifier(random_state = 42,
-                            n_estimators = 100,
-                            learning_rate = 0.1,
-                            max_depth = 4,
-                            min_child_weight = 2,
-                            subsample = 0.8,
-                            colsample_bytree = 0.7,
-                            gamma = 1,
-                            alpha = 0)
+        compiled_path = compiled_path_for(args.out)
+        loaded = ModelRegistry(args.out, compiled_path=None).get()
+        export_loaded(loaded, compiled_path)
+        print(f"Compiled model {loaded.version} written to {compiled_path}")
 
-model.fit(X_train, y_train)
 
-model_path = os.path.join(script_dir, 'model.pkl')
-with open(model_path, 'wb') as f:
-    pickle.dump(model, f)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
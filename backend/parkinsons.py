@@ -1,18 +1,44 @@
 import os
-import requests
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Get API key from environment variables
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-#debugging
-print(f"API Key loaded: {'Yes' if GEMINI_API_KEY else 'No'}")  # Safe debugging output
-
-if not GEMINI_API_KEY:
-    raise ValueError("Gemini API key is missing! Please add it to the .env file.")
+import threading
+
+# Created on first use by get_client(), so a missing key only disables chat.
+# A missing key is remembered until restart, so chat calls fail fast and log it once
+client = None
+_missing_key = False
+_client_lock = threading.Lock()
+
+MISSING_KEY_MESSAGE = "Gemini API key is missing! Please add it to the .env file."
+
+CHAT_MODEL = "v1beta/models/gemini-2.0-flash"
+
+
+class ChatUnavailable(RuntimeError):
+    """Raised when no Gemini API key is configured."""
+
+
+def get_client():
+    """The shared GeminiClient, created from GEMINI_API_KEY (or .env) on first use."""
+    global client, _missing_key
+    if client is not None:
+        return client
+    if _missing_key:
+        raise ChatUnavailable(MISSING_KEY_MESSAGE)
+    with _client_lock:
+        if client is None:
+            if _missing_key:
+                raise ChatUnavailable(MISSING_KEY_MESSAGE)
+            from dotenv import load_dotenv
+            from gemini import client_from_env
+
+            # Load environment variables from .env file
+            load_dotenv()
+            api_key = os.getenv("GEMINI_API_KEY")
+            print(f"API Key loaded: {'Yes' if api_key else 'No'}")  # Safe debugging output
+            if not api_key:
+                _missing_key = True
+                raise ChatUnavailable(MISSING_KEY_MESSAGE)
+            client = client_from_env(api_key)
+    return client
 
 #for testing ai responses (prolly not gonna use it...)
 def classify_parkinsons_info(text: str) -> str:
@@ -34,21 +60,11 @@ def classify_parkinsons_info(text: str) -> str:
         "temperature": 0.7,
     }
 
-    headers = {
-        "Authorization": f"Bearer {GEMINI_API_KEY}",
-        "Content-Type": "application/json",
-    }
+    from gemini import GeminiError
 
     try:
-        response = requests.post(
-            "https://generativelanguage.googleapis.com/v1/models/gemini-pro:generateContent",
-            json=payload,
-            headers=headers,
-        )
-
-        response.raise_for_status()
-
-        data = response.json()
+        data = get_client().generate(
+            "v1/models/gemini-pro:generateContent", payload, stage="gemini.classify")
 
         result = data.get('text', '').strip()
 
@@ -64,57 +80,55 @@ def classify_parkinsons_info(text: str) -> str:
         else:
             return "Unable to classify. Please check the response."
 
-    except requests.exceptions.RequestException as e:
+    except ChatUnavailable as e:
+        print(f"Skipping classification: {e}")
+        return "Classification unavailable. Please try again later."
+    except GeminiError as e:
         print(f"Error during Gemini API request: {e}")
         return "Error in API request. Please try again."
 
-def get_parkinsons_chat_response(message: str) -> str:
-    try:
-        url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent" 
-
-        payload = {
-            "contents": [{
-                "parts": [{
-                    "text": message
-                }]
-            }],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 1024,
-            }
-        }
-
-        headers = {
-            "Content-Type": "application/json",
-            "x-goog-api-key": GEMINI_API_KEY
+def chat_payload(message: str) -> dict:
+    return {
+        "contents": [{
+            "parts": [{
+                "text": message
+            }]
+        }],
+        "generationConfig": {
+            "temperature": 0.7,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 1024,
         }
+    }
 
-        print(f"Sending request to Gemini API...")  # Debug log
-        response = requests.post(url, json=payload, headers=headers)
-        print(f"Response status: {response.status_code}")  # Debug log
-
-        if response.status_code != 200:
-            print(f"API Error Response: {response.text}")  # Debug log
-            return "I apologize, but there was an error processing your request."
+def get_parkinsons_chat_response(message: str) -> str:
+    """The chat reply; raises ChatUnavailable when no API key is configured."""
+    from gemini import response_text
 
-        data = response.json()
-        print(f"API Response: {data}")  # Debug log
+    chat_client = get_client()
+    try:
+        data = chat_client.generate(f"{CHAT_MODEL}:generateContent", chat_payload(message), stage="gemini.chat")
 
-        # Extract text from the response
-        if "candidates" in data:
-            return data["candidates"][0]["content"]["parts"][0]["text"].strip()
-        elif "text" in data:
-            return data["text"].strip()
-        else:
-            print(f"Unexpected response structure: {data}")
+        text = response_text(data).strip()
+        if not text:
+            print(f"Unexpected response structure: {list(data)}")
             return "I apologize, but I received an unexpected response format."
+        return text
 
     except Exception as e:
         print(f"Error in get_parkinsons_chat_response: {str(e)}")
+        if getattr(e, "status", None) is not None:
+            return "I apologize, but there was an error processing your request."
         return f"I apologize, but I'm having trouble responding right now. Error: {str(e)}"
 
+def stream_parkinsons_chat_response(message: str):
+    """
+    Yields the chat reply in chunks as Gemini produces them; raises GeminiError
+    on failure, and ChatUnavailable right away when no API key is configured.
+    """
+    return get_client().stream(f"{CHAT_MODEL}:streamGenerateContent", chat_payload(message), stage="gemini.chat_stream")
+
 def main():
     parkinsons_text = "Patient shows tremors and rigidity in their muscles, which are typical symptoms of Parkinson's disease."
 
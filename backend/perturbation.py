@@ -0,0 +1,184 @@
+"""
+Vectorized NumPy versions of Praat's jitter and shimmer measures.
+
+These follow Praat's PointProcess/AmplitudeTier implementations: periods
+outside [period_floor, period_ceiling] or differing from their neighbours by
+more than `max_period_factor` are skipped, and shimmer peaks are Hann-windowed
+RMS values around each pulse. All nine jitter and shimmer features (plus the
+derived ddp/dda) are computed in one pass over the pulse times.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+PERIOD_FLOOR = 0.0001
+PERIOD_CEILING = 0.02
+MAX_PERIOD_FACTOR = 1.3
+MAX_AMPLITUDE_FACTOR = 1.6
+
+
+def _ratio(a, b):
+    # Praat's "interval factor": the larger of a/b and b/a
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.maximum(a / b, b / a)
+
+
+def _in_range(periods, floor, ceiling):
+    return (periods >= floor) & (periods <= ceiling)
+
+
+def _windows(values, width):
+    if len(values) < width:
+        return np.empty((0, width))
+    return sliding_window_view(values, width)
+
+
+def _valid_windows(periods, width, floor, ceiling, max_factor):
+    """Mask of `width`-period windows where every period and neighbouring ratio is acceptable."""
+    windows = _windows(periods, width)
+    if len(windows) == 0:
+        return windows, np.zeros(0, dtype=bool)
+    valid = _in_range(windows, floor, ceiling).all(axis=1)
+    if width > 1:
+        valid &= (_ratio(windows[:, :-1], windows[:, 1:]) <= max_factor).all(axis=1)
+    return windows, valid
+
+
+def mean_period(periods, floor=PERIOD_FLOOR, ceiling=PERIOD_CEILING, max_factor=MAX_PERIOD_FACTOR):
+    """
+    PointProcess_getMeanPeriod: a period counts if it is in range and close to
+    either neighbour. The first and last periods are missing a neighbour, which
+    Praat treats as close enough.
+    """
+    n = len(periods)
+    if n < 1:
+        return np.nan
+
+    ok = (periods > 0) & _in_range(periods, floor, ceiling)
+    if n > 1:
+        previous = np.ones(n)
+        following = np.ones(n)
+        previous[1:] = _ratio(periods[1:], periods[:-1])
+        following[:-1] = _ratio(periods[:-1], periods[1:])
+        ok &= (previous <= max_factor) | (following <= max_factor)
+
+    if not ok.any():
+        return np.nan
+    return periods[ok].mean()
+
+
+def jitter(pulse_times, floor=PERIOD_FLOOR, ceiling=PERIOD_CEILING, max_factor=MAX_PERIOD_FACTOR):
+    """Returns local, local absolute, rap, ppq5 and ddp jitter for a sequence of pulse times."""
+    periods = np.diff(pulse_times)
+    result = dict.fromkeys(['local', 'local_absolute', 'rap', 'ppq5', 'ddp'], np.nan)
+    mean = mean_period(periods, floor, ceiling, max_factor)
+
+    pairs, valid = _valid_windows(periods, 2, floor, ceiling, max_factor)
+    if valid.any():
+        absolute = np.abs(pairs[valid, 0] - pairs[valid, 1]).mean()
+        result['local_absolute'] = absolute
+        result['local'] = absolute / mean
+
+    triples, valid = _valid_windows(periods, 3, floor, ceiling, max_factor)
+    if valid.any():
+        t = triples[valid]
+        result['rap'] = np.abs(t[:, 1] - t.mean(axis=1)).mean() / mean
+        result['ddp'] = np.abs((t[:, 2] - t[:, 1]) - (t[:, 1] - t[:, 0])).mean() / mean
+
+    fives, valid = _valid_windows(periods, 5, floor, ceiling, max_factor)
+    if valid.any():
+        f = fives[valid]
+        result['ppq5'] = np.abs(f[:, 2] - f.mean(axis=1)).mean() / mean
+
+    return result
+
+
+def hann_windowed_rms(samples, x1, dx, centers, widths_left, widths_right):
+    """
+    Praat's Sound_getHannWindowedRms for many centers at once. Windows with
+    fewer than three samples are undefined (NaN).
+    """
+    n = len(samples)
+    start = np.maximum(np.ceil((centers - widths_left - x1) / dx), 0).astype(int)
+    stop = np.minimum(np.floor((centers + widths_right - x1) / dx), n - 1).astype(int)
+    lengths = stop - start + 1
+
+    rms = np.full(len(centers), np.nan)
+    enough = lengths >= 3
+    if not enough.any():
+        return rms
+
+    start, lengths = start[enough], lengths[enough]
+    centers = centers[enough]
+    widths_left, widths_right = widths_left[enough], widths_right[enough]
+
+    offsets = np.arange(lengths.max())
+    index = start[:, None] + offsets[None, :]
+    inside = offsets[None, :] < lengths[:, None]
+    index = np.where(inside, index, 0)
+
+    times = x1 + index * dx
+    width = np.where(times < centers[:, None], widths_left[:, None], widths_right[:, None])
+    window = 0.5 + 0.5 * np.cos(np.pi * (times - centers[:, None]) / width)
+    window = np.where(inside, window, 0.0)
+    windowed = samples[index] * window
+
+    rms[enough] = np.sqrt((windowed ** 2).sum(axis=1) / (window ** 2).sum(axis=1))
+    return rms
+
+
+def peak_amplitudes(pulse_times, samples, x1, dx,
+                    floor=PERIOD_FLOOR, ceiling=PERIOD_CEILING, max_factor=MAX_PERIOD_FACTOR):
+    """PointProcess_Sound_to_AmplitudeTier_period: (times, amplitudes) of the usable pulses."""
+    if len(pulse_times) < 3:
+        return np.empty(0), np.empty(0)
+
+    p1 = pulse_times[1:-1] - pulse_times[:-2]
+    p2 = pulse_times[2:] - pulse_times[1:-1]
+    valid = (_in_range(p1, floor, ceiling) & _in_range(p2, floor, ceiling)
+             & (_ratio(p1, p2) <= max_factor))
+
+    centers = pulse_times[1:-1][valid]
+    peaks = hann_windowed_rms(samples, x1, dx, centers, 0.2 * p1[valid], 0.2 * p2[valid])
+    keep = np.isfinite(peaks) & (peaks > 0)
+    return centers[keep], peaks[keep]
+
+
+def _valid_amplitude_windows(times, amplitudes, width, floor, ceiling, max_amplitude_factor):
+    amps = _windows(amplitudes, width)
+    if len(amps) == 0:
+        return amps, np.zeros(0, dtype=bool)
+    periods = _windows(np.diff(times), width - 1)
+    valid = _in_range(periods, floor, ceiling).all(axis=1)
+    valid &= (_ratio(amps[:, :-1], amps[:, 1:]) <= max_amplitude_factor).all(axis=1)
+    return amps, valid
+
+
+def shimmer(pulse_times, samples, x1, dx, floor=PERIOD_FLOOR, ceiling=PERIOD_CEILING,
+            max_factor=MAX_PERIOD_FACTOR, max_amplitude_factor=MAX_AMPLITUDE_FACTOR):
+    """Returns local, local_dB, apq3, apq5, apq11 and dda shimmer for a mono signal."""
+    result = dict.fromkeys(['local', 'local_dB', 'apq3', 'apq5', 'apq11', 'dda'], np.nan)
+    times, amplitudes = peak_amplitudes(pulse_times, samples, x1, dx, floor, ceiling, max_factor)
+    if len(amplitudes) < 2:
+        return result
+    # Praat's AmplitudeTier shimmer averages every peak except the last one
+    mean_amplitude = amplitudes[:-1].mean()
+
+    pairs, valid = _valid_amplitude_windows(times, amplitudes, 2, floor, ceiling, max_amplitude_factor)
+    if valid.any():
+        a = pairs[valid]
+        result['local'] = np.abs(a[:, 0] - a[:, 1]).mean() / mean_amplitude
+        result['local_dB'] = np.abs(20 * np.log10(a[:, 0] / a[:, 1])).mean()
+
+    triples, valid = _valid_amplitude_windows(times, amplitudes, 3, floor, ceiling, max_amplitude_factor)
+    if valid.any():
+        a = triples[valid]
+        result['apq3'] = np.abs(a[:, 1] - a.mean(axis=1)).mean() / mean_amplitude
+        result['dda'] = np.abs((a[:, 2] - a[:, 1]) - (a[:, 1] - a[:, 0])).mean() / mean_amplitude
+
+    for width, key in ((5, 'apq5'), (11, 'apq11')):
+        windows, valid = _valid_amplitude_windows(times, amplitudes, width, floor, ceiling, max_amplitude_factor)
+        if valid.any():
+            a = windows[valid]
+            result[key] = np.abs(a[:, width // 2] - a.mean(axis=1)).mean() / mean_amplitude
+
+    return result
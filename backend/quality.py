@@ -0,0 +1,111 @@
+"""
+Pre-flight quality gate for recordings, run on the decoded samples before
+any Praat analysis.
+
+`assess` computes a handful of cheap, vectorized measurements (a few
+milliseconds for a typical recording) and lists every limit the recording
+fails:
+
+  duration         seconds of audio
+  rms_dbfs         overall level in dB relative to full scale
+  clipping         share of samples sitting on a flat top at full scale
+  voiced_fraction  share of frames that vad.frame_activity marks as voiced
+                   (loud, low zero-crossing rate), i.e. a sustained vowel
+  snr_db           loud frames vs. the noise floor, estimated from the
+                   unvoiced frames; None when fewer than NOISE_MIN_FRACTION of
+                   the frames are unvoiced (trimmed recordings have no pause
+                   to measure noise in)
+"""
+import numpy as np
+
+from vad import frame_activity
+
+DEFAULT_LIMITS = {
+    'min_duration': 0.5,
+    # None for no limit
+    'max_duration': 120.0,
+    'min_rms_dbfs': -55.0,
+    'max_clipping': 0.01,
+    'min_snr_db': 10.0,
+    'min_voiced_fraction': 0.2,
+}
+
+CLIP_LEVEL = 0.999
+# Share of unvoiced frames needed before their level is trusted as the noise floor
+NOISE_MIN_FRACTION = 0.2
+
+
+class QualityError(ValueError):
+    """Raised by `check` when a recording fails the gate; `report` says why."""
+
+    def __init__(self, report):
+        super().__init__("; ".join(reason['message'] for reason in report['reasons']))
+        self.report = report
+
+
+def measure(samples, rate):
+    """The raw measurements for mono `samples` in [-1, 1] at `rate` Hz."""
+    samples = np.asarray(samples, dtype=np.float64)
+    duration = len(samples) / rate
+    if len(samples) == 0:
+        return {'duration': 0.0, 'rms_dbfs': None, 'clipping': 0.0, 'snr_db': None, 'voiced_fraction': 0.0}
+
+    rms = np.sqrt(np.mean(samples ** 2))
+    peak = np.abs(samples) >= CLIP_LEVEL
+    # Clipped audio flattens at full scale, so count repeated full-scale samples
+    clipped = np.count_nonzero(peak[1:] & (samples[1:] == samples[:-1])) / len(samples)
+
+    energy, is_voiced, _ = frame_activity(samples, rate)
+    snr = None
+    voiced = 0.0
+    if len(energy):
+        voiced = float(np.mean(is_voiced))
+        if 1 - voiced >= NOISE_MIN_FRACTION:
+            snr = round(float(np.percentile(energy, 95) - np.percentile(energy[~is_voiced], 10)), 2)
+
+    return {
+        'duration': round(duration, 3),
+        # None for digital silence; JSON has no -inf
+        'rms_dbfs': round(float(20 * np.log10(rms)), 2) if rms > 0 else None,
+        'clipping': round(float(clipped), 5),
+        'snr_db': snr,
+        'voiced_fraction': round(voiced, 3),
+    }
+
+
+def assess(samples, rate, limits=None):
+    """Returns {'ok', 'metrics', 'reasons'}; each reason has a machine-readable `code` and a `message`."""
+    limits = {**DEFAULT_LIMITS, **(limits or {})}
+    metrics = measure(samples, rate)
+    reasons = []
+
+    def fail(code, message):
+        reasons.append({'code': code, 'message': message})
+
+    if metrics['duration'] < limits['min_duration']:
+        fail('too_short', f"Recording is {metrics['duration']:.2f}s long; at least "
+                          f"{limits['min_duration']:.1f}s of sustained vowel is needed")
+    elif limits['max_duration'] is not None and metrics['duration'] > limits['max_duration']:
+        fail('too_long', f"Recording is {metrics['duration']:.0f}s long; the limit is {limits['max_duration']:.0f}s")
+    loud_enough = metrics['rms_dbfs'] is not None and metrics['rms_dbfs'] >= limits['min_rms_dbfs']
+    if not loud_enough:
+        fail('too_quiet', "Recording is silent or too quiet; move closer to the microphone")
+    if metrics['clipping'] > limits['max_clipping']:
+        fail('clipped', "Recording is clipped; move further from the microphone or lower the input gain")
+    if metrics['duration'] >= limits['min_duration'] and loud_enough:
+        # Noise and voicing are meaningless for recordings that already failed on length or level
+        if metrics['snr_db'] is not None and metrics['snr_db'] < limits['min_snr_db']:
+            fail('noisy', "Background noise is too loud compared to the voice")
+        if metrics['voiced_fraction'] < limits['min_voiced_fraction']:
+            fail('not_voiced', "No sustained vowel found; say \"ahh\" steadily for a few seconds")
+
+    return {'ok': not reasons, 'metrics': metrics, 'reasons': reasons}
+
+
+def check(sound, limits=None):
+    """Raises QualityError unless the parselmouth.Sound passes the gate; returns the report otherwise."""
+    samples = sound.values[0] if sound.values.ndim == 2 else sound.values
+    report = assess(samples, sound.sampling_frequency, limits)
+    if not report['ok']:
+        raise QualityError(report)
+    return report
@@ -0,0 +1,119 @@
+"""
+Compares analysis sample-rate policies over a directory of recordings.
+
+For every policy the corpus is decoded the way uploads are, then features and
+predictions are computed. Each policy is reported against the reference
+policy (the first one listed):
+
+  - per-feature drift: median and maximum relative difference
+  - prediction agreement: share of files with the same 0/1 prediction
+  - speedup: reference feature-extraction time / policy time
+
+Usage:
+    python rate_report.py [--dir uploads] [--policies 44100,22050,16000,minimum,native] [--json out.json]
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+
+from analyzer import Analyzer
+from audio import decode_bytes, parse_rate_policy
+from features import FEATURE_NAMES
+
+
+def measure(paths, policy, analyzer):
+    """Features, probabilities and extraction wall time for every path that analyzes cleanly."""
+    features = {}
+    probabilities = {}
+    elapsed = 0.0
+    for path in paths:
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            sound = decode_bytes(data, os.path.basename(path), policy)
+            start = time.perf_counter()
+            values = analyzer.get_features(sound)
+            elapsed += time.perf_counter() - start
+        except Exception as e:
+            print(f"Skipping {path} at {policy}: {e}")
+            continue
+        features[path] = values[0]
+        probabilities[path] = analyzer.predict_many(values)[0]['probability']
+    return features, probabilities, elapsed
+
+
+def compare(reference, candidate, threshold):
+    ref_features, ref_probs, ref_time = reference
+    features, probs, elapsed = candidate
+    common = sorted(set(ref_features) & set(features))
+
+    drift = {}
+    if common:
+        a = np.vstack([ref_features[path] for path in common])
+        b = np.vstack([features[path] for path in common])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative = np.abs(b - a) / np.abs(a)
+        for i, name in enumerate(FEATURE_NAMES):
+            column = relative[:, i][np.isfinite(relative[:, i])]
+            drift[name] = {
+                'median': float(np.median(column)) if len(column) else None,
+                'max': float(column.max()) if len(column) else None,
+            }
+
+    agree = [(ref_probs[path] > threshold) == (probs[path] > threshold) for path in common]
+    return {
+        'files': len(common),
+        'prediction_agreement': float(np.mean(agree)) if agree else None,
+        'max_probability_change': max((abs(ref_probs[p] - probs[p]) for p in common), default=None),
+        'extraction_seconds': elapsed,
+        'speedup': ref_time / elapsed if elapsed else None,
+        'feature_drift': drift,
+    }
+
+
+def _cell(value, spec, width):
+    # compare() reports None when no file is common to both runs
+    return format('n/a' if value is None else format(value, spec), f'>{width}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default='uploads')
+    parser.add_argument('--policies', default='44100,22050,16000,minimum,native')
+    parser.add_argument('--threshold', type=float, default=None, help="Default: the model's own threshold")
+    parser.add_argument('--backend', default='numpy', choices=['numpy', 'praat'])
+    parser.add_argument('--json', help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    policies = [parse_rate_policy(p) for p in args.policies.split(',')]
+    paths = sorted(glob.glob(os.path.join(args.dir, '*.wav')))
+    analyzer = Analyzer(perturbation_backend=args.backend)
+
+    threshold = args.threshold if args.threshold is not None else analyzer.threshold
+
+    runs = [measure(paths, policy, analyzer) for policy in policies]
+    report = {str(policy): compare(runs[0], run, threshold) for policy, run in zip(policies, runs)}
+
+    print(f"\nReference policy: {policies[0]}  ({len(paths)} files)\n")
+    print(f"{'policy':>10} {'files':>6} {'agree':>7} {'max dP':>8} {'time s':>8} {'speedup':>8} {'worst feature drift':>30}")
+    for policy, row in report.items():
+        worst = max(((name, d['max']) for name, d in row['feature_drift'].items() if d['max'] is not None),
+                    key=lambda item: item[1], default=('-', 0.0))
+        print(f"{policy:>10} {row['files']:>6} {_cell(row['prediction_agreement'], '.1%', 7)} "
+              f"{_cell(row['max_probability_change'], '.4f', 8)} {row['extraction_seconds']:>8.2f} "
+              f"{_cell(row['speedup'], '.2f', 7)}x {worst[0]:>20} {worst[1]:>9.2%}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nFull report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Analysis sample-rate policies: which rate an upload is resampled to once at
+decode time. Kept free of numpy and parselmouth so the app's configuration can
+be read before any audio code is imported.
+"""
+
+# Default analysis rate; uploads are always analyzed mono, 16-bit
+ANALYSIS_RATE = 44100
+
+# The highest frequency any feature looks at is the 5500 Hz formant ceiling,
+# so anything sampled at twice that keeps all the information Praat uses
+FORMANT_CEILING = 5500
+STANDARD_RATES = [8000, 11025, 16000, 22050, 32000, 44100, 48000]
+
+RATE_POLICIES = ("native", "minimum")
+
+
+def parse_rate_policy(value):
+    """Accepts "native", "minimum" or a fixed rate in Hz (as int or string)."""
+    if isinstance(value, str) and value.strip().lower() in RATE_POLICIES:
+        return value.strip().lower()
+    rate = int(value)
+    if rate <= 0:
+        raise ValueError(f"Invalid analysis rate: {value}")
+    return rate
+
+
+def analysis_rate(native_rate, policy=ANALYSIS_RATE):
+    """
+    The rate a recording sampled at `native_rate` is analyzed at.
+
+    "native" keeps the recording's own rate, "minimum" picks the lowest
+    standard rate that still covers the formant ceiling (never upsampling),
+    and an integer forces that rate.
+    """
+    if policy == "native":
+        return native_rate
+    if policy == "minimum":
+        sufficient = next(rate for rate in STANDARD_RATES if rate >= 2 * FORMANT_CEILING)
+        return min(native_rate, sufficient)
+    return int(policy)
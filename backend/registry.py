@@ -0,0 +1,145 @@
+import hashlib
+import os
+import pickle
+import threading
+
+from tree_model import DEFAULT_COMPILED_PATH, CompiledTrees
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+# Written by models/model.py: model, scaler, feature order, threshold and metrics in one pickle
+DEFAULT_BUNDLE_PATH = os.path.join(script_dir, 'models/bundle.pkl')
+BUNDLE_FORMAT = 'pearlyx-bundle/1'
+
+
+def compiled_path_for(bundle_path):
+    """
+    Where models/model.py writes the compiled model of `bundle_path`: the
+    serving bundle's goes to DEFAULT_COMPILED_PATH, any other bundle's next to
+    it with a .npz extension.
+    """
+    if os.path.abspath(bundle_path) == os.path.abspath(DEFAULT_BUNDLE_PATH):
+        return DEFAULT_COMPILED_PATH
+    return os.path.splitext(bundle_path)[0] + '.npz'
+
+
+class LoadedModel:
+    """An immutable snapshot of the model artifacts that were on disk at load time."""
+
+    def __init__(self, model, scaler, version, feature_names=None, threshold=None, metrics=None):
+        self.model = model
+        self.scaler = scaler
+        self.version = version
+        # Known for bundles (and models compiled from them); None for bare pickles
+        self.feature_names = feature_names
+        self.threshold = threshold
+        self.metrics = metrics or {}
+
+
+class ModelRegistry:
+    """
+    Loads the model artifacts once and shares them across requests.
+
+    `model_path` is either a bundle written by models/model.py, which carries
+    its own scaler, or a bare pickled model with an optional separate
+    `scaler_path`. `get()` only stats the artifacts on disk; when their mtime
+    or size changes the artifacts are reloaded under a lock and the new
+    snapshot replaces the old one. Requests that already hold a snapshot keep
+    using it.
+    """
+
+    def __init__(self, model_path=DEFAULT_BUNDLE_PATH, scaler_path=None,
+                 compiled_path=DEFAULT_COMPILED_PATH):
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        # Compiled trees exported from the same model/scaler (see tree_model.py);
+        # used instead of unpickling when present and up to date
+        self.compiled_path = compiled_path
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._signature = None
+
+    def _stat_signature(self):
+        signature = []
+        for path in (self.model_path, self.scaler_path, self.compiled_path):
+            if path is None:
+                signature.append(None)
+                continue
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _load(self):
+        print(f"Loading model from: {self.model_path}")
+        with open(self.model_path, 'rb') as f:
+            model_bytes = f.read()
+        scaler_bytes = None
+        if self.scaler_path is not None:
+            try:
+                with open(self.scaler_path, 'rb') as f:
+                    scaler_bytes = f.read()
+            except FileNotFoundError:
+                pass
+
+        digest = hashlib.sha256(model_bytes)
+        if scaler_bytes is not None:
+            digest.update(scaler_bytes)
+        version = digest.hexdigest()[:12]
+
+        if self.compiled_path and os.path.exists(self.compiled_path):
+            compiled = CompiledTrees.load(self.compiled_path)
+            if compiled.version == version:
+                # The scaler is applied inside the compiled model
+                print(f"Compiled model loaded: {self.compiled_path}")
+                return LoadedModel(compiled, None, version, compiled.feature_names, compiled.decision_threshold,
+                                   compiled.metrics)
+            print(f"Ignoring stale compiled model {self.compiled_path} ({compiled.version} != {version})")
+
+        model = pickle.loads(model_bytes)
+        if isinstance(model, dict) and model.get('format') == BUNDLE_FORMAT:
+            print(f"Bundle loaded: {type(model['model'])} trained {model.get('trained_at')}")
+            return LoadedModel(model['model'], model['scaler'], version, model['feature_names'],
+                               model['threshold'], model['metrics'])
+
+        print(f"Model loaded: {type(model)}")
+        if scaler_bytes is not None:
+            scaler = pickle.loads(scaler_bytes)
+            print(f"Scaler loaded: {type(scaler)}")
+        else:
+            print("No scaler file found")
+            scaler = None
+
+        return LoadedModel(model, scaler, version)
+
+    def get(self):
+        signature = self._stat_signature()
+        loaded = self._loaded
+        if loaded is not None and signature == self._signature:
+            return loaded
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            signature = self._stat_signature()
+            if self._loaded is None or signature != self._signature:
+                self._loaded = self._load()
+                self._signature = signature
+            return self._loaded
+
+    @property
+    def version(self):
+        return self.get().version
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_registry():
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = ModelRegistry()
+    return _default_registry
@@ -0,0 +1,199 @@
+"""
+Longitudinal store of analysis results per subject.
+
+Every recorded result keeps its feature vector, probability and model version
+in SQLite (WAL mode, so readers never wait for the writer). Results are
+indexed by (subject, time) for per-subject range queries and by time alone.
+
+Trends are kept as running least-squares sums per subject and metric:
+n, Σx, Σy, Σx², Σxy, Σy², with x in days since the subject's first result.
+One row holds the whole history and one row per calendar day (UTC) holds
+that day's share, so any mean or slope over the full history is O(1), and one
+over the last N days sums at most N rows. Deleting a result subtracts its
+contribution again, so nothing is ever recomputed from the raw results.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from features import FEATURE_NAMES
+
+# Trend metric -> feature name (None: the model's probability)
+TREND_METRICS = {
+    'jitter': 'locPctJitter',
+    'shimmer': 'locShimmer',
+    'hnr': 'meanHarmToNoiseHarmonicity',
+    'probability': None,
+}
+ROLLING_DAYS = (7, 30, 90)
+DAY = 86400.0
+
+_SUMS = ('n', 'sx', 'sy', 'sxx', 'sxy', 'syy')
+
+
+class ResultsStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        sums = ", ".join(f"{name} REAL NOT NULL DEFAULT 0" for name in _SUMS)
+        with self._lock:
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " id INTEGER PRIMARY KEY, subject TEXT NOT NULL, session TEXT,"
+                " recorded_at REAL NOT NULL, model_version TEXT, probability REAL NOT NULL,"
+                " prediction INTEGER NOT NULL, feature_names TEXT NOT NULL, features BLOB NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS results_subject_time ON results (subject, recorded_at);"
+                "CREATE INDEX IF NOT EXISTS results_time ON results (recorded_at);"
+                "CREATE TABLE IF NOT EXISTS subjects (subject TEXT PRIMARY KEY, origin REAL NOT NULL);"
+                f"CREATE TABLE IF NOT EXISTS trend_totals (subject TEXT, metric TEXT, {sums},"
+                " PRIMARY KEY (subject, metric));"
+                f"CREATE TABLE IF NOT EXISTS trend_days (subject TEXT, metric TEXT, day INTEGER, {sums},"
+                " PRIMARY KEY (subject, metric, day));")
+
+    @property
+    def _db(self):
+        # SQLite connections must not cross fork(); a preloaded store reconnects in each worker
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                               isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def record(self, subject, features, prediction, model_version=None, session=None, recorded_at=None):
+        """
+        Stores one result (`features` in FEATURE_NAMES order, `prediction` as
+        returned by Analyzer.predict) and folds it into the subject's trends.
+        Returns the result id.
+        """
+        recorded_at = time.time() if recorded_at is None else float(recorded_at)
+        features = np.asarray(features, dtype=np.float64).reshape(-1)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._db.execute(
+                    "INSERT INTO results (subject, session, recorded_at, model_version, probability, prediction,"
+                    " feature_names, features) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (subject, session, recorded_at, model_version, float(prediction['probability']),
+                     int(prediction['prediction']), ",".join(FEATURE_NAMES), features.tobytes()))
+                self._db.execute("INSERT OR IGNORE INTO subjects (subject, origin) VALUES (?, ?)",
+                                 (subject, recorded_at))
+                self._accumulate(subject, recorded_at, features, prediction['probability'], 1)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return cursor.lastrowid
+
+    def delete(self, result_id):
+        """Removes a result and its contribution to the trends; returns False if it did not exist."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT subject, recorded_at, probability, features FROM results"
+                                       " WHERE id = ?", (result_id,)).fetchone()
+                if row is not None:
+                    subject, recorded_at, probability, blob = row
+                    self._accumulate(subject, recorded_at, np.frombuffer(blob), probability, -1)
+                    self._db.execute("DELETE FROM results WHERE id = ?", (result_id,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return row is not None
+
+    def _accumulate(self, subject, recorded_at, features, probability, sign):
+        origin = self._db.execute("SELECT origin FROM subjects WHERE subject = ?", (subject,)).fetchone()[0]
+        x = (recorded_at - origin) / DAY
+        day = int(recorded_at // DAY)
+        for metric, name in TREND_METRICS.items():
+            y = float(probability) if name is None else float(features[FEATURE_NAMES.index(name)])
+            if not np.isfinite(y):
+                continue
+            values = tuple(sign * v for v in (1, x, y, x * x, x * y, y * y))
+            updates = ", ".join(f"{name} = {name} + ?" for name in _SUMS)
+            for table, key, key_values in (('trend_totals', 'subject, metric', (subject, metric)),
+                                           ('trend_days', 'subject, metric, day', (subject, metric, day))):
+                placeholders = ", ".join("?" * (len(key_values) + len(_SUMS)))
+                self._db.execute(
+                    f"INSERT INTO {table} ({key}, {', '.join(_SUMS)}) VALUES ({placeholders})"
+                    f" ON CONFLICT ({key}) DO UPDATE SET {updates}",
+                    key_values + values + values)
+
+    def trend(self, subject, rolling_days=ROLLING_DAYS):
+        """
+        Count, time span and per-metric mean/slope over the whole history and
+        over the last `rolling_days` days before the latest result. None for an
+        unknown subject.
+        """
+        with self._lock:
+            latest = self._db.execute(
+                "SELECT recorded_at, probability, prediction, model_version FROM results"
+                " WHERE subject = ? ORDER BY recorded_at DESC LIMIT 1", (subject,)).fetchone()
+            if latest is None:
+                return None
+            first = self._db.execute(
+                "SELECT recorded_at FROM results WHERE subject = ? ORDER BY recorded_at LIMIT 1",
+                (subject,)).fetchone()[0]
+            totals = {row[0]: row[1:] for row in self._db.execute(
+                f"SELECT metric, {', '.join(_SUMS)} FROM trend_totals WHERE subject = ?", (subject,))}
+            last_day = int(latest[0] // DAY)
+            rolling = {}
+            for days in rolling_days:
+                rolling[days] = {row[0]: row[1:] for row in self._db.execute(
+                    f"SELECT metric, {', '.join(f'SUM({name})' for name in _SUMS)} FROM trend_days"
+                    " WHERE subject = ? AND day > ? GROUP BY metric", (subject, last_day - days))}
+
+        metrics = {}
+        for metric in TREND_METRICS:
+            summary = _summarize(totals.get(metric))
+            summary['rolling'] = {str(days): _summarize(rolling[days].get(metric)) for days in rolling_days}
+            metrics[metric] = summary
+        return {
+            'subject': subject,
+            # Every result has a probability, so its running count is the result count
+            'count': metrics['probability']['n'],
+            'first_recorded_at': first,
+            'last_recorded_at': latest[0],
+            'latest': {'probability': latest[1], 'prediction': latest[2], 'model_version': latest[3]},
+            'metrics': metrics,
+        }
+
+    def results(self, subject, start=None, end=None, limit=100):
+        """The subject's results between `start` and `end` (epoch seconds), newest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, session, recorded_at, model_version, probability, prediction, feature_names, features"
+                " FROM results WHERE subject = ? AND recorded_at >= ? AND recorded_at <= ?"
+                " ORDER BY recorded_at DESC LIMIT ?",
+                (subject, -np.inf if start is None else start, np.inf if end is None else end, limit)).fetchall()
+        return [{
+            'id': row[0],
+            'session': row[1],
+            'recorded_at': row[2],
+            'model_version': row[3],
+            'probability': row[4],
+            'prediction': row[5],
+            'features': {name: (float(v) if np.isfinite(v) else None)
+                         for name, v in zip(row[6].split(","), np.frombuffer(row[7]))},
+        } for row in rows]
+
+
+def _summarize(sums):
+    """Mean, standard deviation and least-squares slope (per day) from running sums."""
+    if sums is None or sums[0] < 0.5:
+        return {'n': 0, 'mean': None, 'std': None, 'slope_per_day': None}
+    n, sx, sy, sxx, sxy, syy = sums
+    mean = sy / n
+    variance = max(0.0, syy / n - mean * mean)
+    spread = n * sxx - sx * sx
+    # Results at a single point in time have no slope
+    slope = (n * sxy - sx * sy) / spread if spread > 1e-9 * max(1.0, n * sxx) else None
+    return {'n': int(round(n)), 'mean': mean, 'std': variance ** 0.5, 'slope_per_day': slope}
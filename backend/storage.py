@@ -0,0 +1,307 @@
+import hashlib
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+
+try:
+    import fcntl
+except ImportError:  # Windows development servers run a single process
+    fcntl = None
+_thread_lock = threading.Lock()
+
+# Bytes hashed per read when computing content digests
+CHUNK_BYTES = 1 << 20
+
+
+def file_digest(path, prefix=b""):
+    """blake2b hex digest of `prefix` followed by a file's contents, read in chunks."""
+    digest = hashlib.blake2b(prefix, digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LockedFile:
+    """
+    Opens a file holding an exclusive lock, so processes sharing a directory
+    (upload session chunks, live stream frames) take turns.
+    """
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, self.mode)
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        else:
+            _thread_lock.acquire()
+        # Append mode reports the position as 0 until the first write
+        self.file.seek(0, os.SEEK_END)
+        return self.file
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+        else:
+            _thread_lock.release()
+        self.file.close()
+
+
+@dataclass
+class Upload:
+    id: str
+    digest: str
+    name: str
+    size: int
+    created: float
+
+
+class UploadStore:
+    """
+    Content-addressed store for converted uploads.
+
+    Each WAV lives once under objects/<d[:2]>/<d[2:4]>/<digest>.wav, however many
+    times it was uploaded; clients get an opaque random id per upload, mapped to
+    the object in a SQLite index (store.sqlite) shared by all worker processes.
+    Originals are remembered by their own hash, so re-uploading a file already
+    converted skips ffmpeg entirely.
+
+    Objects unused for `ttl` seconds are removed, and least recently used ones
+    go first whenever the total size exceeds `max_bytes`. A daemon thread in
+    each process runs sweep() every `sweep_interval` seconds (0 disables it).
+    Files placed directly in `root` by hand are not managed, so `path` still
+    resolves plain filenames there for recordings that predate the store.
+    """
+
+    def __init__(self, root, max_bytes=1024 ** 3, ttl=24 * 3600, sweep_interval=300):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.index_path = os.path.join(root, "store.sqlite")
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self._sweeper_pid = None
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        with self._lock:
+            self._db.executescript(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                " digest TEXT PRIMARY KEY, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, last_access REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS objects_last_access ON objects (last_access);"
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " id TEXT PRIMARY KEY, digest TEXT NOT NULL, name TEXT NOT NULL, created REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS uploads_digest ON uploads (digest);"
+                "CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, digest TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS sources_digest ON sources (digest);")
+
+    @property
+    def _db(self):
+        # SQLite connections must not cross fork(); a preloaded store reconnects in each worker
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False,
+                                               isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:4], f"{digest}.wav")
+
+    def temp_path(self, suffix=""):
+        """A fresh path in the store's scratch directory, on the same filesystem as the objects."""
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir, suffix=suffix)
+        os.close(fd)
+        return path
+
+    def lookup_source(self, source, name):
+        """
+        A new upload of an original already converted under key `source`, or
+        None when it has not been seen (or its object was evicted).
+        """
+        self._start_sweeper()
+        with self._lock:
+            row = self._db.execute("SELECT digest FROM sources WHERE source = ?", (source,)).fetchone()
+            if row is None or not os.path.exists(self.object_path(row[0])):
+                return None
+            return self._link(row[0], name)
+
+    def add(self, wav_path, name, source=None):
+        """
+        Moves the converted file at `wav_path` into the store and returns its
+        Upload. An identical object already stored is reused and the new copy
+        discarded.
+        """
+        self._start_sweeper()
+        digest = file_digest(wav_path)
+        target = self.object_path(digest)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if os.path.exists(target):
+                    os.remove(wav_path)
+                else:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(wav_path, target)
+                now = time.time()
+                self._db.execute(
+                    "INSERT INTO objects (digest, size, created, last_access) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT (digest) DO UPDATE SET last_access = excluded.last_access",
+                    (digest, os.path.getsize(target), now, now))
+                if source is not None:
+                    self._db.execute("INSERT OR REPLACE INTO sources (source, digest) VALUES (?, ?)",
+                                     (source, digest))
+                upload = self._link(digest, name)
+                self._evict_over_quota(keep=digest)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return upload
+
+    def _link(self, digest, name):
+        now = time.time()
+        upload_id = secrets.token_urlsafe(16)
+        self._db.execute("INSERT INTO uploads (id, digest, name, created) VALUES (?, ?, ?, ?)",
+                         (upload_id, digest, name, now))
+        self._db.execute("UPDATE objects SET last_access = ? WHERE digest = ?", (now, digest))
+        size = self._db.execute("SELECT size FROM objects WHERE digest = ?", (digest,)).fetchone()[0]
+        return Upload(upload_id, digest, name, size, now)
+
+    def get(self, upload_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT u.digest, u.name, o.size, u.created FROM uploads u JOIN objects o USING (digest)"
+                " WHERE u.id = ?", (upload_id,)).fetchone()
+        return Upload(upload_id, *row) if row is not None else None
+
+    def path(self, upload_id):
+        """
+        The WAV behind `upload_id` (marking it recently used), or a plain .wav
+        file of that name directly in `root`; None when neither exists.
+        """
+        self._start_sweeper()
+        with self._lock:
+            row = self._db.execute("SELECT digest FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE objects SET last_access = ? WHERE digest = ?", (time.time(), row[0]))
+                path = self.object_path(row[0])
+                return path if os.path.exists(path) else None
+
+        # Only bare WAV names: the legacy lookup must not reach outside root or the index
+        if os.path.basename(upload_id) == upload_id and upload_id.lower().endswith(".wav"):
+            path = os.path.join(self.root, upload_id)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def delete(self, upload_id):
+        """Forgets `upload_id`; the object goes too once no other upload refers to it. Returns False if unknown."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT digest FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+                if row is not None:
+                    self._db.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+                    remaining = self._db.execute("SELECT 1 FROM uploads WHERE digest = ? LIMIT 1",
+                                                 (row[0],)).fetchone()
+                    if remaining is None:
+                        self._remove_object(row[0])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return row is not None
+
+    def sweep(self, now=None):
+        """Removes expired objects, then the least recently used until under quota. Returns counts."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                expired = [digest for (digest,) in self._db.execute(
+                    "SELECT digest FROM objects WHERE last_access < ?", (now - self.ttl,)).fetchall()]
+                for digest in expired:
+                    self._remove_object(digest)
+                evicted = self._evict_over_quota()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        removed_tmp = self._clean_tmp(now)
+        if expired or evicted:
+            print(f"Upload store sweep: {len(expired)} expired, {evicted} evicted over quota")
+        return {"expired": len(expired), "evicted": evicted, "tmp_removed": removed_tmp}
+
+    def usage(self):
+        with self._lock:
+            objects, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+            uploads = self._db.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+        return {"objects": objects, "bytes": size, "uploads": uploads, "max_bytes": self.max_bytes}
+
+    def _evict_over_quota(self, keep=None):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        evicted = 0
+        rows = self._db.execute("SELECT digest, size FROM objects ORDER BY last_access").fetchall()
+        for digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            # The object just added stays even if it alone exceeds the quota
+            if digest == keep:
+                continue
+            self._remove_object(digest)
+            total -= size
+            evicted += 1
+        return evicted
+
+    def _remove_object(self, digest):
+        self._db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+        self._db.execute("DELETE FROM uploads WHERE digest = ?", (digest,))
+        self._db.execute("DELETE FROM sources WHERE digest = ?", (digest,))
+        try:
+            os.remove(self.object_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def _clean_tmp(self, now):
+        # Scratch files left by requests that died mid-upload
+        removed = 0
+        for entry in os.scandir(self.tmp_dir):
+            try:
+                if entry.stat().st_mtime < now - 3600:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _start_sweeper(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        with self._lock:
+            if not self.sweep_interval or self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_forever, name="upload-sweeper", daemon=True).start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Upload store sweep failed: {str(e)}")
@@ -0,0 +1,329 @@
+"""
+Incremental analysis of a live PCM stream.
+
+Audio arrives in arbitrary-sized frames. Every `hop` seconds the last `block`
+seconds are analyzed once with the regular FeatureExtractor and the row is
+kept; nothing older than `window` seconds is looked at again. The window's
+features are the block rows pooled with vad.pool (counts summed, jitter and
+shimmer weighted by periods, ...), taking every block that ends a whole
+number of blocks before now so the pooled blocks never overlap. Each hop
+therefore costs one fixed-size extraction plus one pooled prediction, however
+long the stream has been running.
+
+Blocks that are mostly unvoiced (vad.frame_activity) are not analyzed, so
+pauses cost almost nothing and do not drag the statistics down.
+
+Frames arrive as plain HTTP POSTs (the /live routes in app.py); there is no
+WebSocket transport, and the frontend does not record into it yet.
+LiveStreams keeps each stream's state on disk between frames, so any gunicorn
+worker can take the next POST.
+"""
+import json
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import parselmouth
+
+import vad
+from features import FEATURE_NAMES, FeatureExtractor
+from metrics import track
+from storage import LockedFile
+
+DEFAULT_BLOCK = 1.0
+DEFAULT_HOP = 0.5
+DEFAULT_WINDOW = 4.0
+# Share of a block's frames that must be voiced for it to be analyzed
+MIN_VOICED_FRACTION = 0.5
+
+_INDEX = {name: i for i, name in enumerate(FEATURE_NAMES)}
+
+
+class StreamingAnalyzer:
+    """
+    Feeds on 16-bit mono PCM via push(); returns an update dict every `hop`
+    seconds of audio. `analyzer` is an Analyzer used only for predict().
+    """
+
+    def __init__(self, analyzer, rate, block=DEFAULT_BLOCK, hop=DEFAULT_HOP, window=DEFAULT_WINDOW,
+                 backend='numpy'):
+        if not 8000 <= rate <= 192000:
+            raise ValueError(f"Unsupported sample rate {rate}")
+        if hop > block or abs(block / hop - round(block / hop)) > 1e-6:
+            raise ValueError("block must be a whole multiple of hop")
+        if window < block:
+            raise ValueError("window must be at least one block")
+        self.analyzer = analyzer
+        self.rate = rate
+        self.block = block
+        self.hop = hop
+        self.window = window
+        self.backend = backend
+        self.block_samples = int(round(block * rate))
+        self.hop_samples = int(round(hop * rate))
+        self.hops_per_block = int(round(block / hop))
+
+        # Only the last block of audio is ever held
+        self._buffer = np.zeros(0)
+        self._since_hop = 0
+        self._carry = b''
+        self.samples_seen = 0
+        # (row or None, duration) for the blocks ending at each hop within the window
+        self._rows = deque(maxlen=int(round(window / hop)))
+        self.latest = None
+
+    def snapshot(self):
+        """
+        The stream's state as (JSON-safe dict, int16 sample buffer, block rows),
+        from which restore() rebuilds it. Unvoiced blocks are NaN rows.
+        """
+        state = {
+            'rate': self.rate, 'block': self.block, 'hop': self.hop, 'window': self.window,
+            'backend': self.backend,
+            'since_hop': self._since_hop,
+            'carry': self._carry.hex(),
+            'samples_seen': self.samples_seen,
+            'voiced': [row is not None for row, _ in self._rows],
+            'durations': [duration for _, duration in self._rows],
+            'latest': self.latest,
+        }
+        rows = np.full((len(self._rows), len(FEATURE_NAMES)), np.nan)
+        for i, (row, _) in enumerate(self._rows):
+            if row is not None:
+                rows[i] = row
+        # The buffer only ever held int16 samples, so int16 keeps it exactly
+        return state, np.round(self._buffer * 32768.0).astype('<i2'), rows
+
+    @classmethod
+    def restore(cls, analyzer, state, buffer, rows):
+        stream = cls(analyzer, state['rate'], state['block'], state['hop'], state['window'], state['backend'])
+        stream._buffer = buffer / 32768.0
+        stream._since_hop = state['since_hop']
+        stream._carry = bytes.fromhex(state['carry'])
+        stream.samples_seen = state['samples_seen']
+        stream._rows.extend((row if voiced else None, duration)
+                            for row, voiced, duration in zip(rows, state['voiced'], state['durations']))
+        stream.latest = state['latest']
+        return stream
+
+    def push(self, pcm):
+        """Adds little-endian int16 bytes; returns the updates completed by them (usually zero or one)."""
+        data = self._carry + pcm
+        usable = len(data) - len(data) % 2
+        self._carry = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype='<i2') / 32768.0
+
+        updates = []
+        while len(samples):
+            take = min(len(samples), self.hop_samples - self._since_hop)
+            self._buffer = np.concatenate([self._buffer, samples[:take]])[-self.block_samples:]
+            samples = samples[take:]
+            self._since_hop += take
+            self.samples_seen += take
+            if self._since_hop == self.hop_samples:
+                self._since_hop = 0
+                if len(self._buffer) == self.block_samples:
+                    updates.append(self._advance())
+        return updates
+
+    def _advance(self):
+        with track("live.block"):
+            self._rows.append(self._analyze_block(self._buffer))
+        rows = [row for row, _ in list(self._rows)[::-1][::self.hops_per_block] if row is not None]
+
+        update = {
+            'time': round(self.samples_seen / self.rate, 3),
+            'voiced': self._rows[-1][0] is not None,
+            'voiced_seconds': round(len(rows) * self.block, 3),
+            'features': None,
+            'prediction': None,
+        }
+        if rows:
+            pooled = vad.pool(rows, [self.block] * len(rows))
+            update['features'] = summarize(pooled)
+            with track("live.predict"):
+                update['prediction'] = self.analyzer.predict(pooled.reshape(1, -1))
+        self.latest = update
+        return update
+
+    def _analyze_block(self, samples):
+        _, voiced, _ = vad.frame_activity(samples, self.rate)
+        if not len(voiced) or voiced.mean() < MIN_VOICED_FRACTION:
+            return None, self.block
+        sound = parselmouth.Sound(samples, sampling_frequency=self.rate)
+        try:
+            return FeatureExtractor(sound, backend=self.backend).extract()[0], self.block
+        except Exception as e:
+            # Praat refuses some blocks (e.g. too few periods); the window carries on without it
+            print(f"Skipping live block at {self.samples_seen / self.rate:.2f}s: {str(e)}")
+            return None, self.block
+
+
+def summarize(row):
+    """The running statistics shown to clients, from a pooled FEATURE_NAMES row."""
+    def value(name, scale=1.0):
+        v = row[_INDEX[name]] * scale
+        return round(float(v), 4) if np.isfinite(v) else None
+
+    period = row[_INDEX['meanPeriodPulses']]
+    return {
+        'mean_f0': round(float(1 / period), 2) if np.isfinite(period) and period > 0 else None,
+        'pulses': value('numPulses'),
+        'jitter_pct': value('locPctJitter', 100),
+        'shimmer_pct': value('locShimmer', 100),
+        'hnr_db': value('meanHarmToNoiseHarmonicity'),
+        'mean_intensity_db': value('meanIntensity'),
+    }
+
+
+class StreamLimit(Exception):
+    """Raised by LiveStreams.open when `max_streams` are already live."""
+
+
+class LiveStreams:
+    """
+    Live streams shared by all worker processes, like UploadSessions for
+    uploads. Each stream's state lives under <root>/<id>: its scalars and
+    latest update in state.json, the sample buffer and block rows in .npy
+    files. Any worker can take the next frames; frames of one stream are
+    analyzed in order under a lock file, and other streams are not held up.
+    A stream that receives no audio for `idle_timeout` seconds is gone: it is
+    refused on access and removed by open() or the daemon thread that runs
+    sweep() every `sweep_interval` seconds in each process (0 disables it).
+    `analyzer_factory` returns the Analyzer for predictions.
+    """
+
+    def __init__(self, root, analyzer_factory, max_streams=32, idle_timeout=60, sweep_interval=300):
+        self.root = root
+        self.analyzer_factory = analyzer_factory
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, stream_id):
+        # Ids are generated by open(); anything else cannot name a stream
+        if not stream_id or not all(c.isalnum() or c in "-_" for c in stream_id):
+            return None
+        return os.path.join(self.root, stream_id)
+
+    def open(self, streaming_analyzer):
+        self._start_sweeper()
+        with LockedFile(os.path.join(self.root, "open.lock"), "ab"):
+            self.sweep()
+            if len(self) >= self.max_streams:
+                raise StreamLimit(f"{self.max_streams} live streams already open")
+            stream_id = secrets.token_urlsafe(12)
+            os.makedirs(os.path.join(self.root, stream_id))
+            self._save(stream_id, streaming_analyzer)
+        return stream_id
+
+    def push(self, stream_id, pcm):
+        """Feeds `pcm` to the stream; returns its new updates, or None for an unknown or expired stream."""
+        self._start_sweeper()
+        lock = self._stream_lock(stream_id)
+        if lock is None:
+            return None
+        with lock:
+            # None as well when the stream was closed while this push waited
+            streaming_analyzer = self._load(stream_id, self.analyzer_factory)
+            if streaming_analyzer is None:
+                return None
+            updates = streaming_analyzer.push(pcm)
+            self._save(stream_id, streaming_analyzer)
+        return updates
+
+    def get(self, stream_id):
+        """The stream's StreamingAnalyzer as of its last push (without an Analyzer), or None."""
+        lock = self._stream_lock(stream_id)
+        if lock is None:
+            return None
+        with lock:
+            return self._load(stream_id)
+
+    def close(self, stream_id):
+        lock = self._stream_lock(stream_id)
+        if lock is None:
+            return None
+        with lock:
+            streaming_analyzer = self._load(stream_id)
+            shutil.rmtree(os.path.join(self.root, stream_id), ignore_errors=True)
+        return streaming_analyzer
+
+    def __len__(self):
+        return sum(1 for entry in os.scandir(self.root) if entry.is_dir())
+
+    def sweep(self, now=None):
+        """Removes streams idle for `idle_timeout` seconds; returns how many."""
+        removed = 0
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and self._idle(entry.path, now):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _idle(self, directory, now=None):
+        now = time.time() if now is None else now
+        try:
+            return now - os.path.getmtime(os.path.join(directory, "state.json")) > self.idle_timeout
+        except OSError:
+            try:
+                return now - os.path.getmtime(directory) > self.idle_timeout
+            except OSError:
+                return False
+
+    def _stream_lock(self, stream_id):
+        """The stream's LockedFile, serializing its frames across processes; None for an unknown stream."""
+        directory = self._dir(stream_id)
+        if directory is None or not os.path.isdir(directory):
+            return None
+        if self._idle(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+        return LockedFile(os.path.join(directory, "lock"), "ab")
+
+    def _load(self, stream_id, analyzer_factory=None):
+        directory = os.path.join(self.root, stream_id)
+        try:
+            with open(os.path.join(directory, "state.json")) as f:
+                state = json.load(f)
+            buffer = np.load(os.path.join(directory, "buffer.npy"), allow_pickle=False)
+            rows = np.load(os.path.join(directory, "rows.npy"), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        return StreamingAnalyzer.restore(analyzer_factory() if analyzer_factory else None, state, buffer, rows)
+
+    def _save(self, stream_id, streaming_analyzer):
+        # Each file is written aside and renamed, state.json last
+        directory = os.path.join(self.root, stream_id)
+        state, buffer, rows = streaming_analyzer.snapshot()
+        for name, array in (("buffer.npy", buffer), ("rows.npy", rows)):
+            with tempfile.NamedTemporaryFile(dir=directory, prefix=".tmp-", suffix=".npy", delete=False) as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(f.name, os.path.join(directory, name))
+        with tempfile.NamedTemporaryFile("w", dir=directory, prefix=".tmp-", delete=False) as f:
+            json.dump(state, f)
+        os.replace(f.name, os.path.join(directory, "state.json"))
+
+    def _start_sweeper(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        with self._lock:
+            if not self.sweep_interval or self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_forever, name="live-stream-sweeper", daemon=True).start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Live stream sweep failed: {str(e)}")
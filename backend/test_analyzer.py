@@ -1,5 +1,6 @@
 import os
 from analyzer import Analyzer
+from features import FEATURE_NAMES
 import wave
 import numpy as np
 
@@ -101,4 +102,21 @@ def test_real_audio():
 
 if __name__ == "__main__":
     test_analyzer()
-    test_real_audio()
\ No newline at end of file
+    test_real_audio()
+
+def test_descriptions_follow_the_threshold():
+    analyzer = Analyzer()
+    row = np.full(len(FEATURE_NAMES), np.nan)
+    for threshold in (0.52, 0.802):
+        for prob in np.linspace(0, 1, 101):
+            result = analyzer._describe(float(prob), row, threshold)
+            if prob <= threshold:
+                assert result['diagnosis'] == "No Parkinson's detected"
+                assert result['severity'] == "Low"
+        # Just past the threshold is a mild, uncertain positive; near 1 a severe, confident one
+        assert analyzer._describe(threshold + 0.01, row, threshold)['confidence'] == "Low"
+        assert analyzer._describe(0.99, row, threshold)['severity'] == "High"
+        assert analyzer._describe(0.99, row, threshold)['confidence'] == "High"
+
+    result = analyzer._describe(0.80, row, 0.802)
+    assert result['prediction'] == 0 and result['severity'] == "Low" and result['voice_quality'] > 99
@@ -0,0 +1,198 @@
+import base64
+import os
+import shutil
+import subprocess
+import sys
+import time
+import wave
+
+import numpy as np
+
+import contours
+import parkinsons
+from app import WARMUP_SAMPLE, create_app, warm_up
+
+
+def make_app(tmp_path):
+    shutil.copy(WARMUP_SAMPLE, tmp_path / "sample.wav")
+    return create_app({"UPLOAD_FOLDER": str(tmp_path), "JOB_WORKERS": 1})
+
+
+def test_warm_up_analyzes_bundled_sample(tmp_path):
+    app = make_app(tmp_path)
+    assert warm_up(app) > 0
+
+
+def test_factory_apps_are_independent(tmp_path):
+    first = make_app(tmp_path)
+    second = create_app({"UPLOAD_FOLDER": str(tmp_path / "other")})
+    assert first.extensions["feature_cache"] is not second.extensions["feature_cache"]
+    assert first.extensions["model_registry"] is second.extensions["model_registry"]
+
+    response = first.test_client().post("/analyze", json={"filename": "sample.wav"})
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "success"
+
+    response = second.test_client().post("/analyze", json={"filename": "sample.wav"})
+    assert response.status_code == 404
+
+
+def test_jobs_run_outside_the_request_context(tmp_path):
+    client = make_app(tmp_path).test_client()
+    job_id = client.post("/jobs", json={"filename": "sample.wav"}).get_json()["job_id"]
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        snapshot = client.get(f"/jobs/{job_id}").get_json()
+        if snapshot["status"] in ("succeeded", "failed"):
+            break
+        time.sleep(0.05)
+    assert snapshot["status"] == "succeeded", snapshot
+    assert snapshot["result"]["prediction"]["prediction"] in (0, 1)
+
+
+def test_quality_gate_rejects_before_analysis(tmp_path):
+    app = make_app(tmp_path)
+    with wave.open(str(tmp_path / "short.wav"), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(44100)
+        f.writeframes(bytes(4410))  # 50 ms of silence
+
+    response = app.test_client().post("/analyze", json={"filename": "short.wav"})
+    assert response.status_code == 422
+    body = response.get_json()
+    assert body["status"] == "rejected"
+    assert {reason["code"] for reason in body["reasons"]} == {"too_short", "too_quiet"}
+
+    response = app.test_client().post("/analyze", json={"filename": "sample.wav"})
+    assert response.get_json()["quality"]["voiced_fraction"] > 0.5
+
+
+def test_uploads_get_opaque_ids_and_are_deduplicated(tmp_path):
+    app = make_app(tmp_path)
+    client = app.test_client()
+
+    def upload():
+        with open(WARMUP_SAMPLE, "rb") as f:
+            return client.post("/upload", data={"file": (f, "my recording.wav")}).get_json()
+
+    first, second = upload(), upload()
+    assert first["filename"] != second["filename"]
+    assert first["name"] == "my_recording.wav"
+    assert app.extensions["upload_store"].usage()["objects"] == 1
+    assert not os.path.exists(tmp_path / "my_recording.wav")
+
+    response = client.post("/analyze", json={"filename": first["filename"]})
+    assert response.status_code == 200
+
+    assert client.delete(f"/delete/{first['filename']}").status_code == 200
+    assert client.post("/analyze", json={"filename": first["filename"]}).status_code == 404
+    assert client.post("/analyze", json={"filename": second["filename"]}).status_code == 200
+
+
+def test_chunked_upload_resumes_and_analyzes(tmp_path):
+    client = make_app(tmp_path).test_client()
+    with open(WARMUP_SAMPLE, "rb") as f:
+        data = f.read()
+
+    session = client.post("/uploads", json={"name": "take.wav", "size": len(data)}).get_json()
+    url = session["upload_url"]
+    half = len(data) // 2
+    assert client.patch(url, data=data[:half], headers={"Upload-Offset": "0"}).get_json()["offset"] == half
+
+    # After a dropped connection the client asks where to resume
+    assert client.head(url).headers["Upload-Offset"] == str(half)
+    response = client.patch(url, data=data[half:], headers={"Upload-Offset": "0"})
+    assert response.status_code == 409 and response.get_json()["offset"] == half
+    client.patch(url, data=data[half:], headers={"Upload-Offset": str(half)})
+
+    body = client.post(f"{url}/complete", json={"analyze": True}).get_json()
+    assert body["name"] == "take.wav"
+    assert body["analysis"]["status"] == "success"
+    assert client.get(url).status_code == 404
+    assert client.post("/analyze", json={"filename": body["filename"]}).status_code == 200
+
+
+def test_live_stream_reports_every_hop(tmp_path):
+    client = make_app(tmp_path).test_client()
+    stream = client.post("/live", json={"rate": 44100}).get_json()
+
+    t = np.arange(44100 * 2) / 44100
+    pcm = (np.sin(2 * np.pi * 150 * t + np.sin(2 * np.pi * 5 * t)) * 10000).astype("<i2").tobytes()
+    updates = client.post(stream["frames_url"], data=pcm).get_json()["updates"]
+    assert [update["time"] for update in updates] == [1.0, 1.5, 2.0]
+    assert updates[-1]["prediction"]["prediction"] in (0, 1)
+
+    assert client.delete(f"/live/{stream['stream_id']}").get_json()["seconds"] == 2.0
+    assert client.post(stream["frames_url"], data=pcm).status_code == 404
+
+
+def test_subject_results_feed_the_trend(tmp_path):
+    client = make_app(tmp_path).test_client()
+    assert client.get("/subjects/p-1/trend").status_code == 404
+    assert client.post("/analyze", json={"filename": "sample.wav", "subject_id": 7}).status_code == 400
+
+    for day in (0, 1):
+        body = client.post("/analyze", json={"filename": "sample.wav", "subject_id": "p-1",
+                                             "session_id": f"visit-{day}",
+                                             "recorded_at": 1.7e9 + day * 86400}).get_json()
+        assert body["result_id"]
+
+    trend = client.get("/subjects/p-1/trend").get_json()
+    assert trend["count"] == 2
+    # The same recording twice: flat trend
+    assert abs(trend["metrics"]["jitter"]["slope_per_day"]) < 1e-12
+    assert trend["metrics"]["probability"]["rolling"]["7"]["n"] == 2
+
+    results = client.get("/subjects/p-1/results?from=1.7e9&to=1.7e9").get_json()["results"]
+    assert [r["session"] for r in results] == ["visit-0"]
+
+
+def test_contours_are_served_compactly_and_cached(tmp_path):
+    client = make_app(tmp_path).test_client()
+    response = client.get("/contours/sample.wav?width=200&dtype=float32&delta=1")
+    assert response.status_code == 200
+    assert response.mimetype == "application/octet-stream"
+    assert set(contours.decode(response.data)) == {"pitch", "intensity", "harmonicity"}
+    assert client.get("/contours/sample.wav?width=0").status_code == 400
+
+    body = client.post("/analyze", json={"filename": "sample.wav",
+                                         "contours": {"width": 200, "dtype": "float32", "delta": True}}).get_json()
+    # Features and contours both came from the cache the export filled
+    assert body["cached"]
+    assert base64.b64decode(body["contours"]) == response.data
+
+
+def test_chat_degrades_without_api_key(tmp_path, monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setattr(parkinsons, "client", None)
+    monkeypatch.setattr(parkinsons, "_missing_key", False)
+    lookups = []
+    monkeypatch.setattr("dotenv.load_dotenv", lambda *args, **kwargs: lookups.append(1) or False)
+    client = make_app(tmp_path).test_client()
+
+    assert client.post("/chat", json={"message": "hi"}).status_code == 503
+    assert client.post("/chat/stream", json={"message": "hi"}).status_code == 503
+    # The missing key is looked up once, not on every call
+    assert len(lookups) == 1
+    # Analysis does not need chat; a positive result just goes without the classification text
+    assert client.post("/analyze", json={"filename": "sample.wav"}).get_json()["status"] == "success"
+    assert "unavailable" in parkinsons.classify_parkinsons_info("tremor")
+
+
+def test_lazy_startup_defers_heavy_imports(tmp_path):
+    shutil.copy(WARMUP_SAMPLE, tmp_path / "sample.wav")
+    script = (
+        "import sys, app\n"
+        f"client = app.create_app({{'UPLOAD_FOLDER': {str(tmp_path)!r}}}).test_client()\n"
+        "assert not {'numpy', 'parselmouth', 'pydub', 'vad'} & set(sys.modules), sorted(sys.modules)\n"
+        "assert client.post('/analyze', json={'filename': 'sample.wav'}).status_code == 200\n"
+        "assert 'parselmouth' in sys.modules\n"
+    )
+    # VAD settings must not pull in vad either
+    env = dict(os.environ, LAZY_STARTUP="1", VAD_ENABLED="1", VAD_WORKERS="1")
+    env.pop("GEMINI_API_KEY", None)
+    env.pop("VAD_WINDOW", None)
+    subprocess.run([sys.executable, "-c", script], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                   check=True, timeout=120)
@@ -0,0 +1,80 @@
+import io
+import os
+import subprocess
+import wave
+import numpy as np
+import parselmouth
+import pytest
+from audio import (ANALYSIS_RATE, AudioSegment, FfmpegStreamDecoder, WavStreamDecoder, analysis_rate, decode_bytes,
+                   parse_rate_policy, stream_decoder)
+
+
+def _wav_bytes(samples, rate):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        wav_file.writeframes(samples.astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def test_pcm16_wav_decodes_like_praat_reads_it(tmp_path):
+    t = np.arange(ANALYSIS_RATE) / ANALYSIS_RATE
+    data = _wav_bytes(np.sin(2 * np.pi * 150 * t) * 20000, ANALYSIS_RATE)
+    path = tmp_path / "tone.wav"
+    path.write_bytes(data)
+
+    sound = decode_bytes(data, "tone.wav")
+    expected = parselmouth.Sound(str(path))
+    assert sound.sampling_frequency == expected.sampling_frequency
+    assert np.array_equal(sound.values, expected.values)
+
+
+def test_other_rates_are_resampled_without_ffmpeg():
+    data = _wav_bytes(np.zeros(8000), 8000)
+    sound = decode_bytes(data, "phone.wav")
+    assert sound.sampling_frequency == ANALYSIS_RATE
+    assert abs(sound.duration - 1.0) < 1e-3
+
+
+def test_rate_policies():
+    assert analysis_rate(16000, 44100) == 44100
+    assert analysis_rate(16000, "native") == 16000
+    assert analysis_rate(48000, "minimum") == 11025
+    # Never upsample a phone recording just to reach the minimum
+    assert analysis_rate(8000, "minimum") == 8000
+    assert parse_rate_policy(" Minimum ") == "minimum"
+    assert parse_rate_policy("22050") == 22050
+
+
+def test_stream_decoders_match_whole_file_decoding():
+    t = np.arange(ANALYSIS_RATE) / ANALYSIS_RATE
+    data = _wav_bytes(np.sin(2 * np.pi * 150 * t) * 20000, ANALYSIS_RATE)
+    expected = decode_bytes(data, "tone.wav")
+
+    # Byte-sized pieces split the header and the samples at awkward places
+    decoder = WavStreamDecoder()
+    for i in range(0, len(data), 7):
+        decoder.feed(data[i:i + 7])
+    assert np.array_equal(decoder.finish().values, expected.values)
+
+    flac = subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-f", "flac", "pipe:1"],
+                          input=data, capture_output=True, check=True).stdout
+    decoder = stream_decoder("tone.flac")
+    for i in range(0, len(flac), 4096):
+        decoder.feed(flac[i:i + 4096])
+    assert np.array_equal(decoder.finish().values, expected.values)
+
+
+def test_stalled_ffmpeg_is_killed(tmp_path, monkeypatch):
+    # Stands in for an ffmpeg that never finishes
+    converter = tmp_path / "stalled"
+    converter.write_text("#!/bin/sh\nexec sleep 30\n")
+    os.chmod(converter, 0o755)
+    monkeypatch.setattr(AudioSegment, "converter", str(converter))
+
+    decoder = FfmpegStreamDecoder(timeout=0.2)
+    with pytest.raises(ValueError):
+        decoder.finish()
+    assert decoder._process.returncode is not None
@@ -0,0 +1,46 @@
+import numpy as np
+
+import benchmark
+import metrics
+
+
+def test_stage_profiler_records_nested_stages():
+    profiler = benchmark.StageProfiler()
+    metrics.add_stage_hook(profiler)
+    try:
+        with metrics.track("benchmark.outer"):
+            with metrics.track("benchmark.inner"):
+                block = np.ones(20_000_000)
+            del block
+    finally:
+        metrics.remove_stage_hook(profiler)
+
+    report = profiler.report()
+    assert report["benchmark.inner"]["calls"] == 1
+    assert report["benchmark.outer"]["wall_mean"] >= report["benchmark.inner"]["wall_mean"]
+    # The 160 MB allocated by the inner stage counts towards both peaks
+    assert report["benchmark.outer"]["peak_rss_mb"] >= report["benchmark.inner"]["peak_rss_mb"] > 150
+
+
+def test_run_stages_on_a_synthetic_voice(tmp_path):
+    path = benchmark.synthetic_voice(str(tmp_path / "voice.wav"), 2.0)
+    summary, stages = benchmark.run_stages([path])
+    assert summary["failures"] == []
+    assert abs(summary["audio_seconds"] - 2.0) < 0.01
+    for stage in ("decode", "convert_to_wav", "quality", "get_features", "features.pitch", "predict"):
+        assert stages[stage]["calls"] == 1
+        assert stages[stage]["cpu_total"] >= 0
+
+
+def test_compare_flags_regressions_beyond_the_threshold():
+    def results(wall, rps):
+        stage = {"wall_mean": wall, "peak_rss_mb": 200.0}
+        return {"stages": {"get_features": stage, "features.f1": dict(stage, wall_mean=wall / 1000)},
+                "http": {"2": {"throughput_rps": rps}}}
+
+    baseline = results(0.5, 2.0)
+    assert benchmark.compare(baseline, results(0.6, 1.7), 0.25) == []
+    regressions = benchmark.compare(baseline, results(0.8, 1.0), 0.25)
+    # features.f1 also got slower, but is below the noise floor
+    assert len(regressions) == 2
+    assert regressions[0].startswith("get_features")
@@ -0,0 +1,87 @@
+import os
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+import contours
+import metrics
+from analyzer import Analyzer
+from feature_cache import FeatureCache
+
+WARMUP_SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "warmup.wav")
+
+
+def test_decimation_keeps_extremes_and_gaps():
+    values = np.sin(np.arange(1000) / 20.0)
+    values[100] = 5.0
+    values[500:600] = np.nan
+    start, step, minima, maxima = contours.decimate(values, 0.0, 0.01, 100)
+
+    assert len(minima) == len(maxima) == 100
+    assert np.nanmax(maxima) == 5.0
+    assert np.isnan(maxima[50:60]).all()
+    assert step == pytest.approx(0.1)
+    assert start == pytest.approx(0.045)
+    # Nothing to decimate: the frames come back as they are
+    assert np.array_equal(contours.decimate(values[:10], 0.0, 0.01, 100)[2], values[:10])
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-4), ("float16", 0.25)])
+@pytest.mark.parametrize("delta", [False, True])
+def test_encoding_round_trips(dtype, tolerance, delta):
+    pitch = 120 + 30 * np.sin(np.arange(400) / 15.0)
+    pitch[::7] = np.nan
+    intensity = np.linspace(40, 80, 3)
+    original = {"pitch": (0.02, 0.0125, pitch, pitch + 1), "intensity": (0.0, 0.01, intensity, intensity + 2)}
+
+    data = contours.encode(original, dtype, delta)
+    decoded = contours.decode(data)
+
+    assert list(decoded) == ["pitch", "intensity"]
+    itemsize = 2 if dtype == "float16" else 4
+    assert len(data) == 8 + 2 * 32 + 2 * (400 + 3) * itemsize
+    for name, (start, step, minima, maxima) in original.items():
+        assert decoded[name][:2] == (start, step)
+        for expected, actual in zip((minima, maxima), decoded[name][2:]):
+            assert np.array_equal(np.isnan(expected), np.isnan(actual))
+            assert np.nanmax(np.abs(expected - actual)) <= tolerance
+
+
+def test_analyzer_reuses_feature_objects_and_caches_contours():
+    computed = []
+
+    @contextmanager
+    def hook(stage):
+        computed.append(stage)
+        yield
+
+    analyzer = Analyzer(perturbation_backend="numpy", cache=FeatureCache(),
+                        contours=contours.parse_options({"width": 64, "delta": True}))
+    metrics.add_stage_hook(hook)
+    try:
+        features = analyzer.get_features(WARMUP_SAMPLE)
+    finally:
+        metrics.remove_stage_hook(hook)
+    for name in contours.CONTOURS:
+        assert computed.count(f"features.{name}") == 1
+
+    decoded = contours.decode(analyzer.contour_data)
+    assert set(decoded) == set(contours.CONTOURS)
+    assert all(len(minima) <= 64 for _, _, minima, _ in decoded.values())
+    # Mean pitch of the sample sits inside its pitch contour
+    start, step, minima, maxima = decoded["pitch"]
+    assert np.nanmin(minima) < 1 / features[0][2] < np.nanmax(maxima)
+
+    data = analyzer.contour_data
+    analyzer.get_features(WARMUP_SAMPLE)
+    assert analyzer.cache_hit
+    assert analyzer.contour_data == data
+
+
+def test_options_are_validated():
+    assert contours.parse_options(None) is None
+    assert contours.parse_options(True) == {"width": contours.DEFAULT_WIDTH, "dtype": "float16", "delta": False}
+    for bad in ({"width": 0}, {"width": "wide"}, {"dtype": "float64"}, "yes"):
+        with pytest.raises(ValueError):
+            contours.parse_options(bad)
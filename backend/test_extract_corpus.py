@@ -0,0 +1,53 @@
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+
+from analyzer import extract_features
+from audio import decode_bytes
+from extract_corpus import build
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+SAMPLES = sorted(glob.glob(os.path.join(script_dir, 'uploads', 'AH_*.wav')))[:3]
+
+
+def test_build_is_incremental(tmp_path):
+    recordings = tmp_path / "recordings"
+    (recordings / "nested").mkdir(parents=True)
+    shutil.copy(SAMPLES[0], recordings / "a.wav")
+    shutil.copy(SAMPLES[1], recordings / "nested" / "b.wav")
+    (recordings / "broken.wav").write_bytes(b"not audio")
+    (recordings / "notes.txt").write_text("ignored")
+    out = tmp_path / "corpus"
+
+    counts = build(str(recordings), str(out), labels={"a.wav": 1}, processes=2, timeout=60)
+    assert counts == {'files': 3, 'extracted': 2, 'failed': 1, 'skipped': 0, 'removed': 0, 'rows': 2}
+
+    with open(out / "index.json") as f:
+        index = json.load(f)
+    assert index['files'] == ["a.wav", os.path.join("nested", "b.wav")]
+    assert index['labels'] == [1, -1]
+    with open(SAMPLES[0], 'rb') as f:
+        expected = extract_features(decode_bytes(f.read(), "a.wav"), None, 'numpy')[0]
+    np.testing.assert_array_equal(np.load(out / "features.npy")[0], expected)
+
+    # Nothing changed: no extraction, failures are not retried
+    counts = build(str(recordings), str(out), processes=2)
+    assert counts['extracted'] == 0 and counts['skipped'] == 3
+
+    def labels():
+        with open(out / "index.json") as f:
+            return json.load(f)['labels']
+
+    # Runs without --labels keep the stored ones; new labels are merged over them
+    assert labels() == [1, -1]
+    build(str(recordings), str(out), labels={os.path.join("nested", "b.wav"): 0}, processes=2)
+    assert labels() == [1, 0]
+
+    shutil.copy(SAMPLES[2], recordings / "a.wav")
+    os.remove(recordings / "nested" / "b.wav")
+    counts = build(str(recordings), str(out), processes=2)
+    assert counts == {'files': 2, 'extracted': 1, 'failed': 0, 'skipped': 1, 'removed': 1, 'rows': 1}
+    assert labels() == [1]
@@ -0,0 +1,34 @@
+import numpy as np
+from feature_cache import FeatureCache
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = FeatureCache(max_entries=2)
+    cache.put("a", np.array([1.0]))
+    cache.put("b", np.array([2.0]))
+    cache.get("a")
+    cache.put("c", np.array([3.0]))
+
+    assert cache.get("b") is None
+    assert cache.get("a")[0][0] == 1.0
+    assert cache.get("c")[0][0] == 3.0
+
+
+def test_disk_tier_survives_restart_and_respects_size(tmp_path):
+    path = str(tmp_path / "features.db")
+    row_bytes = 29 * 8
+    cache = FeatureCache(max_entries=1, disk_path=path, max_disk_bytes=2 * row_bytes)
+    for i in range(3):
+        cache.put(f"key{i}", np.full(29, float(i)))
+
+    reopened = FeatureCache(disk_path=path, max_disk_bytes=2 * row_bytes)
+    assert reopened.get("key0") is None
+    assert np.array_equal(reopened.get("key2"), np.full((1, 29), 2.0))
+
+
+def test_blobs_share_both_tiers(tmp_path):
+    path = str(tmp_path / "features.db")
+    cache = FeatureCache(disk_path=path)
+    cache.put_blob("contours", b"\x00\x01\x02")
+    assert cache.get_blob("contours") == b"\x00\x01\x02"
+    assert FeatureCache(disk_path=path).get_blob("contours") == b"\x00\x01\x02"
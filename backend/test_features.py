@@ -0,0 +1,27 @@
+import parselmouth
+import numpy as np
+from features import FEATURE_NAMES, FeatureExtractor, dependencies
+
+SAMPLE = "uploads/AH_197T_7552379A-2310-46E1-9466-9D8045C990B8.wav"
+
+
+def test_subset_matches_full_extraction():
+    sound = parselmouth.Sound(SAMPLE)
+    full = FeatureExtractor(sound).extract()
+    assert full.shape == (1, len(FEATURE_NAMES))
+
+    subset = ['f2', 'numPulses', 'locShimmer']
+    extractor = FeatureExtractor(sound)
+    values = extractor.extract(subset)
+    expected = [full[0][FEATURE_NAMES.index(name)] for name in subset]
+    assert np.array_equal(values[0], expected)
+
+    # Work nothing in the subset depends on is never computed
+    assert 'harmonicity' not in extractor.values
+    assert 'intensity' not in extractor.values
+
+
+def test_dependencies_include_shared_intermediates():
+    needed = dependencies(['locPctJitter', 'numPulses'])
+    assert {'sound', 'pitch', 'pulses', 'pulse_times'} <= needed
+    assert 'formant' not in needed
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from gemini import GeminiClient, GeminiError
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    """Answers like the Gemini API; `failures` 503s are returned before the first success."""
+
+    calls = []
+    failures = 0
+    delay = 0.0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        StubGemini.calls.append((self.path, self.headers.get("x-goog-api-key"), body))
+        time.sleep(StubGemini.delay)
+
+        if StubGemini.failures > 0:
+            StubGemini.failures -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        prompt = body["contents"][0]["parts"][0]["text"]
+        if "alt=sse" in self.path:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for word in prompt.split():
+                chunk = {"candidates": [{"content": {"parts": [{"text": word + " "}]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\r\n\r\n".encode())
+                self.wfile.flush()
+            return
+
+        data = json.dumps({"candidates": [{"content": {"parts": [{"text": prompt.upper()}]}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def client():
+    StubGemini.calls, StubGemini.failures, StubGemini.delay = [], 0, 0.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGemini)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield GeminiClient("test-key", base_url=f"http://127.0.0.1:{server.server_port}", backoff=0.01)
+    server.shutdown()
+    server.server_close()
+
+
+def payload(text):
+    return {"contents": [{"parts": [{"text": text}]}]}
+
+
+def test_generate_is_cached(client):
+    first = client.generate("v1beta/models/m:generateContent", payload("hello"))
+    second = client.generate("v1beta/models/m:generateContent", payload("hello"))
+
+    assert first["candidates"][0]["content"]["parts"][0]["text"] == "HELLO"
+    assert second == first
+    assert len(StubGemini.calls) == 1
+    assert StubGemini.calls[0][1] == "test-key"
+
+
+def test_identical_concurrent_requests_are_coalesced(client):
+    StubGemini.delay = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        client.generate("v1beta/models/m:generateContent", payload("same prompt")))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 5
+    assert len(StubGemini.calls) == 1
+
+
+def test_server_errors_are_retried(client):
+    StubGemini.failures = 2
+    data = client.generate("v1beta/models/m:generateContent", payload("retry me"))
+    assert data["candidates"][0]["content"]["parts"][0]["text"] == "RETRY ME"
+    assert len(StubGemini.calls) == 3
+
+    StubGemini.failures = 10
+    with pytest.raises(GeminiError) as error:
+        client.generate("v1beta/models/m:generateContent", payload("give up"))
+    assert error.value.status == 503
+
+
+def test_stream_yields_chunks(client):
+    chunks = list(client.stream("v1beta/models/m:streamGenerateContent", payload("one two three")))
+    assert chunks == ["one ", "two ", "three "]
+    assert "alt=sse" in StubGemini.calls[0][0]
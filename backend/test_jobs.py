@@ -0,0 +1,62 @@
+import threading
+import pytest
+from jobs import LocalJobQueue, QueueFull
+
+
+def test_queue_rejects_work_beyond_capacity():
+    release = threading.Event()
+    queue = LocalJobQueue(workers=1, max_pending=2)
+
+    def blocked(progress):
+        release.wait(5)
+        return "ok"
+
+    first = queue.submit(blocked)
+    queue.submit(blocked)
+    with pytest.raises(QueueFull) as excinfo:
+        queue.submit(blocked)
+    assert excinfo.value.retry_after >= 1
+
+    release.set()
+    snapshots = [s for s in queue.events(first.id) if s is not None]
+    assert snapshots[-1]["status"] == "succeeded"
+    assert snapshots[-1]["result"] == "ok"
+
+
+def test_events_report_progress_and_failure():
+    queue = LocalJobQueue(workers=1)
+
+    def failing(progress):
+        progress("extracting features", 0.5)
+        raise ValueError("bad audio")
+
+    job = queue.submit(failing)
+    snapshots = [s for s in queue.events(job.id) if s is not None]
+    assert snapshots[-1]["status"] == "failed"
+    assert snapshots[-1]["error"] == "bad audio"
+    assert queue.get(job.id).progress == 0.5
+
+
+def test_any_process_sharing_the_database_sees_the_job(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    release = threading.Event()
+    running = LocalJobQueue(workers=1, db_path=path)
+    # Stands in for another gunicorn worker
+    other = LocalJobQueue(workers=1, db_path=path, poll_interval=0.01)
+
+    def slow(progress):
+        progress("extracting features", 0.5)
+        release.wait(5)
+        return {"prediction": 1}
+
+    job = running.submit(slow)
+    assert other.get("unknown") is None
+    events = other.events(job.id)
+    first = next(events)
+    assert first["job_id"] == job.id and first["status"] in ("queued", "running")
+
+    release.set()
+    snapshots = [first] + [s for s in events if s is not None]
+    assert snapshots[-1]["status"] == "succeeded"
+    assert snapshots[-1]["result"] == {"prediction": 1}
+    assert other.get(job.id).snapshot() == running.get(job.id).snapshot()
@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+
+import pytest
+import metrics
+
+
+def test_track_records_latency_and_errors():
+    with metrics.track("test.ok"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.track("test.fail"):
+            raise ValueError("boom")
+
+    text = metrics.render()
+    assert 'pearlyx_stage_seconds_count{stage="test.ok"} 1' in text
+    assert 'pearlyx_stage_seconds_bucket{stage="test.ok",le="+Inf"} 1' in text
+    assert 'pearlyx_stage_errors_total{stage="test.fail"} 1' in text
+    assert 'pearlyx_stage_in_flight{stage="test.ok"} 0' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_histogram_seconds", "Test.", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+
+    lines = histogram.render()
+    assert 'test_histogram_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_histogram_seconds_bucket{le="1.0"} 2' in lines
+    assert 'test_histogram_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'test_histogram_seconds_count 3' in lines
+
+
+def test_stage_hooks_wrap_tracked_stages():
+    seen = []
+
+    @contextmanager
+    def hook(stage):
+        seen.append(("enter", stage))
+        yield
+        seen.append(("exit", stage))
+
+    metrics.add_stage_hook(hook)
+    try:
+        with metrics.track("test.outer"):
+            with metrics.track("test.inner"):
+                pass
+    finally:
+        metrics.remove_stage_hook(hook)
+    with metrics.track("test.after"):
+        pass
+
+    assert seen == [("enter", "test.outer"), ("enter", "test.inner"), ("exit", "test.inner"), ("exit", "test.outer")]
+    assert 'pearlyx_stage_seconds_count{stage="test.inner"} 1' in metrics.render()
@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer import Analyzer
+from features import FEATURE_NAMES
+from model_set import ModelSet, parse_models
+from models.model import csv_path, train, write_bundle
+from registry import DEFAULT_BUNDLE_PATH, ModelRegistry
+from tree_model import DEFAULT_COMPILED_PATH, CompiledTrees, export_loaded
+
+WARMUP_SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "warmup.wav")
+JITTER = ['locPctJitter', 'locAbsJitter', 'rapJitter', 'ppq5Jitter']
+SHIMMER_AND_HNR = ['locShimmer', 'apq3Shimmer', 'meanHarmToNoiseHarmonicity', 'meanIntensity']
+
+
+def _bundle(tmp_path, name, features):
+    df = pd.read_csv(csv_path).sample(240, random_state=0)
+    bundle = train(df[features].to_numpy(dtype=np.float64), df['class'].to_numpy(),
+                   {'n_estimators': [20], 'max_depth': [3]}, n_folds=2, processes=1, feature_names=features)
+    path = str(tmp_path / f"{name}.pkl")
+    write_bundle(bundle, path)
+    export_loaded(ModelRegistry(path, compiled_path=None).get(), str(tmp_path / f"{name}.npz"))
+    return f"{name}={path}"
+
+
+@pytest.fixture
+def model_set(tmp_path):
+    return ModelSet(parse_models(",".join([_bundle(tmp_path, "jitter", JITTER),
+                                           _bundle(tmp_path, "shimmer", SHIMMER_AND_HNR)])))
+
+
+def test_models_are_scored_together_on_their_own_columns(model_set, tmp_path):
+    snapshot = model_set.get()
+    assert snapshot.features == [name for name in FEATURE_NAMES if name in JITTER + SHIMMER_AND_HNR]
+    assert model_set.get() is snapshot
+
+    rows = pd.read_csv(csv_path)[FEATURE_NAMES].to_numpy(dtype=np.float64)[:50]
+    rows[::5, FEATURE_NAMES.index('rapJitter')] = np.nan
+    combined = snapshot.score(rows)
+    for i, (name, features) in enumerate([("jitter", JITTER), ("shimmer", SHIMMER_AND_HNR)]):
+        alone = CompiledTrees.load(str(tmp_path / f"{name}.npz"))
+        expected = alone.predict_proba(rows[:, [FEATURE_NAMES.index(f) for f in features]])[:, 1]
+        np.testing.assert_allclose(combined[:, i], expected, rtol=1e-12)
+
+
+def test_analyzer_extracts_the_union_once(model_set):
+    analyzer = Analyzer(file=None, models=model_set, perturbation_backend='numpy')
+    features = analyzer.get_features(WARMUP_SAMPLE)
+    assert features.shape == (1, len(FEATURE_NAMES))
+    extracted = ~np.isnan(features[0])
+    assert [name for name, ok in zip(FEATURE_NAMES, extracted) if ok] == analyzer.feature_names
+
+    screening = analyzer.screen(features)
+    assert set(screening) == {"jitter", "shimmer"}
+    assert screening["jitter"] == analyzer.predict(features)
+    # Other models are judged on their own threshold and not described with Parkinson's markers
+    shimmer = screening["shimmer"]
+    assert set(shimmer) == {"prediction", "probability", "diagnosis"}
+    assert shimmer["prediction"] == int(shimmer["probability"] > analyzer.thresholds[1])
+    assert shimmer["diagnosis"] == ("shimmer detected" if shimmer["prediction"] else "No shimmer detected")
+    # No model needs the noise-to-harmonics ratio, so the breath support metric is left out
+    assert screening["jitter"]["analysis_metrics"]["breath_support"] is None
+
+
+def test_model_list_parsing():
+    assert parse_models("") == []
+    with pytest.raises(ValueError):
+        parse_models("als")
+    with pytest.raises(ValueError):
+        ModelSet([])
+
+
+def test_default_bundle_uses_the_serving_compiled_model(tmp_path):
+    # models/model.py compiles the default bundle to models/model.npz, not models/bundle.npz
+    (default,) = parse_models(f"parkinsons={DEFAULT_BUNDLE_PATH}")
+    assert default.registry.compiled_path == DEFAULT_COMPILED_PATH
+    assert isinstance(default.registry.get().model, CompiledTrees)
+
+    (other,) = parse_models(f"als={tmp_path / 'als.pkl'}")
+    assert other.registry.compiled_path == str(tmp_path / "als.npz")
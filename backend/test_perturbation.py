@@ -0,0 +1,36 @@
+import glob
+import parselmouth
+import pytest
+import numpy as np
+from features import PERTURBATION_FEATURES, FeatureExtractor
+
+# Relative tolerance for the NumPy backend against Praat's own jitter/shimmer queries
+RTOL = 1e-9
+
+CORPUS = sorted(glob.glob("uploads/*.wav"))
+
+
+@pytest.mark.parametrize("path", CORPUS)
+def test_numpy_backend_matches_praat(path):
+    sound = parselmouth.Sound(path)
+    praat = FeatureExtractor(sound, backend='praat')
+    try:
+        expected = praat.extract(PERTURBATION_FEATURES)[0]
+    except parselmouth.PraatError as e:
+        pytest.skip(f"Praat cannot analyze {path}: {e}")
+
+    numpy_backend = FeatureExtractor(sound, backend='numpy')
+    # Share the pulses so both backends see exactly the same PointProcess
+    numpy_backend.values['pulses'] = praat.get('pulses')
+    actual = numpy_backend.extract(PERTURBATION_FEATURES)[0]
+
+    for name, want, got in zip(PERTURBATION_FEATURES, expected, actual):
+        assert np.isclose(got, want, rtol=RTOL, atol=0, equal_nan=True), \
+            f"{name} differs for {path}: praat={want} numpy={got}"
+
+
+def test_backends_share_non_perturbation_features():
+    sound = parselmouth.Sound(CORPUS[0])
+    praat = FeatureExtractor(sound, backend='praat').extract()
+    numpy_features = FeatureExtractor(sound, backend='numpy').extract()
+    assert np.allclose(praat, numpy_features, rtol=RTOL, atol=0)
@@ -0,0 +1,41 @@
+import numpy as np
+
+from quality import assess
+
+RATE = 44100
+
+
+def vowel(seconds=2.0, amplitude=0.3):
+    t = np.arange(int(RATE * seconds)) / RATE
+    # A 150 Hz voice with a few harmonics and a little breath noise
+    x = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 6))
+    x += np.random.default_rng(0).normal(0, 0.01, len(t))
+    return amplitude * x / np.abs(x).max()
+
+
+def codes(samples):
+    return {reason['code'] for reason in assess(samples, RATE)['reasons']}
+
+
+def test_sustained_vowel_passes():
+    report = assess(np.concatenate([np.zeros(RATE // 2), vowel(), np.zeros(RATE // 2)]), RATE)
+    assert report['ok'], report
+    assert report['metrics']['voiced_fraction'] > 0.6
+    assert report['metrics']['snr_db'] > 30
+
+    # Trimmed recordings have no pause to measure noise in
+    assert assess(vowel(), RATE)['metrics']['snr_db'] is None
+
+
+def test_bad_recordings_are_rejected():
+    assert codes(vowel(0.2)) == {'too_short'}
+    assert codes(np.zeros(RATE * 2)) == {'too_quiet'}
+    assert codes(np.clip(vowel(amplitude=3.0), -1, 1)) == {'clipped'}
+    assert codes(np.random.default_rng(1).normal(0, 0.1, RATE * 2)) == {'noisy', 'not_voiced'}
+
+
+def test_length_limit_can_be_lifted():
+    long_take = np.tile(vowel(), 3)
+    assert codes(long_take) == set()
+    assert {reason['code'] for reason in assess(long_take, RATE, {'max_duration': 5.0})['reasons']} == {'too_long'}
+    assert assess(long_take, RATE, {'max_duration': None})['ok']
@@ -0,0 +1,28 @@
+import os
+import pickle
+from registry import ModelRegistry
+
+
+def test_registry_reloads_when_artifact_changes(tmp_path):
+    model_path = tmp_path / "model.pkl"
+    scaler_path = tmp_path / "scaler.pkl"
+
+    with open(model_path, 'wb') as f:
+        pickle.dump({"name": "first"}, f)
+
+    registry = ModelRegistry(str(model_path), str(scaler_path), compiled_path=None)
+    first = registry.get()
+    assert first.model == {"name": "first"}
+    assert first.scaler is None
+
+    # Repeated lookups share the same snapshot
+    assert registry.get() is first
+
+    with open(model_path, 'wb') as f:
+        pickle.dump({"name": "second, retrained"}, f)
+    os.utime(model_path, ns=(0, os.stat(model_path).st_mtime_ns + 1_000_000))
+
+    second = registry.get()
+    assert second is not first
+    assert second.model == {"name": "second, retrained"}
+    assert second.version != first.version
@@ -0,0 +1,52 @@
+import numpy as np
+
+from features import FEATURE_NAMES
+from results_store import DAY, ResultsStore
+
+JITTER = FEATURE_NAMES.index('locPctJitter')
+START = 1.7e9
+
+
+def features(jitter):
+    row = np.zeros(len(FEATURE_NAMES))
+    row[JITTER] = jitter
+    return row
+
+
+def test_trend_slopes_follow_the_history(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    # Jitter rises by 0.1 per day for 100 days; probability stays at 0.25
+    for day in range(100):
+        store.record("p", features(1 + 0.1 * day), {'probability': 0.25, 'prediction': 0},
+                     model_version="v1", session=f"s{day}", recorded_at=START + day * DAY)
+    store.record("other", features(50), {'probability': 0.9, 'prediction': 1})
+
+    trend = store.trend("p")
+    assert trend["count"] == 100
+    assert trend["latest"] == {'probability': 0.25, 'prediction': 0, 'model_version': "v1"}
+    jitter = trend["metrics"]["jitter"]
+    assert np.isclose(jitter["slope_per_day"], 0.1)
+    assert np.isclose(jitter["mean"], 1 + 0.1 * 49.5)
+    assert jitter["rolling"]["7"]["n"] == 7
+    assert np.isclose(jitter["rolling"]["7"]["mean"], 1 + 0.1 * 96)
+    assert np.isclose(jitter["rolling"]["30"]["slope_per_day"], 0.1)
+    assert np.isclose(trend["metrics"]["probability"]["slope_per_day"], 0)
+    assert store.trend("nobody") is None
+
+
+def test_delete_and_range_queries(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.sqlite"))
+    ids = [store.record("p", features(jitter), {'probability': 0.5, 'prediction': 1},
+                        recorded_at=START + day * DAY)
+           for day, jitter in enumerate([1.0, 2.0, 30.0])]
+
+    assert store.delete(ids[2])
+    assert not store.delete(ids[2])
+    trend = store.trend("p")
+    assert trend["count"] == 2
+    assert np.isclose(trend["metrics"]["jitter"]["slope_per_day"], 1.0)
+
+    results = store.results("p", start=START + DAY / 2)
+    assert [r["id"] for r in results] == [ids[1]]
+    assert results[0]["features"]["locPctJitter"] == 2.0
+    assert [r["id"] for r in store.results("p")] == [ids[1], ids[0]]
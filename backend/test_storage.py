@@ -0,0 +1,62 @@
+import os
+import time
+
+from storage import UploadStore
+
+
+def make_wav(store, data):
+    path = store.temp_path(".wav")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_identical_audio_is_stored_once(tmp_path):
+    store = UploadStore(str(tmp_path), sweep_interval=0)
+    first = store.add(make_wav(store, b"a" * 100), "one.wav", source="src-1")
+    second = store.add(make_wav(store, b"a" * 100), "two.wav")
+
+    assert first.id != second.id
+    assert first.digest == second.digest
+    assert store.path(first.id) == store.path(second.id) == store.object_path(first.digest)
+    assert store.path(first.id).startswith(os.path.join(str(tmp_path), "objects", first.digest[:2]))
+    assert store.usage()["objects"] == 1
+    assert os.listdir(store.tmp_dir) == []
+
+    # A known original maps to the converted object without a new file
+    third = store.lookup_source("src-1", "three.wav")
+    assert third.digest == first.digest
+    assert store.lookup_source("src-2", "four.wav") is None
+
+    # The object is kept until its last upload is deleted
+    assert store.delete(first.id)
+    assert os.path.exists(store.object_path(first.digest))
+    assert store.delete(second.id) and store.delete(third.id)
+    assert not os.path.exists(store.object_path(first.digest))
+    assert not store.delete(first.id)
+
+
+def test_ttl_and_quota_eviction(tmp_path):
+    store = UploadStore(str(tmp_path), max_bytes=250, ttl=60, sweep_interval=0)
+    touched = store.add(make_wav(store, b"t" * 100), "touched.wav")
+    idle = store.add(make_wav(store, b"i" * 100), "idle.wav")
+    assert store.path(touched.id)
+
+    # Over quota: the least recently used object goes, not the newest
+    new = store.add(make_wav(store, b"n" * 100), "new.wav")
+    assert store.path(idle.id) is None
+    assert store.path(touched.id) and store.path(new.id)
+    assert store.usage()["bytes"] == 200
+
+    counts = store.sweep(now=time.time() + 3600)
+    assert counts["expired"] == 2
+    assert store.usage() == {"objects": 0, "bytes": 0, "uploads": 0, "max_bytes": 250}
+
+
+def test_plain_files_in_root_still_resolve(tmp_path):
+    (tmp_path / "legacy.wav").write_bytes(b"RIFF")
+    store = UploadStore(str(tmp_path), sweep_interval=0)
+    assert store.path("legacy.wav") == str(tmp_path / "legacy.wav")
+    assert store.path("../legacy.wav") is None
+    assert store.path("store.sqlite") is None
+    assert store.path("missing.wav") is None
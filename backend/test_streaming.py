@@ -0,0 +1,104 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from streaming import LiveStreams, StreamLimit, StreamingAnalyzer
+
+RATE = 16000
+
+
+class StubAnalyzer:
+    def __init__(self):
+        self.rows = []
+
+    def predict(self, params):
+        self.rows.append(params)
+        return {'probability': 0.5}
+
+
+def pcm(seconds, f0=150.0):
+    t = np.arange(int(RATE * seconds)) / RATE
+    # A little vibrato so the pulses are not perfectly periodic
+    phase = 2 * np.pi * f0 * t + 2 * np.sin(2 * np.pi * 5 * t)
+    x = sum(np.sin(k * phase) / k for k in range(1, 6))
+    return (0.3 * x / np.abs(x).max() * 32767).astype('<i2').tobytes()
+
+
+def test_updates_every_hop_with_bounded_state():
+    analyzer = StubAnalyzer()
+    stream = StreamingAnalyzer(analyzer, RATE, block=1.0, hop=0.5, window=2.0)
+    data = pcm(6.0) + bytes(RATE * 2 * 2) + pcm(2.0)
+
+    updates = []
+    # Odd-sized frames split samples across pushes
+    for i in range(0, len(data), 3001):
+        updates.extend(stream.push(data[i:i + 3001]))
+
+    assert [u['time'] for u in updates] == [0.5 * n for n in range(2, 21)]
+    assert len(stream._buffer) == RATE
+    assert len(stream._rows) == 4
+
+    voiced = updates[6]
+    assert voiced['voiced'] and voiced['voiced_seconds'] == 2.0
+    assert abs(voiced['features']['mean_f0'] - 150) < 5
+    # Two non-overlapping one-second blocks: about 2 s worth of pulses
+    assert 250 < voiced['features']['pulses'] < 350
+
+    # The pause is skipped rather than analyzed
+    pause = updates[14]
+    assert not pause['voiced'] and pause['voiced_seconds'] == 0
+    assert pause['prediction'] is None
+    assert updates[-1]['voiced']
+
+
+def test_invalid_settings_and_stream_limit(tmp_path):
+    with pytest.raises(ValueError):
+        StreamingAnalyzer(StubAnalyzer(), RATE, block=1.0, hop=0.3)
+    with pytest.raises(ValueError):
+        StreamingAnalyzer(StubAnalyzer(), 0)
+
+    streams = LiveStreams(str(tmp_path), StubAnalyzer, max_streams=1)
+    stream_id = streams.open(StreamingAnalyzer(StubAnalyzer(), RATE))
+    with pytest.raises(StreamLimit):
+        streams.open(StreamingAnalyzer(StubAnalyzer(), RATE))
+    assert streams.push("unknown", b"") is None
+    assert streams.push(stream_id, pcm(0.6)) == []
+    assert streams.close(stream_id) is not None
+    assert len(streams) == 0
+
+
+def test_any_worker_can_take_the_next_frames(tmp_path):
+    # Two stores on one directory stand in for two gunicorn workers
+    workers = [LiveStreams(str(tmp_path), StubAnalyzer), LiveStreams(str(tmp_path), StubAnalyzer)]
+    reference = StreamingAnalyzer(StubAnalyzer(), RATE)
+    stream_id = workers[0].open(StreamingAnalyzer(None, RATE))
+    data = pcm(3.0)
+
+    expected, updates = [], []
+    for n, i in enumerate(range(0, len(data), 4001)):
+        expected.extend(reference.push(data[i:i + 4001]))
+        updates.extend(workers[n % 2].push(stream_id, data[i:i + 4001]))
+
+    assert updates == expected
+    assert workers[1].get(stream_id).latest == reference.latest
+    assert workers[1].close(stream_id).samples_seen == reference.samples_seen
+    assert workers[0].push(stream_id, data[:100]) is None
+    assert len(workers[0]) == 0
+
+
+def test_idle_streams_expire(tmp_path):
+    streams = LiveStreams(str(tmp_path), StubAnalyzer, idle_timeout=60, sweep_interval=0)
+    stale, fresh = streams.open(StreamingAnalyzer(None, RATE)), streams.open(StreamingAnalyzer(None, RATE))
+    # State is plain JSON and .npy files, nothing that executes on load
+    assert sorted(os.listdir(tmp_path / stale)) == ["buffer.npy", "rows.npy", "state.json"]
+
+    past = time.time() - 120
+    os.utime(tmp_path / stale / "state.json", (past, past))
+    assert streams.push(stale, pcm(0.1)) is None
+    assert not (tmp_path / stale).exists()
+
+    assert streams.push(fresh, pcm(0.1)) == []
+    assert streams.sweep(now=time.time() + 120) == 1
+    assert streams.get(fresh) is None and len(streams) == 0
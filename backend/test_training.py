@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer import Analyzer
+from features import FEATURE_NAMES
+from models.model import csv_path, key_features, train, write_bundle
+from registry import ModelRegistry
+
+GRID = {'n_estimators': [20], 'max_depth': [2, 3]}
+
+
+def _data():
+    df = pd.read_csv(csv_path).sample(240, random_state=0)
+    return df[key_features].to_numpy(dtype=np.float64), df['class'].to_numpy()
+
+
+def test_bundle_round_trip(tmp_path):
+    X, y = _data()
+    bundle = train(X, y, GRID, n_folds=3, processes=1)
+    assert bundle['feature_names'] == FEATURE_NAMES
+    assert 0 < bundle['threshold'] <= 1
+    assert set(bundle['search']['top'][0]['params']) == set(GRID)
+
+    path = tmp_path / "bundle.pkl"
+    write_bundle(bundle, str(path))
+    assert [p.name for p in tmp_path.iterdir()] == ["bundle.pkl"]
+
+    loaded = ModelRegistry(str(path), compiled_path=None).get()
+    assert loaded.scaler is not None
+    assert loaded.threshold == bundle['threshold']
+    expected = bundle['model'].predict_proba(bundle['scaler'].transform(X[:5]))[:, 1]
+
+    analyzer = Analyzer(file=None, registry=ModelRegistry(str(path), compiled_path=None))
+    assert analyzer.threshold == bundle['threshold']
+    probabilities = [result['probability'] for result in analyzer.predict_many(X[:5])]
+    np.testing.assert_allclose(probabilities, expected)
+
+
+def test_analyzer_reads_features_by_name(tmp_path):
+    X, y = _data()
+    # Trained on the columns in reverse order; the analyzer still passes a FEATURE_NAMES row
+    bundle = train(X[:, ::-1], y, {'n_estimators': [5], 'max_depth': [2]}, n_folds=2, processes=1)
+    bundle['feature_names'] = list(reversed(bundle['feature_names']))
+    path = tmp_path / "bundle.pkl"
+    write_bundle(bundle, str(path))
+
+    analyzer = Analyzer(file=None, registry=ModelRegistry(str(path), compiled_path=None))
+    expected = bundle['model'].predict_proba(bundle['scaler'].transform(X[:5, ::-1]))[:, 1]
+    probabilities = [result['probability'] for result in analyzer.predict_many(X[:5])]
+    np.testing.assert_allclose(probabilities, expected)
+
+    bundle['feature_names'][0] = 'vibratoRate'
+    write_bundle(bundle, str(path))
+    with pytest.raises(ValueError):
+        Analyzer(file=None, registry=ModelRegistry(str(path), compiled_path=None))
@@ -0,0 +1,71 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from tree_model import CompiledTrees, export
+
+TOLERANCE = 1e-6
+
+
+def _load():
+    with open("models/model.pkl", 'rb') as f:
+        model = pickle.load(f)
+    X = pd.read_csv("models/Parkinsons_Speech-Features.csv").iloc[:, :29].values
+    return model, X
+
+
+def test_compiled_trees_match_xgboost(tmp_path):
+    model, X = _load()
+    X[::7, 3] = np.nan  # exercise the default (missing value) directions
+
+    path = tmp_path / "model.npz"
+    export(model, None, str(path), version="test")
+    compiled = CompiledTrees.load(str(path))
+
+    assert compiled.version == "test"
+    assert np.abs(compiled.predict_proba(X)[:, 1] - model.predict_proba(X)[:, 1]).max() < TOLERANCE
+    # Single rows go through the same path as batches
+    assert abs(compiled.predict_proba(X[:1])[0, 1] - model.predict_proba(X[:1])[0, 1]) < TOLERANCE
+
+
+def test_folded_scaler_matches_scaled_xgboost(tmp_path):
+    model, X = _load()
+    scaler = StandardScaler().fit(X)
+
+    path = tmp_path / "model.npz"
+    export(model, scaler, str(path))
+    compiled = CompiledTrees.load(str(path))
+
+    expected = model.predict_proba(scaler.transform(X))[:, 1]
+    assert np.abs(compiled.predict_proba(X)[:, 1] - expected).max() < TOLERANCE
+
+
+def test_bundle_metadata_round_trips(tmp_path):
+    model, X = _load()
+    path = tmp_path / "model.npz"
+    export(model, None, str(path), version="v1", feature_names=["a", "b"], threshold=0.61,
+           metrics={"test_auc": 0.9})
+    compiled = CompiledTrees.load(str(path))
+    assert compiled.feature_names == ["a", "b"]
+    assert compiled.decision_threshold == 0.61
+    assert compiled.metrics == {"test_auc": 0.9}
+
+    export(model, None, str(path))
+    compiled = CompiledTrees.load(str(path))
+    assert compiled.feature_names is None and compiled.decision_threshold is None
+
+
+def test_export_replaces_the_file_atomically(tmp_path):
+    model, _ = _load()
+    path = tmp_path / "model.npz"
+    export(model, None, str(path), version="old")
+    with open(path, 'rb') as reader:
+        export(model, None, str(path), version="new")
+        # A reader that opened the old file keeps reading a complete old file
+        assert CompiledTrees.load(reader).version == "old"
+    assert CompiledTrees.load(str(path)).version == "new"
+    assert os.listdir(tmp_path) == ["model.npz"]
+    umask = os.umask(0)
+    os.umask(umask)
+    assert os.stat(path).st_mode & 0o777 == 0o666 & ~umask
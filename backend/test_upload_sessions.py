@@ -0,0 +1,104 @@
+import io
+import time
+import wave
+
+import numpy as np
+import pytest
+
+from audio import decode_bytes
+import upload_sessions
+from upload_sessions import OffsetMismatch, UploadSessions
+
+RATE = 44100
+
+
+def wav_bytes(sample_width=2):
+    t = np.arange(RATE) / RATE
+    samples = np.sin(2 * np.pi * 150 * t) * 0.5
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(sample_width)
+        f.setframerate(RATE)
+        f.writeframes((samples * 2 ** (8 * sample_width - 1)).astype(f"<i{sample_width}").tobytes())
+    return buffer.getvalue()
+
+
+def test_chunks_resume_from_the_stored_offset(tmp_path):
+    data = wav_bytes()
+    sessions = UploadSessions(str(tmp_path))
+    session_id = sessions.create("tone.wav", len(data))["session_id"]
+
+    assert sessions.append(session_id, 0, data[:1000]) == 1000
+    # A retried chunk that already landed is refused with the real offset
+    with pytest.raises(OffsetMismatch) as error:
+        sessions.append(session_id, 0, data[:1000])
+    assert error.value.offset == 1000
+    with pytest.raises(OffsetMismatch):
+        sessions.finish(session_id)
+
+    sessions.append(session_id, 1000, data[1000:])
+    sound, _ = sessions.finish(session_id)
+    assert np.array_equal(sound.values, decode_bytes(data, "tone.wav").values)
+    assert sessions.discard(session_id)
+    assert sessions.status(session_id) is None
+
+
+def test_workers_catch_up_from_the_spool(tmp_path):
+    # Two stores in one process are both the owner, so each catches up from the spool
+    data = wav_bytes(sample_width=4)
+    first, second = UploadSessions(str(tmp_path)), UploadSessions(str(tmp_path))
+    session_id = first.create("tone.wav")["session_id"]
+
+    third = len(data) // 3
+    first.append(session_id, 0, data[:third])
+    second.append(session_id, third, data[third:2 * third])
+    first.append(session_id, 2 * third, data[2 * third:])
+
+    # 32-bit WAV is not parsed in-process, so the decoder switched to ffmpeg along the way
+    sound, _ = first.finish(session_id)
+    assert np.array_equal(sound.values, decode_bytes(data, "tone.wav").values)
+
+    first.discard(session_id)
+    second.create("other.wav")
+    assert second._decoders == {}
+
+
+def test_abandoned_sessions_expire(tmp_path):
+    sessions = UploadSessions(str(tmp_path), ttl=60)
+    session_id = sessions.create("tone.wav")["session_id"]
+    sessions.append(session_id, 0, wav_bytes()[:100])
+    assert sessions.sweep(now=1e12) == 1
+    assert sessions.status(session_id) is None
+
+
+def test_sweeper_closes_decoders_of_sessions_finished_elsewhere(tmp_path):
+    first = UploadSessions(str(tmp_path), sweep_interval=0.05)
+    second = UploadSessions(str(tmp_path), sweep_interval=0)
+    session_id = first.create("tone.wav")["session_id"]
+    first.append(session_id, 0, wav_bytes()[:100])
+    assert session_id in first._decoders
+
+    second.discard(session_id)
+    deadline = time.time() + 5
+    while first._decoders and time.time() < deadline:
+        time.sleep(0.05)
+    assert first._decoders == {}
+
+
+def test_only_the_owner_decodes(tmp_path, monkeypatch):
+    data = wav_bytes()
+    owner, other = UploadSessions(str(tmp_path)), UploadSessions(str(tmp_path))
+    session_id = owner.create("tone.wav")["session_id"]
+    half = len(data) // 2
+
+    # The second worker only appends; the owner catches up with its chunk later
+    monkeypatch.setattr(upload_sessions, "_owner", lambda: "other-host:1")
+    other.append(session_id, 0, data[:half])
+    assert other._decoders == {}
+    monkeypatch.undo()
+    owner.append(session_id, half, data[half:])
+    assert owner._decoders[session_id][1] == len(data)
+
+    sound, _ = owner.finish(session_id)
+    assert np.array_equal(sound.values, decode_bytes(data, "tone.wav").values)
@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+
+import numpy as np
+import parselmouth
+import pytest
+
+import metrics
+import vad
+from features import FEATURE_NAMES
+from worker_pool import WorkerPool
+
+RATE = 44100
+SAMPLE = "samples/warmup.wav"
+
+
+def vowel(seconds, amplitude=0.3):
+    t = np.arange(int(RATE * seconds)) / RATE
+    x = sum(np.sin(2 * np.pi * 150 * k * t) / k for k in range(1, 6))
+    return amplitude * x / np.abs(x).max()
+
+
+def silence(seconds):
+    return np.random.default_rng(0).normal(0, 1e-4, int(RATE * seconds))
+
+
+def test_silence_and_pauses_are_trimmed():
+    samples = np.concatenate([silence(1.0), vowel(2.0), silence(0.1), vowel(1.5), silence(1.0)])
+    regions = vad.voiced_regions(samples, RATE)
+
+    # The 0.1 s pause is bridged; the padding keeps a little context either side
+    assert len(regions) == 1
+    start, end = regions[0]
+    assert abs(start / RATE - 0.95) < 0.03
+    assert abs(end / RATE - 4.65) < 0.03
+
+    samples = np.concatenate([vowel(2.0), silence(1.0), vowel(0.1), silence(1.0), vowel(1.5)])
+    assert len(vad.voiced_regions(samples, RATE)) == 2
+
+
+def test_long_regions_split_into_equal_segments():
+    samples = np.concatenate([silence(0.5), vowel(25.0), silence(0.5)])
+    pieces = vad.segments(samples, RATE, window=10.0)
+    lengths = [(end - start) / RATE for start, end in pieces]
+    assert len(pieces) == 3
+    assert max(lengths) - min(lengths) < 0.01
+    assert len(vad.segments(samples, RATE, window=None)) == 1
+
+
+def test_pool_rules():
+    row = np.arange(1, len(FEATURE_NAMES) + 1, dtype=float)
+    assert np.array_equal(vad.pool([row], [2.0]), row)
+
+    index = {name: i for i, name in enumerate(FEATURE_NAMES)}
+    rows = np.array([row, row])
+    rows[1, index['numPeriodsPulses']] *= 3
+    rows[1, index['locPctJitter']] = np.nan
+    rows[1, index['minIntensity']] = 0.5
+    pooled = vad.pool(rows, [1.0, 3.0])
+
+    assert pooled[index['numPulses']] == 2 * row[index['numPulses']]
+    assert pooled[index['numPeriodsPulses']] == 4 * row[index['numPeriodsPulses']]
+    assert pooled[index['locPctJitter']] == row[index['locPctJitter']]
+    assert pooled[index['minIntensity']] == 0.5
+    assert np.isclose(pooled[index['meanIntensity']], row[index['meanIntensity']])
+
+
+def test_parallel_extraction_matches_serial():
+    recording = parselmouth.Sound(SAMPLE)
+    rate = recording.sampling_frequency
+    # Two takes separated by a pause give two segments
+    samples = np.concatenate([recording.values[0], np.zeros(int(rate)), recording.values[0]])
+    sound = parselmouth.Sound(samples, sampling_frequency=rate)
+    assert len(vad.segments(samples, rate)) == 2
+
+    serial = vad.extract(sound, backend='numpy', processes=1)
+    parallel = vad.extract(sound, backend='numpy', processes=2)
+    assert serial.shape == (1, len(FEATURE_NAMES))
+    np.testing.assert_allclose(parallel, serial)
+
+    # A long-lived pool serves every recording with the same processes
+    with WorkerPool(vad.extract_segment, processes=2) as segment_pool:
+        np.testing.assert_allclose(vad.extract(sound, backend='numpy', segment_pool=segment_pool), serial)
+        workers = list(segment_pool._workers)
+        vad.extract(sound, backend='numpy', segment_pool=segment_pool)
+        assert segment_pool._workers == workers
+
+    subset = vad.extract(sound, ['f1', 'numPulses'], backend='numpy', processes=1)
+    np.testing.assert_allclose(subset[0], serial[0, [FEATURE_NAMES.index('f1'), FEATURE_NAMES.index('numPulses')]])
+
+
+def test_subset_extraction_only_computes_what_pooling_needs():
+    assert vad.segment_columns(['locPctJitter', 'meanHarmToNoiseHarmonicity']) == [
+        'numPeriodsPulses', 'locPctJitter', 'meanAutoCorrHarmonicity', 'meanHarmToNoiseHarmonicity']
+
+    recording = parselmouth.Sound(SAMPLE)
+    rate = recording.sampling_frequency
+    samples = np.concatenate([recording.values[0], np.zeros(int(rate)), recording.values[0]])
+    sound = parselmouth.Sound(samples, sampling_frequency=rate)
+    computed = []
+
+    @contextmanager
+    def hook(stage):
+        computed.append(stage)
+        yield
+
+    metrics.add_stage_hook(hook)
+    try:
+        subset = vad.extract(sound, ['locPctJitter', 'numPulses'], backend='numpy', processes=1)
+    finally:
+        metrics.remove_stage_hook(hook)
+    assert 'features.pulses' in computed
+    assert 'features.formant' not in computed and 'features.harmonicity' not in computed
+
+    full = vad.extract(sound, backend='numpy', processes=1)
+    np.testing.assert_allclose(subset[0], full[0, [FEATURE_NAMES.index('locPctJitter'),
+                                                   FEATURE_NAMES.index('numPulses')]])
+
+
+def test_serial_extraction_skips_bad_segments(monkeypatch):
+    recording = parselmouth.Sound(SAMPLE)
+    rate = recording.sampling_frequency
+    samples = np.concatenate([recording.values[0], np.zeros(int(rate)), recording.values[0]])
+    sound = parselmouth.Sound(samples, sampling_frequency=rate)
+    both = vad.extract(sound, ['numPulses'], backend='numpy', processes=1)
+
+    extract_segment = vad.extract_segment
+    failed = []
+
+    def first_fails(*task):
+        if not failed:
+            failed.append(task)
+            raise RuntimeError("too few periods")
+        return extract_segment(*task)
+
+    monkeypatch.setattr(vad, 'extract_segment', first_fails)
+    one = vad.extract(sound, ['numPulses'], backend='numpy', processes=1)
+    assert 0 < one[0, 0] < both[0, 0]
+
+    monkeypatch.setattr(vad, 'extract_segment', lambda *task: 1 / 0)
+    with pytest.raises(ValueError):
+        vad.extract(sound, backend='numpy', processes=1)
@@ -0,0 +1,52 @@
+import os
+import threading
+import time
+from worker_pool import WorkerPool
+
+
+def _square_or_fail(x):
+    if x == "hang":
+        time.sleep(60)
+    if x < 0:
+        raise ValueError("negative input")
+    return x * x
+
+
+def _pid(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+def test_results_keep_order_and_report_errors():
+    with WorkerPool(_square_or_fail, processes=2) as pool:
+        results = pool.map([(3,), (-1,), (4,)])
+    assert results[0] == (True, 9)
+    assert results[1] == (False, "ValueError: negative input")
+    assert results[2] == (True, 16)
+
+
+def test_hung_task_times_out_without_stalling_batch():
+    start = time.monotonic()
+    with WorkerPool(_square_or_fail, processes=1, timeout=1) as pool:
+        results = pool.map([("hang",), (2,), (5,)])
+    assert time.monotonic() - start < 10
+
+    assert results[0] == (False, "Timed out after 1 seconds")
+    assert results[1:] == [(True, 4), (True, 25)]
+
+
+def test_workers_are_reused_and_batches_queue():
+    with WorkerPool(_pid, processes=2) as pool:
+        first = {pid for _, pid in pool.map([(0.2,), (0.2,)])}
+        assert len(first) == 2
+
+        # Two batches at once still share the same two processes
+        outcomes = []
+        threads = [threading.Thread(target=lambda: outcomes.extend(pool.map([(0.1,), (0.1,)])))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert {pid for _, pid in outcomes} == first
+    assert pool._workers == []
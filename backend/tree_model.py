@@ -0,0 +1,270 @@
+"""
+Compiled, NumPy-only inference for the XGBoost screening model.
+
+`export` flattens a binary:logistic XGBClassifier into a handful of arrays
+(node feature, threshold, children, default direction and leaf value) and
+stores the StandardScaler's mean and scale in the same .npz file, along with
+the bundle's feature order, decision threshold and metrics.
+`CompiledTrees` evaluates every tree for a batch of rows with array
+indexing, so serving needs neither xgboost nor sklearn and avoids the DMatrix
+and wrapper overhead that dominates single-row prediction. `CompiledTreeSet`
+walks the trees of several such models in the same pass.
+
+Usage:
+    python tree_model.py export [--model models/bundle.pkl] [--scaler SCALER] [--out models/model.npz]
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_COMPILED_PATH = os.path.join(script_dir, 'models/model.npz')
+
+
+def _parse_float(value):
+    # Newer xgboost writes vector-valued parameters such as "[7.08455E-1]"
+    return float(str(value).strip('[]'))
+
+
+def export(model, scaler, path, version='', feature_names=None, threshold=None, metrics=None):
+    """
+    Writes the compiled form of an XGBClassifier (and optional StandardScaler)
+    to `path`, atomically: a registry reloading it mid-write sees the old file
+    or the new one, never a partial zip.
+    """
+    learner = json.loads(model.get_booster().save_raw('json'))['learner']
+    objective = learner['objective']['name']
+    if objective != 'binary:logistic':
+        raise ValueError(f"Only binary:logistic models can be compiled, got {objective}")
+    booster = learner['gradient_booster']
+    if booster['name'] != 'gbtree':
+        raise ValueError(f"Only gbtree boosters can be compiled, got {booster['name']}")
+
+    n_features = int(learner['learner_model_param']['num_feature'])
+    base_score = _parse_float(learner['learner_model_param']['base_score'])
+    base_margin = np.log(base_score / (1 - base_score))
+
+    if scaler is not None:
+        mean = np.asarray(scaler.mean_, dtype=np.float64)
+        scale = np.asarray(scaler.scale_, dtype=np.float64)
+    else:
+        mean = np.zeros(n_features)
+        scale = np.ones(n_features)
+
+    features, thresholds, lefts, rights, default_left, values, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+    for tree in booster['model']['trees']:
+        left = np.asarray(tree['left_children'], dtype=np.int64)
+        right = np.asarray(tree['right_children'], dtype=np.int64)
+        split = np.asarray(tree['split_indices'], dtype=np.int64)
+        condition = np.asarray(tree['split_conditions'], dtype=np.float32).astype(np.float64)
+        leaf = left == -1
+        index = np.arange(len(left))
+
+        # Leaves point at themselves so a fixed number of steps lands every row on a leaf
+        lefts.append(np.where(leaf, index, left) + offset)
+        rights.append(np.where(leaf, index, right) + offset)
+        features.append(np.where(leaf, 0, split))
+        thresholds.append(np.where(leaf, np.inf, condition))
+        default_left.append(np.asarray(tree['default_left'], dtype=bool))
+        values.append(np.where(leaf, condition, 0.0))
+        roots.append(offset)
+
+        max_depth = max(max_depth, _depth(left, right))
+        offset += len(left)
+
+    arrays = dict(
+        feature=np.concatenate(features).astype(np.int32),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts).astype(np.int32),
+        right=np.concatenate(rights).astype(np.int32),
+        default_left=np.concatenate(default_left),
+        value=np.concatenate(values),
+        roots=np.asarray(roots, dtype=np.int32),
+        base_margin=np.float64(base_margin),
+        max_depth=np.int32(max_depth),
+        n_features=np.int32(n_features),
+        mean=mean,
+        scale=scale,
+        version=np.str_(version),
+        feature_names=np.asarray(feature_names or [], dtype=np.str_),
+        decision_threshold=np.float64(np.nan if threshold is None else threshold),
+        metrics=np.str_(json.dumps(metrics or {})),
+    )
+
+    # np.savez would append the extension to a bare path itself
+    if not path.endswith('.npz'):
+        path += '.npz'
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, prefix='.model-', suffix='.npz', delete=False) as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    # NamedTemporaryFile creates 0600; the serving user may differ from the trainer
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(f.name, 0o666 & ~umask)
+    os.replace(f.name, path)
+
+
+def export_loaded(loaded, path):
+    """Compiles a registry snapshot (see registry.LoadedModel), keeping its version and metadata."""
+    export(loaded.model, loaded.scaler, path, version=loaded.version, feature_names=loaded.feature_names,
+           threshold=loaded.threshold, metrics=loaded.metrics)
+
+
+def _walk(X, roots, feature, threshold, children, default_left, max_depth):
+    """The leaf each tree (column) reaches for each row of the already scaled matrix X."""
+    flat = X.ravel()
+    row_offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+    nodes = np.tile(roots.astype(np.intp), (len(X), 1))
+    missing = np.isnan(flat).any()
+    for _ in range(max_depth):
+        x = flat[row_offsets + feature[nodes]]
+        go_left = x < threshold[nodes]
+        if missing:
+            go_left = np.where(np.isnan(x), default_left[nodes], go_left)
+        nodes = children[2 * nodes + go_left]
+    return nodes
+
+
+def _scale(X, mean, scale):
+    # Scale exactly as StandardScaler does, then compare in float32 like xgboost.
+    # Training rows often sit exactly on a split, so folding the scaler into
+    # the thresholds instead would flip those comparisons.
+    return ((X - mean) / scale).astype(np.float32).astype(np.float64)
+
+
+def _depth(left, right):
+    depth = np.zeros(len(left), dtype=np.int64)
+    for node in range(len(left)):
+        if left[node] != -1:
+            depth[left[node]] = depth[node] + 1
+            depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+class CompiledTrees:
+    """A compiled model with the scaler built in; takes raw feature rows."""
+
+    # The scaler is part of the compiled model, so callers must not scale inputs
+    scaler_folded = True
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature'].astype(np.intp)
+        self.threshold = arrays['threshold']
+        # children[2 * node] is the right child, children[2 * node + 1] the left one
+        self.children = np.column_stack([arrays['right'], arrays['left']]).astype(np.intp).ravel()
+        self.default_left = arrays['default_left']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.base_margin = float(arrays['base_margin'])
+        self.max_depth = int(arrays['max_depth'])
+        self.n_features = int(arrays['n_features'])
+        self.mean = arrays['mean']
+        self.scale = arrays['scale']
+        self.version = str(arrays['version'])
+        # Metadata from the bundle; files exported before bundles existed lack it
+        names = arrays.get('feature_names')
+        self.feature_names = [str(name) for name in names] if names is not None and len(names) else None
+        decision = float(arrays.get('decision_threshold', np.nan))
+        # The node split thresholds are self.threshold; this is the classification cutoff
+        self.decision_threshold = None if np.isnan(decision) else decision
+        self.metrics = json.loads(str(arrays['metrics'])) if 'metrics' in arrays else {}
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls({name: arrays[name] for name in arrays.files})
+
+    def predict_margin(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+
+        nodes = _walk(_scale(X, self.mean, self.scale), self.roots, self.feature, self.threshold,
+                      self.children, self.default_left, self.max_depth)
+        return self.base_margin + self.value[nodes].sum(axis=1)
+
+    def predict_proba(self, X):
+        p = 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+        return np.column_stack([1.0 - p, p])
+
+
+class CompiledTreeSet:
+    """
+    Several CompiledTrees scored in one pass. Model i reads columns
+    `columns[i]` of a shared feature matrix and scales them with its own
+    scaler; the node arrays of all models are concatenated, so one walk steps
+    every tree of every model and the leaf values are then summed per model.
+    """
+
+    def __init__(self, models, columns):
+        feature, threshold, children, default_left, value, roots, tree_starts = [], [], [], [], [], [], []
+        nodes = inputs = trees = 0
+        for model, model_columns in zip(models, columns):
+            if len(model_columns) != model.n_features:
+                raise ValueError(f"Model {model.version} expects {model.n_features} features, "
+                                 f"got {len(model_columns)} columns")
+            # Node and input indices are shifted past the models before this one
+            feature.append(model.feature + inputs)
+            threshold.append(model.threshold)
+            children.append(model.children + nodes)
+            default_left.append(model.default_left)
+            value.append(model.value)
+            roots.append(model.roots.astype(np.intp) + nodes)
+            tree_starts.append(trees)
+            nodes += len(model.feature)
+            inputs += model.n_features
+            trees += len(model.roots)
+
+        self.feature = np.concatenate(feature)
+        self.threshold = np.concatenate(threshold)
+        self.children = np.concatenate(children)
+        self.default_left = np.concatenate(default_left)
+        self.value = np.concatenate(value)
+        self.roots = np.concatenate(roots)
+        self.tree_starts = np.asarray(tree_starts, dtype=np.intp)
+        self.base_margin = np.array([model.base_margin for model in models])
+        self.max_depth = max(model.max_depth for model in models)
+        self.columns = np.concatenate([np.asarray(c, dtype=np.intp) for c in columns])
+        self.mean = np.concatenate([model.mean for model in models])
+        self.scale = np.concatenate([model.scale for model in models])
+
+    def predict_margin(self, X):
+        """Margins of every model (columns) for every row of X."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        nodes = _walk(_scale(X[:, self.columns], self.mean, self.scale), self.roots, self.feature,
+                      self.threshold, self.children, self.default_left, self.max_depth)
+        return self.base_margin + np.add.reduceat(self.value[nodes], self.tree_starts, axis=1)
+
+    def probabilities(self, X):
+        """Positive-class probability of every model (columns) for every row of X."""
+        return 1.0 / (1.0 + np.exp(-self.predict_margin(X)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('--model', default=os.path.join(script_dir, 'models/bundle.pkl'))
+    parser.add_argument('--scaler', default=None, help="Separate scaler for a bare model pickle")
+    parser.add_argument('--out', default=DEFAULT_COMPILED_PATH)
+    args = parser.parse_args()
+
+    from registry import ModelRegistry
+
+    loaded = ModelRegistry(args.model, args.scaler, compiled_path=None).get()
+    export_loaded(loaded, args.out)
+    print(f"Compiled model {loaded.version} written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Chunked, resumable uploads that are decoded while they arrive.
+
+A client opens a session (POST /uploads), then sends the file in pieces
+(PATCH /uploads/<id> with an Upload-Offset header). After a dropped
+connection it asks for the current offset (HEAD or GET) and carries on from
+there. Each chunk is appended to a spool file under `root`, and fed straight
+into a stream decoder from audio.py: WAV is parsed in-process, Opus/FLAC/MP3
+and friends run through a persistent ffmpeg. Completing the session then
+only flushes the decoder.
+
+The spool and session metadata live on disk, so any gunicorn worker can take
+any chunk. Only the worker that created a session (its `owner`, recorded in
+the metadata) decodes it: other workers just append to the spool, and the
+owner catches up from the spool before feeding its next chunk. A session
+completed on another worker, or whose owner is gone, is decoded from the
+spool at completion, so no upload runs through more than one decoder. A daemon thread in
+each process sweeps expired sessions and closes the decoders of sessions
+another worker finished every `sweep_interval` seconds (0 disables it).
+"""
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+
+from audio import ANALYSIS_RATE, UnsupportedStream, FfmpegStreamDecoder, decode_bytes, stream_decoder
+from storage import LockedFile
+
+# Spool bytes read per step when a decoder catches up
+CATCH_UP_BYTES = 1 << 20
+
+
+def _owner():
+    # Workers may share the sessions directory across machines, so the pid alone is not enough
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class OffsetMismatch(ValueError):
+    """A chunk did not start where the session ends; `offset` is where it does."""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadSessions:
+    def __init__(self, root, max_bytes=200 * 1024 * 1024, ttl=3600, sweep_interval=300):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+        # session id -> [decoder or None, bytes of the spool it has consumed]
+        self._decoders = {}
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, session_id):
+        # Ids are generated by create(); anything else cannot name a session
+        if not session_id or not all(c.isalnum() or c in "-_" for c in session_id):
+            return None
+        return os.path.join(self.root, session_id)
+
+    def create(self, name, size=None, rate_policy=ANALYSIS_RATE):
+        """Opens a session for `name` (already sanitized); `size` is the total if the client knows it."""
+        if size is not None and size > self.max_bytes:
+            raise UploadTooLarge(f"Upload of {size} bytes exceeds the {self.max_bytes} byte limit")
+        self._start_sweeper()
+        self.sweep()
+        self._prune_decoders()
+        session_id = secrets.token_urlsafe(16)
+        directory = os.path.join(self.root, session_id)
+        os.makedirs(directory)
+        meta = {"name": name, "size": size, "rate_policy": rate_policy, "created": time.time(), "owner": _owner()}
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        open(os.path.join(directory, "data"), "wb").close()
+        return self.status(session_id)
+
+    def status(self, session_id):
+        """
+        {'session_id', 'name', 'size', 'offset', 'rate_policy', 'owner'} or None
+        for an unknown or expired session.
+        """
+        directory = self._dir(session_id)
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+            offset = os.path.getsize(os.path.join(directory, "data"))
+        except (OSError, TypeError, ValueError):
+            return None
+        return {"session_id": session_id, "name": meta["name"], "size": meta["size"], "offset": offset,
+                "rate_policy": meta["rate_policy"], "owner": meta.get("owner")}
+
+    def append(self, session_id, offset, data):
+        """Appends `data` at `offset` and returns the new offset. Raises OffsetMismatch or UploadTooLarge."""
+        self._start_sweeper()
+        session = self.status(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        limit = session["size"] if session["size"] is not None else self.max_bytes
+        with self._locked_spool(session_id, "ab") as spool:
+            current = spool.tell()
+            if offset != current:
+                raise OffsetMismatch(current)
+            if current + len(data) > limit:
+                raise UploadTooLarge(f"Upload would exceed {limit} bytes")
+            spool.write(data)
+            spool.flush()
+            self._feed(session, current + len(data))
+        return current + len(data)
+
+    def finish(self, session_id):
+        """
+        The decoded parselmouth.Sound and the spool path of a complete session.
+        Raises OffsetMismatch when bytes are still missing.
+        """
+        session = self.status(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        if session["size"] is not None and session["offset"] != session["size"]:
+            raise OffsetMismatch(session["offset"])
+        spool_path = os.path.join(self._dir(session_id), "data")
+
+        with self._locked_spool(session_id, "rb"):
+            entry = self._feed(session, session["offset"])
+            with self._lock:
+                self._decoders.pop(session_id, None)
+        decoder = entry[0]
+        if decoder is not None:
+            try:
+                return decoder.finish(), spool_path
+            except ValueError as e:
+                print(f"Stream decode of {session['name']} failed, decoding the whole file: {str(e)}")
+            finally:
+                decoder.close()
+
+        with open(spool_path, "rb") as f:
+            return decode_bytes(f.read(), session["name"], session["rate_policy"]), spool_path
+
+    def discard(self, session_id):
+        with self._lock:
+            entry = self._decoders.pop(session_id, None)
+        if entry is not None and entry[0] is not None:
+            entry[0].close()
+        directory = self._dir(session_id)
+        if directory is None or not os.path.isdir(directory):
+            return False
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+        return True
+
+    def sweep(self, now=None):
+        """Removes sessions whose spool has not grown for `ttl` seconds; returns how many."""
+        now = time.time() if now is None else now
+        removed = 0
+        for entry in os.scandir(self.root):
+            try:
+                idle = now - os.path.getmtime(os.path.join(entry.path, "data")) > self.ttl
+            except OSError:
+                idle = now - entry.stat().st_mtime > self.ttl
+            if idle and self.discard(entry.name):
+                removed += 1
+        return removed
+
+    def _prune_decoders(self):
+        # Sessions finished or discarded by another worker leave their decoder (and ffmpeg) here
+        with self._lock:
+            gone = [session_id for session_id in self._decoders
+                    if not os.path.isdir(os.path.join(self.root, session_id))]
+            entries = [self._decoders.pop(session_id) for session_id in gone]
+        for decoder, _ in entries:
+            if decoder is not None:
+                decoder.close()
+
+    def _start_sweeper(self):
+        # Threads do not survive fork(), so each worker process starts its own
+        with self._lock:
+            if not self.sweep_interval or self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+        threading.Thread(target=self._sweep_forever, name="upload-session-sweeper", daemon=True).start()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+                self._prune_decoders()
+            except Exception as e:
+                print(f"Upload session sweep failed: {str(e)}")
+
+    def _feed(self, session, end):
+        """
+        Brings this process's decoder for `session` up to byte `end` of the
+        spool; returns its entry, [None, 0] when another worker owns the session.
+        """
+        session_id = session["session_id"]
+        if session["owner"] != _owner():
+            # Another worker decodes this session; this one only appends to the spool
+            return [None, 0]
+        with self._lock:
+            entry = self._decoders.get(session_id)
+            if entry is None:
+                entry = self._decoders[session_id] = [
+                    stream_decoder(session["name"], session["rate_policy"]), 0]
+        if entry[0] is None:
+            return entry
+
+        spool_path = os.path.join(self._dir(session_id), "data")
+        try:
+            self._catch_up(entry, spool_path, end)
+        except UnsupportedStream:
+            # A WAV the in-process parser cannot read (float, 24-bit, ...): replay it through ffmpeg
+            entry[0].close()
+            entry[:] = [FfmpegStreamDecoder(session["rate_policy"]), 0]
+            self._catch_up(entry, spool_path, end)
+        return entry
+
+    @staticmethod
+    def _catch_up(entry, spool_path, end):
+        decoder, consumed = entry
+        if consumed >= end:
+            return
+        with open(spool_path, "rb") as f:
+            f.seek(consumed)
+            while consumed < end:
+                chunk = f.read(min(CATCH_UP_BYTES, end - consumed))
+                if not chunk:
+                    break
+                decoder.feed(chunk)
+                consumed += len(chunk)
+        entry[1] = consumed
+
+    def _locked_spool(self, session_id, mode):
+        return LockedFile(os.path.join(self._dir(session_id), "data"), mode)
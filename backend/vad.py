@@ -0,0 +1,242 @@
+"""
+Energy / zero-crossing voice activity detection and segment-wise extraction.
+
+`voiced_regions` marks 20 ms frames as voiced when they are loud (within
+VOICED_RANGE_DB of the loudest frames and above VOICED_MIN_DBFS) and cross
+zero rarely, as vowels do. Short gaps are bridged, short blips dropped and
+each region padded slightly.
+
+`extract` analyzes only those regions. Leading and trailing silence and
+breaths are dropped, and voiced stretches longer than `window` seconds are
+split into equal segments of at most `window` seconds. The segments
+are extracted in parallel and pooled into one feature row:
+
+  numPulses, numPeriodsPulses          summed
+  meanPeriodPulses                     mean weighted by each segment's period count
+  stdDevPeriodPulses                   pooled standard deviation of all periods
+  jitter and shimmer                   mean weighted by period count (they are
+                                       per-period averages)
+  meanAutoCorrHarmonicity              mean weighted by segment duration; the noise/
+                                       harmonics ratios are recomputed from it
+  minIntensity / maxIntensity          minimum / maximum over segments
+  meanIntensity                        duration-weighted energy average of the dB means
+  f1-f4, b1-b4                         mean weighted by segment duration
+
+Segments start at t=0, so the bandwidth probe at 0.5 s lands inside voiced
+audio rather than in leading silence. A feature that is undefined (NaN) in
+one segment is pooled over the others.
+
+When only some features are asked for, each segment computes those plus the
+columns their pooling rule reads (see POOLING_INPUTS), so the pooled values
+are the same as in a full extraction.
+"""
+import numpy as np
+import parselmouth
+
+from features import FEATURE_NAMES, NODES, PERTURBATION_FEATURES, FeatureExtractor
+from worker_pool import WorkerPool
+
+FRAME_SECONDS = 0.02
+VOICED_RANGE_DB = 25.0
+VOICED_MIN_DBFS = -60.0
+# Vowels are dominated by low harmonics; noise and fricatives cross zero far more often
+VOICED_MAX_CROSSINGS_PER_SECOND = 3000.0
+
+# Region smoothing, in seconds
+MAX_GAP = 0.3
+MIN_REGION = 0.2
+PADDING = 0.05
+# Shorter segments are dropped (formant bandwidths are read at 0.5 s, so a
+# segment must be comfortably longer)
+MIN_SEGMENT = 1.0
+
+DEFAULT_WINDOW = 10.0
+
+# Feature -> the other per-segment columns its pooling rule reads
+POOLING_INPUTS = {
+    'meanPeriodPulses': ('numPeriodsPulses',),
+    'stdDevPeriodPulses': ('meanPeriodPulses', 'numPeriodsPulses'),
+    **{name: ('numPeriodsPulses',) for name in PERTURBATION_FEATURES},
+    'meanNoiseToHarmHarmonicity': ('meanAutoCorrHarmonicity',),
+    'meanHarmToNoiseHarmonicity': ('meanAutoCorrHarmonicity',),
+}
+
+
+def frame_activity(samples, rate):
+    """Per-frame energy (dBFS) and voiced flags for mono `samples` in [-1, 1]; also returns the frame size."""
+    samples = np.asarray(samples, dtype=np.float64)
+    size = max(1, int(rate * FRAME_SECONDS))
+    count = len(samples) // size
+    frames = samples[:count * size].reshape(count, size)
+    if count == 0:
+        return np.empty(0), np.empty(0, dtype=bool), size
+
+    energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-12)
+    loud = np.percentile(energy, 95)
+    crossings = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1) * rate / size
+    voiced = (energy > loud - VOICED_RANGE_DB) & (energy > VOICED_MIN_DBFS) & \
+        (crossings < VOICED_MAX_CROSSINGS_PER_SECOND)
+    return energy, voiced, size
+
+
+def _runs(flags):
+    """(start, end) index pairs of the True runs in a boolean array."""
+    edges = np.diff(np.concatenate([[False], flags, [False]]).astype(np.int8))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def voiced_regions(samples, rate):
+    """Sample ranges [(start, end), ...] of voiced audio, after smoothing."""
+    _, voiced, size = frame_activity(samples, rate)
+    frame_seconds = size / rate
+
+    # Bridge short unvoiced gaps (pitch breaks, creak) between voiced runs
+    voiced = voiced.copy()
+    runs = _runs(voiced)
+    for (_, end), (start, _) in zip(runs, runs[1:]):
+        if (start - end) * frame_seconds <= MAX_GAP:
+            voiced[end:start] = True
+
+    regions = []
+    pad = int(PADDING * rate)
+    for start, end in _runs(voiced):
+        if (end - start) * frame_seconds < MIN_REGION:
+            continue
+        regions.append((max(0, start * size - pad), min(len(samples), end * size + pad)))
+    return regions
+
+
+def segments(samples, rate, window=DEFAULT_WINDOW):
+    """
+    Splits the voiced regions into equal pieces of at most `window` seconds
+    (None for no limit) and drops pieces shorter than MIN_SEGMENT. Returns
+    sample ranges; when nothing long enough is voiced, the span from the first
+    to the last voiced sample (or the whole recording) is one segment.
+    """
+    regions = voiced_regions(samples, rate)
+    if not regions:
+        return [(0, len(samples))]
+
+    pieces = []
+    for start, end in regions:
+        count = int(np.ceil((end - start) / (window * rate))) if window else 1
+        bounds = np.linspace(start, end, max(1, count) + 1).astype(int)
+        pieces.extend(zip(bounds[:-1], bounds[1:]))
+
+    long_enough = [(start, end) for start, end in pieces if end - start >= MIN_SEGMENT * rate]
+    return long_enough or [(regions[0][0], regions[-1][1])]
+
+
+def segment_columns(features=None):
+    """The FEATURE_NAMES (in order) each segment must compute to pool `features` (None for all)."""
+    if features is None:
+        return list(FEATURE_NAMES)
+    needed = set(features)
+    for name in features:
+        needed.update(POOLING_INPUTS.get(name, ()))
+    return [name for name in FEATURE_NAMES if name in needed]
+
+
+def extract_segment(samples, rate, backend, columns):
+    """One segment's `columns`; the function a segment WorkerPool runs."""
+    sound = parselmouth.Sound(samples, sampling_frequency=rate)
+    return FeatureExtractor(sound, backend=backend).extract(columns)[0]
+
+
+def _run_segment(task):
+    # In-process counterpart of a WorkerPool outcome
+    try:
+        return True, extract_segment(*task)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+
+
+def _weighted(values, weights):
+    values = np.asarray(values, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    keep = np.isfinite(values) & (weights > 0)
+    if not keep.any():
+        return np.nan
+    return float(np.average(values[keep], weights=weights[keep]))
+
+
+def pool(rows, durations):
+    """
+    Combines per-segment feature rows (FEATURE_NAMES order) following the rules
+    in the module docstring. Columns that were not computed are NaN and stay NaN.
+    """
+    rows = np.asarray(rows, dtype=float)
+    if len(rows) == 1:
+        return rows[0].copy()
+    column = {name: rows[:, i] for i, name in enumerate(FEATURE_NAMES)}
+    periods = column['numPeriodsPulses']
+    pooled = {
+        'numPulses': column['numPulses'].sum(),
+        'numPeriodsPulses': periods.sum(),
+        'meanPeriodPulses': _weighted(column['meanPeriodPulses'], periods),
+        # fmin/fmax skip NaN without warning when a column is all NaN
+        'minIntensity': np.fmin.reduce(column['minIntensity']),
+        'maxIntensity': np.fmax.reduce(column['maxIntensity']),
+        'meanIntensity': 10 * np.log10(_weighted(10 ** (column['meanIntensity'] / 10), durations)),
+        'meanAutoCorrHarmonicity': _weighted(column['meanAutoCorrHarmonicity'], durations),
+    }
+
+    # Pooled std over all periods: within-segment variance plus spread of the segment means
+    means, stds = column['meanPeriodPulses'], column['stdDevPeriodPulses']
+    keep = np.isfinite(means) & np.isfinite(stds) & (periods > 0)
+    pooled['stdDevPeriodPulses'] = float(np.sqrt(np.average(
+        stds[keep] ** 2 + (means[keep] - pooled['meanPeriodPulses']) ** 2, weights=periods[keep]))) \
+        if keep.any() else np.nan
+
+    for name in PERTURBATION_FEATURES:
+        pooled[name] = _weighted(column[name], periods)
+    for name in ('meanNoiseToHarmHarmonicity', 'meanHarmToNoiseHarmonicity'):
+        pooled[name] = NODES[name][1](pooled['meanAutoCorrHarmonicity'])
+    for number in range(1, 5):
+        for name in (f'f{number}', f'b{number}'):
+            pooled[name] = _weighted(column[name], durations)
+
+    return np.array([pooled[name] for name in FEATURE_NAMES], dtype=float)
+
+
+def extract(sound, features=None, backend='praat', window=DEFAULT_WINDOW, processes=None, timeout=None,
+            segment_pool=None):
+    """
+    Features of the voiced part of `sound`, as a (1, n) array like
+    FeatureExtractor.extract. Segments only compute the columns that
+    `features` needs. When there is more than one, they run on `segment_pool`
+    (a long-lived WorkerPool of extract_segment, whose own processes and
+    timeout then apply), or else on a WorkerPool started for this call when
+    `processes` allows it. Segments that fail are skipped either way; a
+    ValueError is raised only when none succeeds.
+    """
+    samples = sound.values.mean(axis=0)
+    rate = sound.sampling_frequency
+    ranges = segments(samples, rate, window)
+    columns = segment_columns(features)
+    tasks = [(samples[start:end], rate, backend, columns) for start, end in ranges]
+
+    if len(tasks) == 1 or (segment_pool is None and processes == 1):
+        outcomes = [_run_segment(task) for task in tasks]
+    elif segment_pool is not None:
+        outcomes = segment_pool.map(tasks)
+    else:
+        with WorkerPool(extract_segment, processes=processes, timeout=timeout) as workers:
+            outcomes = workers.map(tasks)
+
+    rows, durations = [], []
+    for (start, end), (ok, value) in zip(ranges, outcomes):
+        # A segment Praat cannot analyze should not sink the whole recording
+        if ok:
+            rows.append(value)
+            durations.append((end - start) / rate)
+        else:
+            print(f"Skipping segment {start / rate:.2f}-{end / rate:.2f}s: {value}")
+    if not rows:
+        raise ValueError(f"No segment of the recording could be analyzed ({outcomes[-1][1]})")
+
+    widened = np.full((len(rows), len(FEATURE_NAMES)), np.nan)
+    widened[:, [FEATURE_NAMES.index(name) for name in columns]] = rows
+    pooled = pool(widened, durations)
+    names = FEATURE_NAMES if features is None else features
+    return np.array([pooled[FEATURE_NAMES.index(name)] for name in names], dtype=float).reshape(1, -1)
@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+
+def _worker_loop(conn, fn):
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        index, args = task
+        try:
+            conn.send((index, True, fn(*args)))
+        except Exception as e:
+            conn.send((index, False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, fn):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_loop, args=(child, fn), daemon=True)
+        self.process.start()
+        child.close()
+        self.index = None
+        self.started = None
+
+    def submit(self, index, args):
+        self.index = index
+        self.started = time.monotonic()
+        self.conn.send((index, args))
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    Runs `fn(*args)` for many argument tuples across worker processes.
+
+    Unlike multiprocessing.Pool, each task has its own timeout measured from
+    the moment a worker picks it up. A worker that runs past it is killed and
+    replaced, so one bad input cannot stall the rest of the batch.
+
+    Workers are started on first use and kept between map() calls, so a pool
+    that lives as long as the app pays process startup and imports once.
+    map() calls on one pool run one at a time: each already keeps every worker
+    busy, and queueing them bounds the process count however many requests
+    arrive together. close() (or leaving a `with` block) stops the workers.
+    """
+
+    def __init__(self, fn, processes=None, timeout=None):
+        self.fn = fn
+        self.processes = processes or os.cpu_count() or 1
+        self.timeout = timeout
+        self._workers = []
+        self._workers_pid = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            workers = self._live_workers()
+            self._workers = []
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.kill()
+
+    def _live_workers(self):
+        # Workers belong to the process that started them; a forked copy of the pool starts its own
+        if self._workers_pid != os.getpid():
+            self._workers = []
+            self._workers_pid = os.getpid()
+        self._workers = [worker for worker in self._workers if worker.process.is_alive()]
+        return self._workers
+
+    def map(self, tasks):
+        """Returns one (ok, value) pair per task, in order. `value` is the error message when not ok."""
+        tasks = list(tasks)
+        with self._lock:
+            return self._map(tasks)
+
+    def _map(self, tasks):
+        results = [None] * len(tasks)
+        pending = deque(enumerate(tasks))
+        workers = self._live_workers()
+        while len(workers) < min(self.processes, len(tasks)):
+            workers.append(_Worker(self.fn))
+        idle = list(workers)
+        busy = {}
+
+        try:
+            while pending or busy:
+                while pending and idle:
+                    index, args = pending.popleft()
+                    worker = idle.pop()
+                    worker.submit(index, args)
+                    busy[worker.conn] = worker
+
+                wait_for = None
+                if self.timeout is not None:
+                    oldest = min(worker.started for worker in busy.values())
+                    wait_for = max(0.0, oldest + self.timeout - time.monotonic())
+
+                for conn in wait(list(busy), timeout=wait_for):
+                    worker = busy.pop(conn)
+                    try:
+                        index, ok, value = conn.recv()
+                        results[index] = (ok, value)
+                        idle.append(worker)
+                    except EOFError:
+                        results[worker.index] = (False, "Worker process exited unexpectedly")
+                        worker.kill()
+                        workers.remove(worker)
+                        if pending:
+                            replacement = _Worker(self.fn)
+                            workers.append(replacement)
+                            idle.append(replacement)
+
+                if self.timeout is not None:
+                    now = time.monotonic()
+                    for conn, worker in list(busy.items()):
+                        if now - worker.started >= self.timeout:
+                            del busy[conn]
+                            results[worker.index] = (False, f"Timed out after {self.timeout} seconds")
+                            worker.kill()
+                            workers.remove(worker)
+                            if pending:
+                                replacement = _Worker(self.fn)
+                                workers.append(replacement)
+                                idle.append(replacement)
+        finally:
+            # Only reached with tasks in flight when the batch was interrupted; their
+            # late results must not reach the next batch
+            for worker in busy.values():
+                worker.kill()
+                workers.remove(worker)
+
+        return results
@@ -6,7 +6,7 @@ import logo from './assets/logo.png';
 const Analyze: React.FC = () => {
   const location = useLocation();
   const navigate = useNavigate();
-  const { filepath, filename } = location.state || {};
+  const { filename, name } = location.state || {};
   interface PredictionResult {
     diagnosis: string;
     prediction: number;
@@ -62,7 +62,8 @@ const Analyze: React.FC = () => {
         } else {
           const errorData = await response.json();
           console.error("API Error:", errorData);
-          setError(`Failed to get prediction: ${errorData.error}`);
+          // Rejected recordings carry a message the user can act on
+          setError(errorData.status === "rejected" ? errorData.error : `Failed to get prediction: ${errorData.error}`);
         }
       } catch (err) {
         console.error("Analysis error details:", err);
@@ -77,7 +78,7 @@ const Analyze: React.FC = () => {
     }
   }, [filename]);
 
-  if (!filepath || !filename) {
+  if (!filename) {
     return (
       <div className="min-h-screen flex flex-col items-center justify-center text-center bg-gray-50">
         <h1 className="text-4xl font-bold text-gray-800">No File Found</h1>
@@ -119,7 +120,7 @@ const Analyze: React.FC = () => {
       <div className="container mx-auto text-center py-8">
         <h1 className="text-4xl font-bold text-gray-800 mt-10">Analysis Results</h1>
         <div className="mt-8 max-w-2xl mx-auto bg-white rounded-lg shadow-md p-6">
-          <p className="text-gray-600 mb-4">File: <strong>{filename}</strong></p>
+          <p className="text-gray-600 mb-4">File: <strong>{name || filename}</strong></p>
           {isLoading ? (
             <p className="text-blue-600">Analyzing audio file...</p>
           ) : error ? (
@@ -7,6 +7,7 @@ import About from "./About.tsx";
 import Analyze from "./Analyze.tsx";
 import { ReactMic } from "react-mic";
 import logo from './assets/logo.png';
+import { uploadInChunks } from "./upload.ts";
 
 const Home: React.FC = () => {
   const [audioFile, setAudioFile] = useState<File | null>(null);
@@ -37,8 +38,8 @@ const Home: React.FC = () => {
       const timestamp = new Date().getTime();
       fileToUpload = new File(
         [recordedBlob], 
-        `recorded-audio-${timestamp}.wav`, 
-        { type: "audio/wav" }
+        `recorded-audio-${timestamp}.webm`, 
+        { type: "audio/webm" }
       );
     }
 
@@ -48,33 +49,22 @@ const Home: React.FC = () => {
       return;
     }
 
-    const formData = new FormData();
-    formData.append("file", fileToUpload);
-
     try {
-      setUploadMessage("⏳ Processing audio...");
-      const response = await fetch("http://127.0.0.1:5000/upload", {
-        method: "POST",
-        body: formData,
+      setUploadMessage("⏳ Uploading audio...");
+      const data = await uploadInChunks(fileToUpload, fileToUpload.name, (fraction) =>
+        setUploadMessage(`⏳ Uploading audio... ${Math.round(fraction * 100)}%`)
+      );
+      setUploadMessage("✅ File processed successfully!");
+      setTimeout(() => setUploadMessage(null), 2000);
+      navigate("/analyze", {
+        state: {
+          filename: data.filename,
+          name: data.name,
+        }
       });
-
-      const data = await response.json();
-      if (response.ok) {
-        setUploadMessage("✅ File processed successfully!");
-        setTimeout(() => setUploadMessage(null), 2000);
-        navigate("/analyze", {
-          state: {
-            filepath: data.filepath,
-            filename: data.filename,
-          }
-        });
-      } else {
-        setUploadMessage(`❌ Error: ${data.error}`);
-        setTimeout(() => setUploadMessage(null), 5000);
-      }
     } catch (error) {
       console.error("Upload error:", error);
-      setUploadMessage("❌ Error processing file.");
+      setUploadMessage(`❌ Error: ${error instanceof Error ? error.message : "Error processing file."}`);
       setTimeout(() => setUploadMessage(null), 5000);
     }
   };
@@ -162,8 +152,8 @@ const Home: React.FC = () => {
               onStop={onStop}
               strokeColor="#4A90E2"
               backgroundColor="#f8f9fa"
-              mimeType="audio/wav"
-              bitRate={128}
+              mimeType="audio/webm"
+              bitRate={128000}
               sampleRate={44100}
             />
             <button
@@ -33,7 +33,7 @@ const Chat: React.FC = () => {
         setIsLoading(true);
 
         try {
-        const response = await fetch('http://127.0.0.1:5000/chat', {
+        const response = await fetch('http://127.0.0.1:5000/chat/stream', {
             method: 'POST',
             headers: {
             'Content-Type': 'application/json',
@@ -41,15 +41,40 @@ const Chat: React.FC = () => {
             body: JSON.stringify({ message: userMessage }),
         });
 
-        const data = await response.json();
-        if (response.ok) {
-            setMessages(prev => [...prev, { text: data.response, isUser: false, timestamp: new Date() }]);
-        } else {
-            setMessages(prev => [...prev, {
-            text: "Sorry, I couldn't process your message. Please try again.",
-            isUser: false,
-            timestamp: new Date()
-            }]);
+        if (!response.ok || !response.body) {
+            throw new Error(`Chat request failed with status ${response.status}`);
+        }
+
+        // Relay chunks into a single reply bubble as they arrive
+        setMessages(prev => [...prev, { text: '', isUser: false, timestamp: new Date() }]);
+        const appendToReply = (text: string) => setMessages(prev => {
+            const last = prev[prev.length - 1];
+            return [...prev.slice(0, -1), { ...last, text: last.text + text }];
+        });
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streaming = true;
+        while (streaming) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            const events = buffer.split('\n\n');
+            buffer = events.pop() ?? '';
+            for (const raw of events) {
+            const event = raw.match(/^event: (.*)$/m)?.[1];
+            const data = raw.match(/^data: (.*)$/m)?.[1];
+            if (event === 'chunk' && data) {
+                appendToReply(JSON.parse(data).text);
+            } else if (event === 'error') {
+                appendToReply("Sorry, I couldn't process your message. Please try again.");
+                streaming = false;
+            } else if (event === 'done') {
+                streaming = false;
+            }
+            }
         }
         } catch (error) {
         console.error('Chat error:', error);
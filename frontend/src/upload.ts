@@ -0,0 +1,68 @@
+const API_URL = "http://127.0.0.1:5000";
+const CHUNK_SIZE = 256 * 1024;
+const MAX_RETRIES = 5;
+
+export interface UploadResult {
+  filename: string;
+  name: string;
+  size: number;
+  error?: string;
+}
+
+const wait = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Sends the file in chunks through /uploads; a failed chunk is retried from
+// the offset the server reports, so a flaky connection never restarts the upload.
+export async function uploadInChunks(
+  file: Blob,
+  name: string,
+  onProgress?: (fraction: number) => void,
+): Promise<UploadResult> {
+  const created = await fetch(`${API_URL}/uploads`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ name, size: file.size }),
+  });
+  const session = await created.json();
+  if (!created.ok) {
+    throw new Error(session.error || "Could not start upload");
+  }
+
+  const url = `${API_URL}${session.upload_url}`;
+  let offset = 0;
+  let retries = 0;
+  while (offset < file.size) {
+    try {
+      const response = await fetch(url, {
+        method: "PATCH",
+        headers: { "Upload-Offset": String(offset) },
+        body: file.slice(offset, offset + CHUNK_SIZE),
+      });
+      const data = await response.json();
+      if (response.ok || response.status === 409) {
+        offset = data.offset;
+        retries = 0;
+        onProgress?.(offset / file.size);
+        continue;
+      }
+      throw new Error(data.error || `Upload failed with status ${response.status}`);
+    } catch (error) {
+      if (++retries > MAX_RETRIES) {
+        throw error;
+      }
+      await wait(500 * 2 ** retries);
+      // Ask the server how much actually arrived before resending
+      const status = await fetch(url).catch(() => null);
+      if (status?.ok) {
+        offset = (await status.json()).offset;
+      }
+    }
+  }
+
+  const completed = await fetch(`${url}/complete`, { method: "POST" });
+  const result = await completed.json();
+  if (!completed.ok) {
+    throw new Error(result.error || "Could not finish upload");
+  }
+  return result;
+}